@@ -0,0 +1,284 @@
+"""
+FORGE DAS Archive Index
+
+This module maintains a persistent, time-sorted index of a directory of FORGE DAS HDF5 files, so
+that time lookups do not require listing tens of thousands of files on the network filesystem
+and parsing every filename.
+
+Index Contents (one row per file, stored as a compact .npz table):
+    - filenames:  file name
+    - start_ns:   int64 UTC start time in nanoseconds since the epoch (from the filename)
+    - n_samples:  number of time samples of the 'Acoustic' dataset
+    - dt:         sampling interval in seconds ('TimeSamplingInterval(seconds)')
+    - n_channels: number of channels of the 'Acoustic' dataset
+    - seqno:      file sequence number NNNNN
+
+Storage:
+    The index is cached outside of the indexed directory, which is read-only on the FORGE storage:
+    by default in $XDG_CACHE_HOME/forge-das (~/.cache/forge-das), one file per directory named after a
+    hash of its path. The file is replaced atomically (temporary file and os.replace), so concurrent
+    jobs never read a half-written index. If the index cannot be written, it is only kept in memory.
+
+Refreshing:
+    The index stores a signature of the directory (device, inode and modification time). A refresh is
+    a single os.stat call when nothing changed; otherwise the directory is listed and only the headers
+    of new files are read, while removed files are dropped.
+
+Command Line Usage:
+    python archive_index.py --source_dir /path/to/das/files [--index /path/to/index.npz]
+
+    The cache directory can be changed with the FORGE_DAS_CACHE environment variable.
+
+Usage Example:
+    from archive_index import ArchiveIndex
+
+    index = ArchiveIndex.open("/path/to/das/files")
+    first, last = index.files_between("20240408T154300", "20240408T154400")
+    file_idx, sample_offset = index.locate(["2024-04-08T15:43:05.25"])
+
+File Naming Convention:
+    "16B_StrainRate_YYYYMMDDTHHMMSS+0000_NNNNN.h5", where YYYYMMDDTHHMMSS is the UTC start time.
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import h5py
+import hashlib
+import logging
+import zipfile
+import argparse
+import numpy as np
+
+FIELDS = ('start_ns', 'n_samples', 'dt', 'n_channels', 'seqno')
+
+
+def cache_dir():
+    """
+    Returns the directory of the generated caches (archive indexes, catalog tables): $FORGE_DAS_CACHE,
+    or forge-das in $XDG_CACHE_HOME (default ~/.cache).
+    """
+    if os.environ.get('FORGE_DAS_CACHE'):
+        return os.environ['FORGE_DAS_CACHE']
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'forge-das')
+
+
+def default_index_path(source_dir):
+    """
+    Returns the default path of the index of source_dir in the cache directory.
+    """
+    source_dir = os.path.realpath(source_dir)
+    digest = hashlib.blake2b(source_dir.encode(), digest_size=8).hexdigest()
+    return os.path.join(cache_dir(), f"archive_index_{os.path.basename(source_dir)}_{digest}.npz")
+
+
+def dir_signature(source_dir):
+    """
+    Returns the (device, inode, modification time in ns) of a directory, which changes whenever a file
+    is added, removed or renamed in it.
+    """
+    st = os.stat(source_dir)
+    return np.array([st.st_dev, st.st_ino, st.st_mtime_ns], dtype=np.int64)
+
+
+def _iso(timestamp):
+    # "YYYYMMDDTHHMMSS[.ffffff]" -> "YYYY-MM-DDTHH:MM:SS[.ffffff]"; other strings are passed through
+    if len(timestamp) >= 15 and timestamp[8] == 'T' and timestamp[:8].isdigit():
+        return f"{timestamp[:4]}-{timestamp[4:6]}-{timestamp[6:8]}T{timestamp[9:11]}:{timestamp[11:13]}:{timestamp[13:]}"
+    return timestamp
+
+
+def to_epoch_ns(times):
+    """
+    Converts a time or an array of times to int64 nanoseconds since the epoch (UTC).
+    Accepts datetime objects, numpy datetime64 values, ISO strings and "YYYYMMDDTHHMMSS[.ffffff]" strings.
+    """
+    arr = np.asarray(times)
+    if arr.dtype.kind in 'USO':
+        arr = np.array([_iso(t) if isinstance(t, str) else t for t in arr.ravel()],
+                       dtype='datetime64[ns]').reshape(arr.shape)
+    return arr.astype('datetime64[ns]').astype(np.int64)
+
+
+def parse_filenames(filenames):
+    """
+    Returns the start times (int64 epoch nanoseconds) and sequence numbers encoded in FORGE DAS filenames.
+    """
+    stamps = [f.split("StrainRate_")[1].split("+")[0] for f in filenames]
+    start_ns = to_epoch_ns(np.array(stamps, dtype=str)) if stamps else np.array([], dtype=np.int64)
+    seqno = np.array([int(f.rsplit('_', 1)[1].split('.')[0]) for f in filenames], dtype=np.int64)
+    return start_ns, seqno
+
+
+def read_header(file_path):
+    """
+    Returns (n_samples, dt, n_channels) of the 'Acoustic' dataset of a DAS file.
+    """
+    with h5py.File(file_path, 'r') as f:
+        dataset = f['Acoustic']
+        n_samples, n_channels = dataset.shape
+        dt = float(dataset.attrs['TimeSamplingInterval(seconds)'])
+    return n_samples, dt, n_channels
+
+
+class ArchiveIndex:
+    """
+    Time-sorted table of the DAS files of one directory, with vectorized lookups.
+    """
+
+    def __init__(self, source_dir, index_path=None):
+        self.source_dir = source_dir
+        self.index_path = index_path or default_index_path(source_dir)
+        self.signature = np.zeros(3, dtype=np.int64)  # see dir_signature; zeros when stale
+        self.filenames = np.array([], dtype=str)
+        self.start_ns = np.array([], dtype=np.int64)
+        self.n_samples = np.array([], dtype=np.int64)
+        self.dt = np.array([], dtype=np.float64)
+        self.n_channels = np.array([], dtype=np.int64)
+        self.seqno = np.array([], dtype=np.int64)
+
+    @classmethod
+    def open(cls, source_dir, index_path=None, refresh=True):
+        """
+        Loads the index of source_dir from disk (if present) and refreshes it.
+        """
+        index = cls(source_dir, index_path)
+        if os.path.exists(index.index_path):
+            index.load()
+        if refresh:
+            index.refresh()
+        return index
+
+    def __len__(self):
+        return len(self.filenames)
+
+    @property
+    def end_ns(self):
+        """
+        End time of every file (exclusive), in epoch nanoseconds.
+        """
+        return self.start_ns + np.round(self.n_samples * self.dt * 1e9).astype(np.int64)
+
+    def paths(self, indices=slice(None)):
+        return [os.path.join(self.source_dir, f) for f in self.filenames[indices]]
+
+    def load(self):
+        """
+        Loads the index from disk. A missing or unreadable index file leaves the index empty, to be rebuilt.
+        """
+        try:
+            with np.load(self.index_path) as table:
+                self.signature = table['signature']
+                self.filenames = table['filenames']
+                for field in FIELDS:
+                    setattr(self, field, table[field])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            self.__init__(self.source_dir, self.index_path)
+
+    def save(self):
+        """
+        Writes the index atomically to index_path. Returns False (with a warning) if it cannot be written.
+        """
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, signature=self.signature, filenames=self.filenames,
+                         **{field: getattr(self, field) for field in FIELDS})
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logging.warning(f"Archive index of {self.source_dir} not saved to {self.index_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        return True
+
+    def refresh(self, save=True):
+        """
+        Brings the index up to date with the directory. Returns True if the index changed.
+        """
+        signature = dir_signature(self.source_dir)
+        if np.array_equal(signature, self.signature):
+            return False
+
+        if not np.array_equal(signature[:2], self.signature[:2]) and self.signature.any():
+            # A different directory (recreated, or moved in place): the known headers cannot be trusted
+            self.__init__(self.source_dir, self.index_path)
+        present = [f for f in os.listdir(self.source_dir) if f.endswith('.h5') and 'StrainRate_' in f]
+        known = set(self.filenames.tolist())
+        keep = np.isin(self.filenames, present)
+
+        # Read the headers of new files only; unreadable (e.g. partially written) files are retried next time
+        new, headers = [], []
+        complete = True
+        for filename in sorted(set(present) - known):
+            try:
+                headers.append(read_header(os.path.join(self.source_dir, filename)))
+                new.append(filename)
+            except (OSError, KeyError):
+                complete = False
+
+        start_ns, seqno = parse_filenames(new)
+        headers = np.array(headers, dtype=np.float64).reshape(-1, 3)
+
+        filenames = np.concatenate([self.filenames[keep], np.array(new, dtype=str)])
+        columns = {
+            'start_ns': np.concatenate([self.start_ns[keep], start_ns]),
+            'n_samples': np.concatenate([self.n_samples[keep], headers[:, 0].astype(np.int64)]),
+            'dt': np.concatenate([self.dt[keep], headers[:, 1]]),
+            'n_channels': np.concatenate([self.n_channels[keep], headers[:, 2].astype(np.int64)]),
+            'seqno': np.concatenate([self.seqno[keep], seqno]),
+        }
+
+        order = np.lexsort((columns['seqno'], columns['start_ns']))
+        self.filenames = filenames[order]
+        for field in FIELDS:
+            setattr(self, field, columns[field][order])
+        self.signature = signature if complete else np.zeros(3, dtype=np.int64)
+
+        if save and self.save() and os.path.samefile(os.path.dirname(os.path.abspath(self.index_path)), self.source_dir):
+            # An index inside source_dir changes its signature when saved
+            self.signature = dir_signature(self.source_dir)
+        return True
+
+    def locate(self, times):
+        """
+        Vectorized lookup of the files containing the given times.
+        Returns (file indices, sample offsets); the file index is -1 for times not covered by any file.
+        """
+        times_ns = to_epoch_ns(times)
+        if len(self) == 0:
+            return np.full(np.shape(times_ns), -1), np.zeros(np.shape(times_ns), dtype=np.int64)
+
+        file_idx = np.searchsorted(self.start_ns, times_ns, side='right') - 1
+        clipped = np.clip(file_idx, 0, len(self) - 1)
+        covered = (file_idx >= 0) & (times_ns < self.end_ns[clipped])
+        offsets = np.floor((times_ns - self.start_ns[clipped]) / (self.dt[clipped] * 1e9)).astype(np.int64)
+        return np.where(covered, file_idx, -1), np.where(covered, offsets, 0)
+
+    def files_between(self, start_time, end_time):
+        """
+        Returns the indices (first, last) of the files overlapping the time range [start_time, end_time].
+        If no file overlaps, last < first.
+        """
+        start_ns, end_ns = to_epoch_ns(start_time), to_epoch_ns(end_time)
+        first = np.searchsorted(self.end_ns, start_ns, side='right')
+        last = np.searchsorted(self.start_ns, end_ns, side='right') - 1
+        return int(first), int(last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the time index of a directory of DAS HDF5 files.")
+    parser.add_argument('--source_dir', type=str, required=True, help='Directory containing the DAS HDF5 files')
+    parser.add_argument('--index', type=str, default=None, help=f'Path of the index file (default: in {cache_dir()})')
+    args = parser.parse_args()
+
+    index = ArchiveIndex.open(args.source_dir, args.index)
+    print(f"{len(index)} files indexed in {index.index_path}")
+    if len(index):
+        print(f"Time range: {np.datetime64(int(index.start_ns[0]), 'ns')} - {np.datetime64(int(index.end_ns[-1]), 'ns')}")
+
+
+if __name__ == "__main__":
+    main()
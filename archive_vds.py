@@ -0,0 +1,168 @@
+"""
+HDF5 Virtual Dataset Spanning the FORGE DAS Archive
+
+This module builds an HDF5 Virtual Dataset (VDS) that maps the 'Acoustic' datasets of all files
+of an archive directory into one logical [time, channel] array, and slices it by absolute UTC time.
+A read across file boundaries is then a single h5py slicing operation, resolved by the HDF5
+library, without finding the files and concatenating them in Python.
+
+VDS File Contents:
+    - 'Acoustic': virtual dataset [total_samples, n_channels], the files in time order
+    - 'time/filenames', 'time/start_ns', 'time/row', 'time/n_samples', 'time/dt': the time axis,
+      stored per file (segment): the first row of every file in the virtual dataset, its UTC start
+      time in epoch nanoseconds, sample count and sampling interval. Gaps between files are
+      therefore represented exactly, without storing one timestamp per sample.
+
+Incremental Updates:
+    The VDS is built from the archive index (archive_index.py), so an update only reads the headers
+    of new files. If the file list is unchanged, nothing is written; otherwise the mapping is
+    rewritten to a temporary file and atomically renamed over the VDS, without opening the source files.
+    Source files that are removed later (e.g. after downsampling) read as zeros.
+
+Command Line Usage:
+    python archive_vds.py --source_dir /path/to/das/files --vds /path/to/archive_vds.h5
+
+Usage Example:
+    from archive_vds import ArchiveVDS
+
+    with ArchiveVDS("/path/to/archive_vds.h5") as vds:
+        data, times, channel_numbers = vds.slice("20240408T154305.5", "20240408T154312.5", channels=slice(0, None, 4))
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import h5py
+import argparse
+import numpy as np
+from archive_index import ArchiveIndex, to_epoch_ns
+
+
+def build_vds(source_dir, vds_path, index_path=None):
+    """
+    Builds or updates the VDS of source_dir at vds_path. Returns True if the VDS was (re)written.
+    """
+    index = ArchiveIndex.open(source_dir, index_path)
+    if len(index) == 0:
+        raise ValueError(f"No DAS files in {source_dir}")
+    if np.any(index.n_channels != index.n_channels[0]):
+        raise ValueError(f"The DAS files in {source_dir} have different numbers of channels")
+
+    if os.path.exists(vds_path):
+        with h5py.File(vds_path, 'r') as f:
+            filenames = f['time/filenames'].asstr()[...]
+        if np.array_equal(filenames, index.filenames):
+            return False
+
+    with h5py.File(os.path.join(source_dir, index.filenames[0]), 'r') as f:
+        dtype = f['Acoustic'].dtype
+        attrs = dict(f['Acoustic'].attrs)
+
+    rows = np.concatenate([[0], np.cumsum(index.n_samples)])
+    n_channels = int(index.n_channels[0])
+    layout = h5py.VirtualLayout(shape=(int(rows[-1]), n_channels), dtype=dtype)
+    for i, path in enumerate(index.paths()):
+        source = h5py.VirtualSource(os.path.abspath(path), 'Acoustic', shape=(int(index.n_samples[i]), n_channels), dtype=dtype)
+        layout[rows[i]:rows[i + 1]] = source
+
+    tmp_path = vds_path + '.tmp'
+    with h5py.File(tmp_path, 'w', libver='latest') as f:
+        dataset = f.create_virtual_dataset('Acoustic', layout, fillvalue=0)
+        for key, value in attrs.items():
+            dataset.attrs[key] = value
+        group = f.create_group('time')
+        group.create_dataset('filenames', data=index.filenames.astype(object), dtype=h5py.string_dtype())
+        group.create_dataset('start_ns', data=index.start_ns)
+        group.create_dataset('row', data=rows[:-1])
+        group.create_dataset('n_samples', data=index.n_samples)
+        group.create_dataset('dt', data=index.dt)
+        f.attrs['source_dir'] = os.path.abspath(source_dir)
+    os.replace(tmp_path, vds_path)
+    return True
+
+
+class ArchiveVDS:
+    """
+    Reader of an archive VDS, slicing the virtual 'Acoustic' dataset by absolute UTC time.
+    """
+
+    def __init__(self, vds_path):
+        self.file = h5py.File(vds_path, 'r')
+        self.dataset = self.file['Acoustic']
+        group = self.file['time']
+        self.filenames = group['filenames'].asstr()[...]
+        self.start_ns = group['start_ns'][...]
+        self.row = group['row'][...]
+        self.n_samples = group['n_samples'][...]
+        self.dt = group['dt'][...]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def end_ns(self):
+        return self.start_ns + np.round(self.n_samples * self.dt * 1e9).astype(np.int64)
+
+    def times(self, rows):
+        """
+        Returns the UTC times (datetime64[ns]) of rows of the virtual dataset.
+        """
+        rows = np.asarray(rows)
+        segment = np.searchsorted(self.row, rows, side='right') - 1
+        offsets = np.round((rows - self.row[segment]) * self.dt[segment] * 1e9).astype(np.int64)
+        return (self.start_ns[segment] + offsets).astype('datetime64[ns]')
+
+    def rows_between(self, start_time, end_time):
+        """
+        Returns the rows [row_start, row_end) of the samples within [start_time, end_time]
+        (the end time is inclusive, as in Patch.select). Empty if row_end <= row_start.
+        """
+        start_ns, end_ns = int(to_epoch_ns(start_time)), int(to_epoch_ns(end_time))
+        first = int(np.searchsorted(self.end_ns, start_ns, side='right'))
+        last = int(np.searchsorted(self.start_ns, end_ns, side='right')) - 1
+        if first >= len(self.row) or last < 0:
+            return 0, 0
+
+        dt_ns = self.dt[first] * 1e9
+        row_start = self.row[first] + max(0, int(np.ceil((start_ns - self.start_ns[first]) / dt_ns - 1e-6)))
+        dt_ns = self.dt[last] * 1e9
+        row_end = self.row[last] + min(int(self.n_samples[last]),
+                                       int(np.floor((end_ns - self.start_ns[last]) / dt_ns + 1e-6)) + 1)
+        return int(row_start), int(row_end)
+
+    def slice(self, start_time, end_time, channels=None):
+        """
+        Reads the recordings within [start_time, end_time] with a single slicing operation.
+        Returns (data [time, channel], times as datetime64[ns], channel numbers), like utils.read_das_segment.
+        """
+        channels = channels if channels is not None else slice(None)
+        channel_numbers = np.arange(self.dataset.shape[1])[channels]
+        row_start, row_end = self.rows_between(start_time, end_time)
+        if row_end <= row_start:
+            raise ValueError(f"No DAS files cover {start_time} - {end_time}")
+        data = self.dataset[row_start:row_end, channels]
+        return data, self.times(np.arange(row_start, row_end)), channel_numbers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update an HDF5 virtual dataset spanning a directory of DAS files.")
+    parser.add_argument('--source_dir', type=str, required=True, help='Directory containing the DAS HDF5 files')
+    parser.add_argument('--vds', type=str, required=True, help='Path of the VDS file')
+    parser.add_argument('--index', type=str, default=None, help='Path of the archive index of source_dir')
+    args = parser.parse_args()
+
+    updated = build_vds(args.source_dir, args.vds, args.index)
+    with ArchiveVDS(args.vds) as vds:
+        status = "Written" if updated else "Up to date"
+        print(f"{status}: {args.vds} with {len(vds.filenames)} files, shape {vds.dataset.shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,10 @@ source /scratch/ddordevic/miniconda3/etc/profile.d/conda.sh
 conda activate dascore
 
 # Define paths (update these before running)
-csv_path="/scratch/ddordevic/FORGE/FORGE16BApril24NetworkBackgroundB.csv"
+csv_dirs="/scratch/ddordevic/FORGE/GES16Aand16BStimulationMonitoringApril2024/16AStimulationCatalogues/ /scratch/ddordevic/FORGE/GES16Aand16BStimulationMonitoringApril2024/16BStimulationCatalogues/"
 folder_path="/bedrettolab/E1B/DAS/2024_FORGE/DATA_RAW_fromOpenei/April_2024/v1.0.0/"
-output_csv="matching_catalog_files_B.csv"
 
-# Run the Python script
-python associate_catalog_dataset.py "$csv_path" "$folder_path" "$output_csv"
+# Run the Python script (all catalogs are associated in one pass and updated in place)
+python associate_catalog_dataset.py --csv_dirs $csv_dirs --folder_path "$folder_path" --window 2
 
-echo "Job completed successfully. Output saved to $output_csv"
+echo "Job completed successfully. Catalogs updated in $csv_dirs"
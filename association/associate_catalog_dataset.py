@@ -1,8 +1,15 @@
 import os
+import sys
+import argparse
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from tqdm import tqdm
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archive_index import ArchiveIndex
+from catalog import catalog_files, parse_catalog_times
+
 """
 DAS Data - Catalog Association Script
 
@@ -20,6 +27,23 @@ Usage Notes:
 - Handles timezone conversion (local time + 6 hours = UTC)
 - Finds the closest DAS file timestamp that precedes each seismic event
 
+Bulk Association (default when run as a script):
+- All FORGE catalog CSVs of the given directories (e.g. 16A and 16B) are processed in one pass
+- Trigger times are parsed at once and matched against the sorted file start times of the
+  archive index (archive_index.py) with a single searchsorted call, instead of listing the
+  DAS folder once per event
+- Catalogs that already have a 'Matched File' column are skipped, unless --force is given; the
+  other columns of a catalog are written back unchanged
+- Besides 'Matched File', the following columns are written:
+    'Sample Offset':     index of the trigger sample inside the matched file
+    'Time Offset (s)':   time of the trigger relative to the start of the matched file
+    'Crosses Next File': whether the event window [trigger, trigger + window] extends past
+                         the end of the matched file
+
+Command Line Usage:
+    python associate_catalog_dataset.py --csv_dirs /path/to/16AStimulationCatalogues /path/to/16BStimulationCatalogues \
+                                        --folder_path /path/to/das/files --window 2
+
 Author: Danilo Dordevic
 Last Updated: August 2025
 """
@@ -93,11 +117,102 @@ def process_all_csvs(csv_directory, folder_path):
         csv_path = os.path.join(csv_directory, csv_file)
         update_csv_with_matching_file(csv_path, folder_path)
 
-# Example usage
-# Paths tested with Utah FORGE Petabyte storage system (April 2024 dataset)
-# Note: Replace these paths with your local directory structure
-csv_directory = "/scratch/ddordevic/FORGE/GES16Aand16BStimulationMonitoringApril2024/16BStimulationCatalogues/"
-folder_path = "/bedrettolab/E1B/DAS/2024_FORGE/DATA_RAW_fromOpenei/April_2024/v1.0.0/"  # Contains HDF5 files
+def parse_trigger_times(df):
+    """
+    Returns the trigger times of a catalog as UTC datetimes (NaT where missing or malformed).
+    The catalogs contain day-first local dates and times, which are shifted by +6 hours to UTC
+    (see catalog.parse_catalog_times).
+    """
+    return parse_catalog_times(df, 'Trig')
+
+
+ASSOCIATION_COLUMNS = ['Matched File', 'Sample Offset', 'Time Offset (s)', 'Crosses Next File']
+
+
+def match_triggers(trigger, index, window=0.0, min_time=datetime(2024, 4, 7, 0, 0, 0)):
+    """
+    Vectorized lookup of the DAS files of an ArchiveIndex for a Series of UTC trigger times.
+
+    For each event, the matched file is the latest file starting at or before the trigger time.
+    Returns a DataFrame with the index of trigger and the ASSOCIATION_COLUMNS (see the module docstring);
+    events before min_time or without a preceding file are left empty.
+    """
+    valid = trigger.notna().to_numpy() & (trigger >= min_time).to_numpy()
+    trigger_ns = trigger.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+    file_idx = np.searchsorted(index.start_ns, trigger_ns, side='right') - 1
+    valid &= file_idx >= 0
+    file_idx = np.where(valid, file_idx, 0)
+
+    time_offset = (trigger_ns - index.start_ns[file_idx]) / 1e9
+    sample_offset = np.floor(time_offset / index.dt[file_idx]).astype(np.int64)
+    file_duration = index.n_samples[file_idx] * index.dt[file_idx]
+
+    return pd.DataFrame({
+        'Matched File': pd.Series(np.where(valid, index.filenames[file_idx], None), index=trigger.index, dtype=object),
+        'Sample Offset': pd.Series(sample_offset, index=trigger.index).where(valid).astype('Int64'),
+        'Time Offset (s)': pd.Series(time_offset, index=trigger.index).where(valid),
+        'Crosses Next File': pd.Series(time_offset + window > file_duration, index=trigger.index).where(valid).astype('boolean'),
+    })
 
-# For SEGY files, ensure they follow the same naming convention: 16B_StrainRate_YYYYMMDDTHHMMSS+0000_NNNNN.segy
-process_all_csvs(csv_directory, folder_path)
+
+def associate_catalog(df, index, window=0.0, min_time=datetime(2024, 4, 7, 0, 0, 0)):
+    """
+    Vectorized association of the catalog events in df with the DAS files of an ArchiveIndex.
+    Adds (or replaces) the ASSOCIATION_COLUMNS of df, see match_triggers.
+    """
+    matches = match_triggers(parse_trigger_times(df), index, window, min_time)
+    for column in ASSOCIATION_COLUMNS:
+        df[column] = matches[column]
+    return df
+
+
+def associate_all_csvs(csv_directories, folder_path, window=0.0, index_path=None, force=False):
+    """
+    Associates all FORGE catalog CSVs in the given directories with the DAS files in folder_path in one pass.
+
+    The trigger times of all catalogs are matched with a single vectorized lookup, and the association
+    columns are added to each catalog, which is written back to its CSV file (the other columns are left
+    as they are). Catalogs that already have a 'Matched File' column are skipped, unless force.
+    Returns the paths of the updated CSV files.
+    """
+    index = ArchiveIndex.open(folder_path, index_path)
+
+    csv_paths = catalog_files(csv_directories)
+    catalogs = {k: pd.read_csv(csv_path) for k, csv_path in enumerate(csv_paths)}
+    catalogs = {k: df for k, df in catalogs.items() if force or 'Matched File' not in df.columns}
+    if not catalogs:
+        return []
+
+    trigger = pd.concat([parse_trigger_times(df) for df in catalogs.values()], keys=list(catalogs))
+    matches = match_triggers(trigger, index, window)
+
+    for k, df in tqdm(catalogs.items(), desc="Writing CSV files"):
+        for column in ASSOCIATION_COLUMNS:
+            df[column] = matches.loc[k, column].array
+        df.to_csv(csv_paths[k], index=False)
+
+    return [csv_paths[k] for k in catalogs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Associate FORGE catalog events with DAS data files.")
+    parser.add_argument('--csv_dirs', type=str, nargs='+',
+                        default=["/scratch/ddordevic/FORGE/GES16Aand16BStimulationMonitoringApril2024/16AStimulationCatalogues/",
+                                 "/scratch/ddordevic/FORGE/GES16Aand16BStimulationMonitoringApril2024/16BStimulationCatalogues/"],
+                        help='Directories containing FORGE*.csv catalog files')
+    parser.add_argument('--folder_path', type=str,
+                        default="/bedrettolab/E1B/DAS/2024_FORGE/DATA_RAW_fromOpenei/April_2024/v1.0.0/",
+                        help='Directory containing DAS data files (HDF5)')
+    parser.add_argument('--window', type=float, default=0.0,
+                        help='Length of the event window after the trigger time in seconds, used for the Crosses Next File flag')
+    parser.add_argument('--index', type=str, default=None, help='Path of the archive index of folder_path')
+    parser.add_argument('--force', action='store_true', help='Also associate the catalogs that already have a Matched File column')
+    args = parser.parse_args()
+
+    # Paths tested with Utah FORGE Petabyte storage system (April 2024 dataset)
+    associate_all_csvs(args.csv_dirs, args.folder_path, args.window, args.index, args.force)
+
+
+if __name__ == "__main__":
+    main()
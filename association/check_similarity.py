@@ -5,6 +5,7 @@ import sys
 CSV Similarity Checker
 
 This script compares two CSV files to determine if they are identical in content.
+For tolerance-based comparisons of many catalogs or of DAS archives, see verify_archive.py.
 
 Usage from command line:
     python check_similarity.py <file1.csv> <file2.csv>
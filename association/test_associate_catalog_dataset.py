@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from associate_catalog_dataset import associate_all_csvs, match_triggers, parse_trigger_times
+from archive_index import ArchiveIndex
+from catalog import UTC_OFFSET
+from synthetic_forge import START_TIME
+
+
+def catalog(trigger_times):
+    """
+    Returns a catalog with the given UTC trigger times, in the padded local day-first format of the FORGE CSVs.
+    """
+    local_time = pd.to_datetime(trigger_times) - UTC_OFFSET
+    return pd.DataFrame({'Source': np.arange(147, 147 + len(trigger_times)),
+                         ' Trig Date ': local_time.strftime('%d/%m/%Y'),
+                         '    Trig Time   ': local_time.strftime('%H:%M:%S.%f'),
+                         ' MomMag': np.linspace(-1, 1, len(trigger_times))})
+
+
+def test_offsets_at_file_boundary(make_archive):
+    source_dir, filenames = make_archive(n_files=3)
+    index = ArchiveIndex.open(source_dir)
+    boundary = START_TIME + timedelta(seconds=1)
+    trigger = parse_trigger_times(catalog([
+        boundary - timedelta(milliseconds=1),   # last sample of the first file
+        boundary,                               # first sample of the second file
+        boundary + timedelta(microseconds=1500),
+        START_TIME - timedelta(seconds=1),      # before the archive
+    ]))
+
+    matches = match_triggers(trigger, index, window=0.01)
+    assert matches['Matched File'].tolist() == [filenames[0], filenames[1], filenames[1], None]
+    assert matches['Sample Offset'].tolist()[:3] == [999, 0, 1]
+    np.testing.assert_allclose(matches['Time Offset (s)'].to_numpy()[:3], [0.999, 0.0, 0.0015])
+    assert matches['Crosses Next File'].tolist()[:3] == [True, False, False]
+    assert matches.iloc[3].isna().all()
+
+
+def test_associate_all_csvs_keeps_catalog_columns(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=3)
+    csv_dir = tmp_path / 'catalogs'
+    csv_dir.mkdir()
+    trigger_times = [START_TIME + timedelta(seconds=s) for s in (0.25, 1.5, 2.75)]
+    csv_paths = [str(csv_dir / 'FORGE16bApril24NetworkStage 1.csv'), str(csv_dir / 'FORGE16bApril24NetworkStage 2.csv')]
+    catalog(trigger_times[:2]).to_csv(csv_paths[0], index=False)
+    catalog(trigger_times[2:]).to_csv(csv_paths[1], index=False)
+    originals = [pd.read_csv(path, dtype=str) for path in csv_paths]
+
+    assert associate_all_csvs([str(csv_dir)], source_dir) == csv_paths
+    first, second = (pd.read_csv(path, dtype=str) for path in csv_paths)
+    for df, original in zip((first, second), originals):
+        pd.testing.assert_frame_equal(df[original.columns], original)  # e.g. 'Source' stays '147', not '147.0'
+    assert first['Matched File'].tolist() == filenames[:2]
+    assert second['Matched File'].tolist() == filenames[2:]
+    assert first['Sample Offset'].tolist() == ['250', '500']
+
+    # Catalogs that are already associated are only rewritten with force
+    assert associate_all_csvs([str(csv_dir)], source_dir) == []
+    assert associate_all_csvs([str(csv_dir)], source_dir, force=True) == csv_paths
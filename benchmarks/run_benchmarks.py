@@ -0,0 +1,302 @@
+"""
+Benchmark Suite of the FORGE DAS Processing Hot Paths
+
+This script measures the throughput and latency of the main processing paths on synthetic FORGE files
+(see synthetic_forge.py), so that performance regressions can be caught on a laptop instead of only on
+the Utah FORGE Petabyte storage system.
+
+Benchmarks:
+    - process_files:     downsampling throughput of the triplet (process_files) and streaming
+                         (process_files_streaming) methods of downsample/downsample.py, as files/s,
+                         MB/s of input data and peak RSS. Every run is done in a fresh process on a fresh
+                         copy of the synthetic archive, since the source files are removed
+    - slice_das_segment: latency of utils.slice_das_segment(fast=True) for windows inside one file,
+                         across a file boundary and over several files, with all and every 4th channel
+                         (warm page cache, median over the repetitions)
+    - association:       time of the vectorized catalog association (associate_catalog_dataset.associate_catalog)
+                         versus the number of catalog events and archive files, on synthetic catalogs and
+                         in-memory archive indexes
+
+Baseline:
+    baseline.json holds the results of a reference run with the default configuration, together with the
+    machine it ran on (platform, processor, CPU count, library versions) and the tolerance of the comparison
+    (30% by default). With --compare, every metric is compared with the baseline, and metrics that are worse
+    by more than the tolerance (relative; --tolerance overrides that of the baseline) are reported as
+    regressions (exit code 1). Timings, sizes and RSS are better when lower, rates (ending in '_per_s') when
+    higher. If the platform, processor or CPU count differ from those of the baseline, the comparison is
+    printed but no regressions are reported; record a baseline for that machine with --output and refresh
+    it after an intended change.
+
+Command Line Usage:
+    python run_benchmarks.py [--n_files 4 --n_channels 128] [--output results.json] [--compare baseline.json]
+    python run_benchmarks.py --output baseline.json [--tolerance 0.3]
+    python run_benchmarks.py --only association --compare baseline.json --tolerance 0.5
+
+Dependencies:
+    - dascore environment (see requirements.txt)
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy
+import h5py
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'downsample'))
+sys.path.append(os.path.join(ROOT_DIR, 'association'))
+from synthetic_forge import generate_archive, START_TIME
+from archive_index import ArchiveIndex
+from catalog import UTC_OFFSET
+
+BENCHMARKS = ('process_files', 'slice_das_segment', 'association')
+BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+MACHINE_KEYS = ('platform', 'processor', 'cpu_count')
+TOLERANCE = 0.3
+
+# Time windows of the slice_das_segment benchmark, in seconds after the start of the archive
+SLICE_WINDOWS = {
+    'within_file_1s': (3.0, 4.0),
+    'across_boundary_2s': (11.0, 13.0),
+    'three_files_26s': (5.0, 31.0),
+}
+
+
+def downsample_run(mode, source_dir, target_dir, up, down, channel_block):
+    """
+    Downsamples all files of source_dir (in a worker process), returns (wall time in seconds, peak RSS in bytes).
+    """
+    from downsample import process_files, process_files_streaming
+    from metrics import peak_rss
+
+    process = process_files_streaming if mode == 'streaming' else process_files
+    start = time.perf_counter()
+    process(source_dir, target_dir, 0, -1, up, down, None, channel_block)
+    return time.perf_counter() - start, peak_rss()
+
+
+def bench_process_files(archive_dir, work_dir, filenames, repeat, up=2, down=5, channel_block=256):
+    input_bytes = sum(os.path.getsize(os.path.join(archive_dir, f)) for f in filenames)
+    results = {}
+    for mode in ('triplet', 'streaming'):
+        walls, rss = [], []
+        for _ in range(repeat):
+            source_dir = os.path.join(work_dir, 'source')
+            target_dir = os.path.join(work_dir, 'target')
+            for directory in (source_dir, target_dir):
+                shutil.rmtree(directory, ignore_errors=True)
+            shutil.copytree(archive_dir, source_dir)
+            os.makedirs(target_dir)
+
+            # A fresh process per run, so that the peak RSS is that of the run only
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                wall, peak = executor.submit(downsample_run, mode, source_dir, target_dir, up, down,
+                                             channel_block).result()
+            walls.append(wall)
+            rss.append(peak)
+
+        wall = float(np.median(walls))
+        results[f'process_files/{mode}'] = {
+            'wall_s': wall,
+            'files_per_s': len(filenames) / wall,
+            'mb_per_s': input_bytes / 1e6 / wall,
+            'peak_rss_mb': max(rss) / 1e6 if None not in rss else None,
+        }
+    return results
+
+
+def bench_slice_das_segment(archive_dir, repeat):
+    from utils import slice_das_segment
+
+    ArchiveIndex.open(archive_dir)  # build the index outside of the timings
+    results = {}
+    for name, (start, end) in SLICE_WINDOWS.items():
+        start_time = (START_TIME + timedelta(seconds=start)).strftime("%Y%m%dT%H%M%S.%f")
+        end_time = (START_TIME + timedelta(seconds=end)).strftime("%Y%m%dT%H%M%S.%f")
+        for channels_name, channels in (('all_channels', None), ('every_4th_channel', slice(0, None, 4))):
+            latencies = []
+            for _ in range(repeat + 1):  # the first call warms the page cache
+                t0 = time.perf_counter()
+                slice_das_segment(start_time, end_time, archive_dir, channels=channels, fast=True)
+                latencies.append(time.perf_counter() - t0)
+            results[f'slice_das_segment/{name}/{channels_name}'] = {'latency_ms': 1e3 * float(np.median(latencies[1:]))}
+    return results
+
+
+def synthetic_index(n_files, duration=12.0, rate=10000.0, n_channels=1496):
+    """
+    Returns an in-memory ArchiveIndex of n_files consecutive files (no files on disk).
+    """
+    index = ArchiveIndex(tempfile.gettempdir())
+    start_ns = np.datetime64(START_TIME, 'ns').astype(np.int64)
+    index.filenames = np.array([f"16B_StrainRate_{k:05d}.h5" for k in range(n_files)])
+    index.start_ns = start_ns + np.arange(n_files, dtype=np.int64) * int(duration * 1e9)
+    index.n_samples = np.full(n_files, int(duration * rate), dtype=np.int64)
+    index.dt = np.full(n_files, 1 / rate)
+    index.n_channels = np.full(n_files, n_channels, dtype=np.int64)
+    index.seqno = np.arange(n_files, dtype=np.int64)
+    return index
+
+
+def synthetic_catalog(n_events, index, seed=0):
+    """
+    Returns a catalog with n_events random trigger times within the archive, in the local day-first
+    'Trig Date' / 'Trig Time' format of the FORGE catalogs.
+    """
+    rng = np.random.default_rng(seed)
+    trigger_ns = rng.integers(index.start_ns[0], index.end_ns[-1], n_events)
+    local_time = pd.to_datetime(np.sort(trigger_ns)) - UTC_OFFSET
+    return pd.DataFrame({'Source': np.arange(n_events),
+                         ' Trig Date ': local_time.strftime('%d/%m/%Y'),
+                         '    Trig Time   ': local_time.strftime('%H:%M:%S.%f')})
+
+
+def bench_association(catalog_sizes, archive_sizes, repeat):
+    from associate_catalog_dataset import associate_catalog
+
+    results = {}
+    for n_files in archive_sizes:
+        index = synthetic_index(n_files)
+        for n_events in catalog_sizes:
+            catalog = synthetic_catalog(n_events, index)
+            timings = []
+            for _ in range(repeat):
+                df = catalog.copy()
+                t0 = time.perf_counter()
+                associate_catalog(df, index)
+                timings.append(time.perf_counter() - t0)
+            assert df['Matched File'].notna().all()
+            results[f'association/catalog_{n_events}/archive_{n_files}'] = {'seconds': float(np.median(timings))}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints every metric next to its baseline value and returns the list of regressions (empty if the
+    baseline was measured on a different machine).
+    """
+    regressions = []
+    for name, metrics in results['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f"{name}: not in the baseline")
+            continue
+        for metric, value in metrics.items():
+            base = reference.get(metric)
+            if value is None or not base:
+                continue
+            higher_is_better = metric.endswith('_per_s')
+            change = (base - value) / base if higher_is_better else (value - base) / base
+            status = "REGRESSION" if change > tolerance else "ok"
+            verdict = f"{abs(100 * change):.0f}% {'worse' if change > 0 else 'better'}"
+            print(f"{name:60s} {metric:12s} {value:12.4g} (baseline {base:.4g}, {verdict}) {status}")
+            if change > tolerance:
+                regressions.append((name, metric, value, base))
+
+    if baseline['metadata'].get('config') != results['metadata']['config']:
+        print("Warning: the benchmark configuration differs from that of the baseline")
+    differences = [f"{key} {baseline['metadata'].get(key)} -> {results['metadata'][key]}"
+                   for key in MACHINE_KEYS if baseline['metadata'].get(key) != results['metadata'][key]]
+    if differences:
+        print(f"Warning: the baseline was measured on a different machine ({', '.join(differences)}); "
+              f"regressions are not reported. Record a baseline on this machine with --output")
+        return []
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FORGE DAS processing hot paths on synthetic data.")
+    parser.add_argument('--only', type=str, nargs='+', default=list(BENCHMARKS), choices=BENCHMARKS,
+                        help='Benchmarks to run')
+    parser.add_argument('--n_files', type=int, default=4, help='Number of synthetic files')
+    parser.add_argument('--n_channels', type=int, default=128,
+                        help='Number of channels of the synthetic files (1496 for the full FORGE shape)')
+    parser.add_argument('--duration', type=float, default=12.0, help='Duration of every file in seconds')
+    parser.add_argument('--rate', type=float, default=10000.0, help='Sampling rate in Hz')
+    parser.add_argument('--catalog_sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Numbers of catalog events of the association benchmark')
+    parser.add_argument('--archive_sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Numbers of archive files of the association benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions of every measurement (the median is reported)')
+    parser.add_argument('--workdir', type=str, default=None,
+                        help='Directory of the synthetic files (default: a temporary directory, removed at the end)')
+    parser.add_argument('--output', type=str, default=None, help='JSON file of the results')
+    parser.add_argument('--compare', type=str, nargs='?', const=BASELINE, default=None,
+                        help='Baseline JSON to compare the results with (default: baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help=f'Relative slowdown reported as a regression (default: that of the baseline, or {TOLERANCE})')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            parser.error(f"No baseline at {args.compare}; generate one with --output {args.compare}")
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    tolerance = args.tolerance
+    if tolerance is None:
+        tolerance = baseline['metadata'].get('tolerance', TOLERANCE) if baseline is not None else TOLERANCE
+
+    config = {k: getattr(args, k) for k in ('n_files', 'n_channels', 'duration', 'rate', 'catalog_sizes',
+                                            'archive_sizes', 'repeat')}
+    work_dir = args.workdir or tempfile.mkdtemp(prefix='forge_benchmarks_')
+    archive_dir = os.path.join(work_dir, 'archive')
+    results = {}
+    try:
+        if 'process_files' in args.only or 'slice_das_segment' in args.only:
+            filenames = generate_archive(archive_dir, args.n_files, args.duration, args.rate, args.n_channels)
+        if 'process_files' in args.only:
+            results.update(bench_process_files(archive_dir, work_dir, filenames, args.repeat))
+        if 'slice_das_segment' in args.only:
+            results.update(bench_slice_das_segment(archive_dir, args.repeat))
+        if 'association' in args.only:
+            results.update(bench_association(args.catalog_sizes, args.archive_sizes, args.repeat))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'metadata': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'h5py': h5py.__version__,
+            'config': config,
+            'tolerance': tolerance,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {100 * tolerance:.0f}%")
+            sys.exit(1)
+    else:
+        print(json.dumps(results['results'], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Synthetic FORGE DAS Files for Benchmarks
+
+This script writes synthetic DAS recordings in the format of the Utah FORGE 16B HDF5 files, so that the
+processing scripts can be benchmarked and tried out without access to the FORGE Petabyte storage system.
+
+File Format:
+    - Naming: "16B_StrainRate_YYYYMMDDTHHMMSS+0000_NNNNN.h5", one file per `duration` seconds with
+      consecutive sequence numbers, as in the FORGE archive
+    - Dataset: '/Acoustic' [time_samples, channels], float32 by default, stored contiguously (so that it
+      is memory-mapped by das_io.open_acoustic) or chunked
+    - Attributes: 'TimeSamplingInterval(seconds)', 'InterrogationRate(Hz)' and 'NumberOfLoci'
+    - The default shape is that of the FORGE April 2024 recordings: 12 s at 10 kHz and 1496 channels
+      (120000 x 1496 samples, 718 MB per file)
+
+Signal:
+    Gaussian noise with a few Ricker wavelets propagating along the fiber, so that the data is neither
+    constant nor trivially compressible. The files are reproducible for a given seed.
+
+Live Writing (--interval):
+    Writes one file every `interval` seconds, each in place and block by block as the acquisition does,
+    to try out the live mode of downsample/live.py
+
+Command Line Usage:
+    python synthetic_forge.py --target_dir /tmp/forge_synthetic --n_files 10 [--n_channels 1496] [--rate 10000]
+    python synthetic_forge.py --target_dir /tmp/live_source --n_files 20 --interval 12
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import time
+import h5py
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+
+START_TIME = datetime(2024, 4, 8, 15, 43, 0)
+FIRST_SEQNO = 44000
+
+
+def synthetic_filename(start_time, seqno):
+    return f"16B_StrainRate_{start_time:%Y%m%dT%H%M%S}+0000_{seqno:05d}.h5"
+
+
+def ricker(t, f0):
+    a = (np.pi * f0 * t) ** 2
+    return (1 - 2 * a) * np.exp(-a)
+
+
+def synthetic_block(rng, row_start, n_rows, n_channels, rate, events, dtype):
+    """
+    Returns the samples row_start:row_start + n_rows of a synthetic recording: unit Gaussian noise and
+    Ricker wavelets with the given (onset time in seconds, moveout in seconds per channel, peak frequency, amplitude).
+    """
+    block = rng.standard_normal((n_rows, n_channels), dtype=np.float32)
+    t = (row_start + np.arange(n_rows))[:, None] / rate
+    for onset, moveout, f0, amplitude in events:
+        arrival = onset + moveout * np.arange(n_channels)[None, :]
+        if t[-1, 0] < arrival.min() - 2 / f0 or t[0, 0] > arrival.max() + 2 / f0:
+            continue
+        block += (amplitude * ricker(t - arrival, f0)).astype(np.float32)
+    return block.astype(dtype, copy=False)
+
+
+def write_synthetic_file(path, n_samples=120000, n_channels=1496, rate=10000.0, dtype='float32', chunks=None,
+                         n_events=2, seed=0, block_rows=10000):
+    """
+    Writes one synthetic FORGE file, block_rows rows at a time so that memory stays bounded.
+    chunks: chunk shape of the 'Acoustic' dataset (None: contiguous).
+    """
+    rng = np.random.default_rng(seed)
+    duration = n_samples / rate
+    events = [(rng.uniform(0, duration), rng.uniform(-2e-4, 2e-4), rng.uniform(50, 500), rng.uniform(5, 20))
+              for _ in range(n_events)]
+
+    with h5py.File(path, 'w') as f:
+        dataset = f.create_dataset('Acoustic', shape=(n_samples, n_channels), dtype=dtype, chunks=chunks)
+        dataset.attrs['TimeSamplingInterval(seconds)'] = 1 / rate
+        dataset.attrs['InterrogationRate(Hz)'] = rate
+        dataset.attrs['NumberOfLoci'] = n_channels
+        for row in range(0, n_samples, block_rows):
+            n_rows = min(block_rows, n_samples - row)
+            dataset[row:row + n_rows] = synthetic_block(rng, row, n_rows, n_channels, rate, events, dtype)
+
+
+def generate_archive(target_dir, n_files=3, duration=12.0, rate=10000.0, n_channels=1496, dtype='float32',
+                     chunks=None, start_time=START_TIME, first_seqno=FIRST_SEQNO, seed=0):
+    """
+    Writes n_files consecutive synthetic files of `duration` seconds to target_dir (existing files are kept)
+    and returns their filenames.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    n_samples = int(round(duration * rate))
+    filenames = []
+    for i in range(n_files):
+        filename = synthetic_filename(start_time + timedelta(seconds=duration * i), first_seqno + i)
+        path = os.path.join(target_dir, filename)
+        if not os.path.exists(path):
+            write_synthetic_file(path, n_samples, n_channels, rate, dtype, chunks, seed=seed + i)
+        filenames.append(filename)
+    return filenames
+
+
+def write_live(target_dir, n_files=10, interval=12.0, duration=12.0, rate=10000.0, n_channels=1496, dtype='float32',
+               chunks=None, start_time=START_TIME, first_seqno=FIRST_SEQNO, seed=0):
+    """
+    Writes n_files consecutive synthetic files to target_dir, starting one every `interval` seconds,
+    and returns their filenames.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    n_samples = int(round(duration * rate))
+    filenames = []
+    for i in range(n_files):
+        started = time.time()
+        filename = synthetic_filename(start_time + timedelta(seconds=duration * i), first_seqno + i)
+        write_synthetic_file(os.path.join(target_dir, filename), n_samples, n_channels, rate, dtype, chunks,
+                             seed=seed + i)
+        filenames.append(filename)
+        print(f"Wrote {filename}", flush=True)
+        if i < n_files - 1:
+            time.sleep(max(0.0, interval - (time.time() - started)))
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic DAS files in the FORGE HDF5 format.")
+    parser.add_argument('--target_dir', type=str, required=True, help='Directory of the synthetic files')
+    parser.add_argument('--n_files', type=int, default=3, help='Number of consecutive files')
+    parser.add_argument('--duration', type=float, default=12.0, help='Duration of every file in seconds')
+    parser.add_argument('--rate', type=float, default=10000.0, help='Sampling rate in Hz')
+    parser.add_argument('--n_channels', type=int, default=1496, help='Number of channels')
+    parser.add_argument('--dtype', type=str, default='float32', help="dtype of the 'Acoustic' dataset")
+    parser.add_argument('--chunks', type=str, default=None,
+                        help="Chunk shape of the 'Acoustic' dataset, e.g. '4800,64' (default: contiguous)")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the first file')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='Write one file every this many seconds, like the live acquisition (default: all at once)')
+    args = parser.parse_args()
+
+    chunks = tuple(int(c) for c in args.chunks.split(',')) if args.chunks else None
+    if args.interval is not None:
+        write_live(args.target_dir, args.n_files, args.interval, args.duration, args.rate, args.n_channels, args.dtype,
+                   chunks, seed=args.seed)
+        return
+    filenames = generate_archive(args.target_dir, args.n_files, args.duration, args.rate, args.n_channels, args.dtype,
+                                 chunks, seed=args.seed)
+    print(f"Wrote {len(filenames)} files to {args.target_dir}: {filenames[0]} ... {filenames[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+In-Process Cache of Decoded FORGE DAS Blocks
+
+This module provides a bounded LRU cache of decoded 'Acoustic' blocks, shared across slicing calls
+(e.g. repeated slice_das_segment calls on nearby times in the visualization notebooks), so that the
+same 12-second files are not re-read from network storage.
+
+Cache Layout:
+    - Blocks are keyed by (file, row range, channel range), where row ranges are aligned to
+      `block_rows` rows, so that overlapping requests share blocks
+    - Least recently used blocks are evicted once the cached bytes exceed `max_bytes`
+    - With a `spill_dir`, evicted blocks are written to local disk as .npy files (bounded by
+      `max_spill_bytes`) and loaded back from there on the next request
+    - Hit, miss, spill and eviction counters are available through stats()
+
+Usage Example:
+    from block_cache import BlockCache
+    from utils import slice_das_segment
+
+    cache = BlockCache(max_bytes=4 * 2**30, spill_dir="/tmp/das_cache")
+    segment = slice_das_segment("20240408T154305", "20240408T154307", source_dir, fast=True, cache=cache)
+    print(cache.stats())
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from das_io import open_acoustic
+
+
+class BlockCache:
+    """
+    Byte-size bounded LRU cache of decoded DAS blocks, with an optional local-disk spill directory.
+    Cached blocks are returned read-only.
+    """
+
+    def __init__(self, max_bytes=2 * 2**30, block_rows=10000, spill_dir=None, max_spill_bytes=None):
+        self.max_bytes = int(max_bytes)
+        self.block_rows = int(block_rows)
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+
+        self._blocks = OrderedDict()   # key -> array, least recently used first
+        self._spilled = OrderedDict()  # key -> (spill path, bytes)
+        self._lock = threading.Lock()
+        self.n_bytes = 0
+        self.n_spill_bytes = 0
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def stats(self):
+        """
+        Returns the cache counters and sizes as a dict.
+        """
+        return {'hits': self.hits, 'spill_hits': self.spill_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'blocks': len(self._blocks), 'bytes': self.n_bytes,
+                'spilled_blocks': len(self._spilled), 'spill_bytes': self.n_spill_bytes}
+
+    def clear(self):
+        with self._lock:
+            for path, _ in self._spilled.values():
+                self._remove(path)
+            self._blocks.clear()
+            self._spilled.clear()
+            self.n_bytes = 0
+            self.n_spill_bytes = 0
+
+    def get(self, key):
+        """
+        Returns the cached block of key, or None.
+        """
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return block
+
+            spilled = self._spilled.pop(key, None)
+            if spilled is None:
+                self.misses += 1
+                return None
+            path, n_bytes = spilled
+            self.n_spill_bytes -= n_bytes
+
+        # Load outside the lock; the block moves back from the spill directory to memory
+        block = np.load(path)
+        self._remove(path)
+        with self._lock:
+            self.spill_hits += 1
+        self.put(key, block)
+        return self._blocks.get(key, block)
+
+    def put(self, key, block):
+        """
+        Adds a block to the cache, evicting (or spilling) the least recently used blocks if needed.
+        """
+        if block.nbytes > self.max_bytes:
+            return
+        block.setflags(write=False)
+        evicted = []
+        with self._lock:
+            if key in self._blocks:
+                self.n_bytes -= self._blocks.pop(key).nbytes
+            self._blocks[key] = block
+            self.n_bytes += block.nbytes
+            while self.n_bytes > self.max_bytes:
+                old_key, old_block = self._blocks.popitem(last=False)
+                self.n_bytes -= old_block.nbytes
+                self.evictions += 1
+                evicted.append((old_key, old_block))
+
+        if self.spill_dir is not None:
+            for old_key, old_block in evicted:
+                self._spill(old_key, old_block)
+
+    def _spill(self, key, block):
+        path = os.path.join(self.spill_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.npy')
+        np.save(path, block)
+        with self._lock:
+            self._spilled[key] = (path, block.nbytes)
+            self.n_spill_bytes += block.nbytes
+            removed = []
+            while self.max_spill_bytes is not None and self.n_spill_bytes > self.max_spill_bytes:
+                _, (old_path, n_bytes) = self._spilled.popitem(last=False)
+                self.n_spill_bytes -= n_bytes
+                removed.append(old_path)
+        for old_path in removed:
+            self._remove(old_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def read(self, file_path, row_start, row_end, channels=slice(None), shape=None):
+        """
+        Returns the rows [row_start, row_end) and channels of the 'Acoustic' dataset of file_path,
+        serving the aligned blocks from the cache and reading only the missing ones (in one hyperslab).
+        shape: (n_samples, n_channels) of the dataset if known (e.g. from the archive index), which
+               avoids opening the file when all blocks are cached.
+        """
+        if shape is None:
+            with open_acoustic(file_path) as dataset:
+                shape = dataset.shape
+        n_samples, n_channels = shape
+        channel_range = channels.indices(n_channels)
+        file_key = os.path.abspath(file_path)
+
+        first_block = row_start // self.block_rows
+        last_block = max(first_block, (row_end - 1) // self.block_rows)
+        keys = [(file_key, b * self.block_rows, min((b + 1) * self.block_rows, n_samples)) + channel_range
+                for b in range(first_block, last_block + 1)]
+        blocks = [self.get(key) for key in keys]
+
+        missing = [i for i, block in enumerate(blocks) if block is None]
+        if missing:
+            read_start, read_end = keys[missing[0]][1], keys[missing[-1]][2]
+            with open_acoustic(file_path) as dataset:
+                data = dataset[read_start:read_end, slice(*channel_range)]
+            for i in range(missing[0], missing[-1] + 1):
+                block = blocks[i]
+                if block is None:
+                    block = data[keys[i][1] - read_start:keys[i][2] - read_start].copy()
+                    self.put(keys[i], block)
+                    blocks[i] = block
+
+        offset = first_block * self.block_rows
+        if len(blocks) == 1:
+            return blocks[0][row_start - offset:row_end - offset]
+        return np.concatenate(blocks, axis=0)[row_start - offset:row_end - offset]
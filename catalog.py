@@ -0,0 +1,224 @@
+"""
+FORGE Stimulation Catalog Store
+
+This module loads the FORGE 16A/16B stimulation catalogs (GES16Aand16BStimulationMonitoringApril2024)
+once into a single in-memory table, and caches it on disk, so that notebooks and scripts can start
+from a filtered DataFrame instead of re-parsing the padded CSV files.
+
+Catalog Table:
+    - Column names are normalized as in the notebooks: stripped, with spaces replaced by '_'
+      (e.g. ' Trig Date ' -> 'Trig_Date', '    Trig Time   ' -> 'Trig_Time')
+    - 'Trigger_UTC' and 'Origin_UTC': UTC datetimes, parsed vectorized from the day-first local
+      dates and times (local time + 6 hours = UTC); NaT where missing or malformed
+    - 'Well' ('16A' or '16B'), 'Catalog_Stage' (e.g. 'Stage 7C', 'Post Stim A', 'Background') and
+      'Source_File' tags, taken from the catalog file names
+    - String values are stripped
+
+Caching:
+    The table is stored as a columnar .npz file (by default 'catalog_cache_<digest>.npz' in the cache
+    directory of archive_index.py, ~/.cache/forge-das, so that the catalog folders are never written to),
+    together with the paths and modification times of the CSV files.
+    The cache is rebuilt whenever a catalog is added, removed or modified (e.g. by the association script).
+
+Command Line Usage:
+    python catalog.py --csv_dirs /path/to/16AStimulationCatalogues /path/to/16BStimulationCatalogues
+
+Usage Example:
+    from catalog import load_catalogs, query_catalog
+
+    catalog = load_catalogs()
+    events = query_catalog(catalog, wells='16B', stages='Stage 3', start_time="2024-04-11T10:00")
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import re
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+from archive_index import cache_dir
+
+CATALOG_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GES16Aand16BStimulationMonitoringApril2024')
+CATALOG_DIRS = (os.path.join(CATALOG_ROOT, '16AStimulationCatalogues'),
+                os.path.join(CATALOG_ROOT, '16BStimulationCatalogues'))
+UTC_OFFSET = pd.Timedelta(hours=6)
+
+
+def normalize_name(column):
+    return column.strip().replace(' ', '_')
+
+
+def default_cache_path(csv_dirs):
+    """
+    Returns the default path of the cache of the catalogs of csv_dirs in the cache directory.
+    """
+    key = '\n'.join(sorted(os.path.realpath(d) for d in csv_dirs))
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    return os.path.join(cache_dir(), f"catalog_cache_{digest}.npz")
+
+
+def catalog_files(csv_dirs):
+    """
+    Returns the sorted paths of the FORGE*.csv catalogs of the given directories.
+    """
+    return [os.path.join(csv_dir, f) for csv_dir in csv_dirs
+            for f in sorted(os.listdir(csv_dir)) if f.endswith(".csv") and f.startswith("FORGE")]
+
+
+def parse_catalog_times(df, kind='Trig'):
+    """
+    Returns the UTC times of a catalog (kind 'Trig' or 'Origin') as a datetime Series (NaT where missing
+    or malformed). Works on raw and normalized column names.
+    """
+    columns = {normalize_name(c): c for c in df.columns}
+    dates = df[columns[f'{kind}_Date']].astype(str).str.strip()
+    times = df[columns[f'{kind}_Time']].astype(str).str.strip()
+    local_time = pd.to_datetime(dates + ' ' + times, format="%d/%m/%Y %H:%M:%S.%f", errors='coerce')
+    return local_time + UTC_OFFSET
+
+
+def catalog_tags(csv_path):
+    """
+    Returns (well, stage) of a catalog file, e.g. ('16A', 'Stage 7C') for 'FORGE16aApril24BackgroundStage 7C.csv'.
+    """
+    filename = os.path.basename(csv_path)
+    well = re.match(r'FORGE(16[ab])', filename, re.IGNORECASE)
+    stage = re.search(r'April24(?:Background|Network)(.*)\.csv$', filename)
+    well = well.group(1).upper() if well else ''
+    stage = (stage.group(1).strip() if stage else '') or 'Background'
+    return well, stage
+
+
+def _is_text(values):
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+
+
+def parse_catalog(csv_path):
+    """
+    Loads one catalog CSV with normalized column names, stripped strings, UTC times and file tags.
+    """
+    df = pd.read_csv(csv_path)
+    df.columns = [normalize_name(c) for c in df.columns]
+    for column in df.columns:
+        if _is_text(df[column]):
+            df[column] = df[column].str.strip()
+
+    df['Trigger_UTC'] = parse_catalog_times(df, 'Trig')
+    df['Origin_UTC'] = parse_catalog_times(df, 'Origin')
+    df['Well'], df['Catalog_Stage'] = catalog_tags(csv_path)
+    df['Source_File'] = os.path.basename(csv_path)
+    return df
+
+
+def _file_state(csv_paths):
+    return np.array([os.stat(path).st_mtime_ns for path in csv_paths], dtype=np.int64)
+
+
+def save_cache(df, cache_path, csv_paths):
+    """
+    Writes the table as columnar .npz: one array per column (strings with a mask of missing values),
+    and the column dtypes.
+    """
+    arrays = {'csv_paths': np.array(csv_paths, dtype=str), 'csv_mtime_ns': _file_state(csv_paths),
+              'columns': np.array(df.columns, dtype=str), 'dtypes': np.array([str(t) for t in df.dtypes], dtype=str)}
+    for k, column in enumerate(df.columns):
+        values = df[column]
+        if _is_text(values):
+            arrays[f'missing_{k}'] = values.isna().to_numpy()
+            arrays[f'column_{k}'] = values.fillna('').to_numpy(dtype=str)
+        else:
+            arrays[f'column_{k}'] = values.to_numpy()
+
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def load_cache(cache_path, csv_paths):
+    """
+    Returns the cached table, or None if the cache is missing, unreadable or stale.
+    The columns have the dtypes of the parsed table (e.g. object for mixed 'Stage' values, not str).
+    """
+    try:
+        with np.load(cache_path) as table:
+            if (table['csv_paths'].tolist() != list(csv_paths)
+                    or not np.array_equal(table['csv_mtime_ns'], _file_state(csv_paths))):
+                return None
+            columns = {}
+            for k, (column, dtype) in enumerate(zip(table['columns'], table['dtypes'])):
+                values = pd.Series(table[f'column_{k}'], dtype=object if f'missing_{k}' in table else None)
+                if f'missing_{k}' in table:
+                    values = values.where(~table[f'missing_{k}'])
+                columns[str(column)] = values.astype(str(dtype))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return pd.DataFrame(columns)
+
+
+def load_catalogs(csv_dirs=CATALOG_DIRS, cache_path=None, refresh=False):
+    """
+    Returns all FORGE catalogs of csv_dirs as one table (see the module docstring), from the cache
+    if it is up to date with the CSV files, otherwise parsed from the CSVs and cached.
+    cache_path: path of the .npz cache (default: default_cache_path(csv_dirs)); False disables it.
+    """
+    csv_paths = catalog_files(csv_dirs)
+    if cache_path is None:
+        cache_path = default_cache_path(csv_dirs)
+
+    if cache_path and not refresh:
+        df = load_cache(cache_path, csv_paths)
+        if df is not None:
+            return df
+
+    df = pd.concat([parse_catalog(path) for path in csv_paths], ignore_index=True)
+
+    # Columns that are numeric in some catalogs and text in others (e.g. 'Stage': 7 and '7b') become text
+    for column in df.columns:
+        if pd.api.types.is_object_dtype(df[column]):
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+
+    if cache_path:
+        save_cache(df, cache_path, csv_paths)
+    return df
+
+
+def query_catalog(df, wells=None, stages=None, start_time=None, end_time=None, min_magnitude=None):
+    """
+    Returns the events of the table matching all given filters: well(s), catalog stage(s),
+    trigger time range [start_time, end_time] (UTC) and minimum moment magnitude.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if wells is not None:
+        mask &= df['Well'].isin(np.atleast_1d(wells)).to_numpy()
+    if stages is not None:
+        mask &= df['Catalog_Stage'].isin(np.atleast_1d(stages)).to_numpy()
+    if start_time is not None:
+        mask &= (df['Trigger_UTC'] >= pd.Timestamp(start_time)).to_numpy()
+    if end_time is not None:
+        mask &= (df['Trigger_UTC'] <= pd.Timestamp(end_time)).to_numpy()
+    if min_magnitude is not None:
+        mask &= (df['MomMag'] >= min_magnitude).to_numpy()
+    return df[mask]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse and cache the FORGE stimulation catalogs.")
+    parser.add_argument('--csv_dirs', type=str, nargs='+', default=list(CATALOG_DIRS),
+                        help='Directories containing FORGE*.csv catalog files')
+    parser.add_argument('--cache', type=str, default=None, help='Path of the cache file (default: in ~/.cache/forge-das, or $XDG_CACHE_HOME/$FORGE_DAS_CACHE)')
+    parser.add_argument('--refresh', action='store_true', help='Rebuild the cache even if it is up to date')
+    args = parser.parse_args()
+
+    df = load_catalogs(args.csv_dirs, args.cache, args.refresh)
+    print(f"{len(df)} events from {df['Source_File'].nunique()} catalogs")
+    print(df.groupby(['Well', 'Catalog_Stage']).size().to_string())
+
+
+if __name__ == "__main__":
+    main()
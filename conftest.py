@@ -0,0 +1,32 @@
+"""
+Shared pytest fixtures: short synthetic archives in the FORGE format (see benchmarks/synthetic_forge.py),
+and a temporary cache directory so that the tests never touch the archive indexes of ~/.cache/forge-das.
+
+Run the tests from the repository root with:
+    python -m pytest -q
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from synthetic_forge import generate_archive
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('FORGE_DAS_CACHE', str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def make_archive(tmp_path):
+    """
+    Returns make(name, n_files, ...), which writes a synthetic archive of 1 s files (1000 samples, 8 channels)
+    to tmp_path/name and returns (directory, filenames). Archives with the same arguments have the same data,
+    so that a run that removes its sources can be compared with another one.
+    """
+    def make(name='archive', n_files=5, duration=1.0, rate=1000.0, n_channels=8, **kwargs):
+        directory = str(tmp_path / name)
+        return directory, generate_archive(directory, n_files, duration, rate, n_channels, **kwargs)
+    return make
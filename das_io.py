@@ -0,0 +1,122 @@
+"""
+FORGE DAS HDF5 Input/Output Helpers
+
+This module provides helpers for reading and writing FORGE DAS HDF5 files, shared by the
+downsampling, slicing and analysis scripts.
+
+Key Functionality:
+    - Zero-copy reads of contiguous, uncompressed 'Acoustic' datasets through np.memmap, with a
+      fallback to regular h5py reads for chunked or compressed files
+    - Creating fresh output files that carry over the metadata of a source file
+      (root attributes, auxiliary groups and the 'Acoustic' dataset attributes)
+    - Configurable chunk shape and built-in h5py compression (gzip, lzf, shuffle) of the
+      'Acoustic' dataset
+
+File Format:
+    Dataset: '/Acoustic' containing strain rate data [time_samples, channels]
+    Attributes: 'TimeSamplingInterval(seconds)', 'InterrogationRate(Hz)'
+
+Usage Example:
+    from das_io import open_acoustic, create_output
+
+    with open_acoustic(source_path) as data:
+        block = data[1000:2000, 100:200]  # memmap view if the dataset is contiguous
+
+    with create_output(source_path, target_path, shape=(48000, 1496), compression='lzf') as f:
+        f['Acoustic'][...] = data_downsampled
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import h5py
+import numpy as np
+from contextlib import contextmanager
+
+COMPRESSIONS = ('gzip', 'lzf')
+
+
+def memmap_acoustic(file_path):
+    """
+    Returns the 'Acoustic' dataset of file_path as a read-only np.memmap, or None if the dataset
+    is not stored contiguously and uncompressed in the file itself (chunked, filtered, external
+    or not yet allocated). Slices of the memmap are views, read through the OS page cache.
+    """
+    with h5py.File(file_path, 'r') as f:
+        dataset = f['Acoustic']
+        plist = dataset.id.get_create_plist()
+        if (plist.get_layout() != h5py.h5d.CONTIGUOUS or plist.get_nfilters() or plist.get_external_count()
+                or dataset.dtype.hasobject):
+            return None
+        offset = dataset.id.get_offset()
+        if offset is None:
+            return None
+        shape, dtype = dataset.shape, dataset.dtype
+
+    return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+@contextmanager
+def open_acoustic(file_path, mmap=True):
+    """
+    Opens the 'Acoustic' dataset of file_path for slicing, e.g. data[rows, channels].
+
+    Yields a memory-mapped array (see memmap_acoustic) when possible and mmap is True,
+    otherwise the h5py dataset, which is kept open until the context exits.
+    """
+    data = memmap_acoustic(file_path) if mmap else None
+    if data is not None:
+        yield data
+        return
+    with h5py.File(file_path, 'r') as f:
+        yield f['Acoustic']
+
+
+def read_block(data, rows=slice(None), channels=slice(None)):
+    """
+    Returns data[rows, channels] as an in-memory array (memory-mapped slices are copied, so that the
+    read happens here and not when the block is first used).
+    """
+    block = data[rows, channels]
+    return np.array(block) if isinstance(block, np.memmap) else block
+
+
+def copy_metadata(source, target, exclude=('Acoustic',)):
+    """
+    Copies the root attributes and every group/dataset except those in `exclude` between two open h5py files.
+    """
+    for key, value in source.attrs.items():
+        target.attrs[key] = value
+    for name in source:
+        if name not in exclude:
+            source.copy(source[name], target, name=name)
+
+
+def create_output(source_path, target_path, shape, dtype=None, chunks=None, compression=None,
+                  compression_opts=None, shuffle=False):
+    """
+    Creates target_path as a new HDF5 file with the metadata of source_path and an empty 'Acoustic'
+    dataset of the given shape, and returns it opened for writing.
+
+    The 'Acoustic' dataset keeps the dtype (unless given) and attributes of the source dataset.
+    Without chunks and compression it is stored contiguously; otherwise h5py chunking and the
+    given compression filter ('gzip' or 'lzf', optionally preceded by the shuffle filter) are used.
+    """
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {COMPRESSIONS} or None")
+
+    with h5py.File(source_path, 'r') as source:
+        dataset = source['Acoustic']
+        target = h5py.File(target_path, 'w')
+        try:
+            copy_metadata(source, target)
+            dataset_new = target.create_dataset('Acoustic', shape=shape, dtype=dtype or dataset.dtype,
+                                                chunks=chunks, compression=compression,
+                                                compression_opts=compression_opts, shuffle=shuffle or None)
+            for key, value in dataset.attrs.items():
+                dataset_new.attrs[key] = value
+        except Exception:
+            target.close()
+            raise
+
+    return target
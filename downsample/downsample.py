@@ -7,7 +7,8 @@ their temporal resolution while preserving signal integrity through anti-aliasin
 
 Key Features:
     - Temporal downsampling with configurable ratios (default: 2.5x reduction)
-    - Anti-aliasing using polyphase filtering (scipy.signal.resample_poly)
+    - Anti-aliasing using polyphase filtering (scipy.signal.resample_poly) by default, or one of the
+      other resampling engines of resampling.py (--engine polyphase|fft|iir), for any integer up/down
     - Edge-aware processing for temporal continuity across file boundaries
     - Batch processing with parallel execution support
     - Comprehensive logging and progress tracking
@@ -17,7 +18,7 @@ Algorithm Overview:
     2. Concatenate adjacent files to avoid edge artifacts
     3. Apply polyphase resampling with anti-aliasing
     4. Extract the target file segment from the resampled data
-    5. Update HDF5 metadata (sampling rate, interrogation rate)
+    5. Write a new HDF5 file with the source metadata and updated sampling rate and interrogation rate
     6. Clean up intermediate files to manage storage
 
 File Processing Strategy:
@@ -26,11 +27,62 @@ File Processing Strategy:
     - Last file: Uses previous file for edge continuity
     - Original files are removed after successful processing
 
+Streaming Mode (--streaming):
+    - Each file is read and filtered exactly once instead of three times
+    - A short tail of samples (the FIR filter context) is carried across file boundaries
+    - The output of a file is written once the head of the next file has been read
+    - Produces the same output as the triplet method (see resampling.py)
+
+Pyramid Mode (--pyramid 1/4,1/5):
+    - Writes a cascade of decimated levels (e.g. 2.5x, 10x, 50x) from a single read of the source files
+    - Every level resamples the output of the previous level with its own streaming resampler
+    - Each level is written to its own subdirectory of the target directory (x2.5, x10, x50), with the
+      'TimeSamplingInterval(seconds)' and 'InterrogationRate(Hz)' attributes of its sampling rate
+    - Source files are removed once all levels have been written
+
+Spatial Decimation (--spatial_spacing, --gauge_length, --md_range):
+    - Reduces the channels of every output file along measured depth, using the interpolated channel
+      positions of channel_interpolation/ (see spatial.py): uniform resampling with anti-aliasing,
+      averaging over a gauge length, and/or keeping only a measured depth interval
+    - The positions of the output channels are written to the 'ChannelPositions' group of every file
+
+Pipelined I/O (--prefetch N, --write_queue N):
+    - A reader thread loads the next N files while the current one is resampled, and a writer thread
+      writes the finished outputs and removes the source files (in order), see pipeline.py
+    - The wall time per file approaches max(read, compute, write) instead of their sum, at the cost
+      of holding the prefetched inputs and queued outputs in memory
+    - Works with the triplet, streaming and parallel modes
+
+Metrics (--metrics, --prometheus, --summary_every):
+    - Per-file timings of the open, read, concat, resample, write and delete stages, bytes read and
+      written, throughput and peak RSS, appended as JSONL records (by default next to the log file)
+    - A rolling summary (files/s, MB/s, ETA, p50/p95 per stage, I/O share) is logged every N files, and
+      optionally written to a Prometheus textfile to monitor long SLURM jobs (see metrics.py)
+
+Crash Safety and Resume (--resume):
+    - Every output is written to '<name>.partial' and renamed once complete, then recorded in a journal
+      of completed outputs in the target directory (see journal.py)
+    - With --resume, leftover partial files are removed and the files whose outputs are verified
+      complete (journaled size and shape) are skipped; their sources are still read as neighbours
+      (halos) of the remaining files, so the result is the same as that of an uninterrupted run
+    - The same command line can simply be resubmitted after the SLURM time limit, without --start_idx
+    - Not supported with --pyramid
+
+Live Mode:
+    - live.py downsamples the files as they arrive during monitoring, with the same streaming resampler
+      and a bounded latency at the live edge
+
+Parallel Mode (--workers N):
+    - The sorted file list is split into N contiguous shards, processed in a process pool
+    - Each shard reads the tail of the preceding and the head of the following file (halo files)
+    - Shard edge files are removed only after both shards that read them have finished
+
 Command Line Usage:
     python downsample.py --source_dir /path/to/input \\
                         --target_dir /path/to/output \\
                         --start_idx 0 --end_idx 1000 \\
-                        --up 2 --down 5
+                        --up 2 --down 5 [--engine polyphase] [--streaming] [--workers N] [--prefetch 2 --write_queue 2] [--pyramid 1/4,1/5]
+                        [--spatial_spacing 5] [--md_range 2400,3100] [--prometheus /path/to/downsample.prom]
 
 Note:
     - The starting and ending indices refer to the list of filenames generated by generate_filenames.py.
@@ -48,8 +100,10 @@ File Format:
 Performance Notes:
     - Tested on Utah FORGE Petabyte storage system
     - Processes ~12-second files with typical processing time <30 seconds per file
-    - Memory usage scales with file size and resampling parameters
-    - Supports parallel execution via multiple script instances
+    - Memory usage scales with file size and resampling parameters; --channel_block bounds it by
+      resampling a block of channels at a time, in the dtype of the source data (e.g. float32)
+    - Supports parallel execution via --workers or multiple script instances
+    - Throughput and peak memory can be measured on synthetic FORGE files with benchmarks/run_benchmarks.py
 
 Author: Danilo Dordevic
 Last Updated: August 2025
@@ -57,15 +111,26 @@ Tested Environment: Utah FORGE Petabyte Storage System
 """
 
 import os
-import h5py
+import sys
 import time
-import shutil
 import logging
 import argparse
 import pickle
 import numpy as np
 from datetime import datetime
-from scipy.signal import resample_poly, resample
+from functools import partial
+from fractions import Fraction
+from contextlib import ExitStack, contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from resampling import ResamplerCascade, ENGINES, make_engine
+from spatial import SpatialDecimator, load_channel_positions, CHANNEL_POSITIONS
+from metrics import RunMetrics, NULL_METRICS
+from journal import Journal, partial_path, remove_partial_files
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from das_io import create_output, open_acoustic, read_block
+from pipeline import Prefetcher, BackgroundWriter, read_file
+from archive_index import ArchiveIndex
 
 
 # Function definitions
@@ -77,15 +142,19 @@ def timestampFromFilename(filename):
     return filename.split("StrainRate_")[1].split("+")[0]
 
 
-def process_files(source_dir, target_dir, start_idx, end_idx, up, down, filenames):
-    resample_ratio = up / down
-
+def load_filenames(source_dir, filenames, start_idx, end_idx, index_path=None):
+    """
+    Returns the chronologically sorted filenames between start_idx and end_idx (inclusive),
+    together with the clipped indices. The sorted list is cached in the `filenames` pickle;
+    if it does not exist yet, it is taken from the archive index of source_dir.
+    """
     # Sort the filenames according to the date
-    if not os.path.exists(filenames):
-        files = [f for f in os.listdir(source_dir) if f.endswith('.h5') and f.startswith('16B')]
-        files = sorted(files, key=lambda f: timestamp2datetime(timestampFromFilename(f)))
-        with open(filenames, "wb") as f:
-            pickle.dump(files, f)
+    if filenames is None or not os.path.exists(filenames):
+        index = ArchiveIndex.open(source_dir, index_path)
+        files = [f for f in index.filenames.tolist() if f.startswith('16B')]
+        if filenames is not None:
+            with open(filenames, "wb") as f:
+                pickle.dump(files, f)
     else:
         with open(filenames, "rb") as f:
             files = pickle.load(f)
@@ -97,124 +166,589 @@ def process_files(source_dir, target_dir, start_idx, end_idx, up, down, filename
     if end_idx == -1:
         end_idx = len(files) - 1
 
-    files = files[start_idx:end_idx + 1]
-
-    # Start downsampling
-    logging.info(f"Starting downsampling of {len(files)} files...")
-
-    # Process first file
-    file1_path = os.path.join(source_dir, files[0])
-    file2_path = os.path.join(source_dir, files[1])
-
-    file1_path_new = os.path.join(target_dir, files[0])
-    shutil.copyfile(file1_path, file1_path_new)
-
-    with h5py.File(file1_path_new, 'r+') as f1, \
-         h5py.File(file2_path, 'r') as f2:
-
-        dataset1 = f1['Acoustic']
-        dataset2 = f2['Acoustic']
-
-        datasets_data = np.concatenate([dataset1, dataset2], axis=0)
-        data_downsampled = resample_poly(datasets_data, up=up, down=down, axis=0)
-        start_idx_sig2 = 0
-        end_idx_sig2 = dataset1.shape[0]
-        start_idx_resampled = int(np.round(start_idx_sig2 * resample_ratio))
-        end_idx_resampled = int(np.round(end_idx_sig2 * resample_ratio))
-
-        data_downsampled = data_downsampled[start_idx_resampled:end_idx_resampled]
-
-        assert data_downsampled.shape[0] == dataset1.shape[0]/2.5 and data_downsampled.shape[1] == dataset1.shape[1]
-
-        dataset1.resize(data_downsampled.shape)
-        dataset1[...] = data_downsampled
-        dataset1.attrs.modify('TimeSamplingInterval(seconds)',
-                            dataset1.attrs['TimeSamplingInterval(seconds)']/resample_ratio)
-        dataset1.attrs.modify('InterrogationRate(Hz)',
-                            dataset1.attrs['InterrogationRate(Hz)']*resample_ratio)
-
-    logging.info(f"Finished file {start_idx}/{len(files)} | {files[0]}")
-
-    # Process triplets of consecutive files
-    for i in range(1, len(files)-1):
-        start_time = time.time()
-
-        file1_path = os.path.join(source_dir, files[i-1])
-        file2_path = os.path.join(source_dir, files[i])  # main file to process
-        file3_path = os.path.join(source_dir, files[i+1])
-
-        file2_path_new = os.path.join(target_dir, files[i])
-        shutil.copyfile(file2_path, file2_path_new)
-
-        with h5py.File(file1_path, 'r') as f1, \
-             h5py.File(file2_path_new, 'r+') as f2, \
-             h5py.File(file3_path, 'r') as f3:
-
-            dataset1 = f1['Acoustic']
-            dataset2 = f2['Acoustic']
-            dataset3 = f3['Acoustic']
-
-            datasets_data = np.concatenate([dataset1, dataset2, dataset3], axis=0)
-            data_downsampled = resample_poly(datasets_data, up=up, down=down, axis=0)
-
-            # Find indices for the second signal
-            start_idx_sig2 = dataset1.shape[0]
-            end_idx_sig2 = dataset1.shape[0]+dataset2.shape[0]
-            start_idx_resampled = int(np.round(start_idx_sig2 * resample_ratio))
-            end_idx_resampled = int(np.round(end_idx_sig2 * resample_ratio))
-
-            data_downsampled = data_downsampled[start_idx_resampled:end_idx_resampled]
-
-            assert data_downsampled.shape[0] == dataset2.shape[0]/2.5 and data_downsampled.shape[1] == dataset2.shape[1]
-
-            dataset2.resize(data_downsampled.shape)
-            dataset2[...] = data_downsampled
-            dataset2.attrs.modify('TimeSamplingInterval(seconds)',
-                                dataset2.attrs['TimeSamplingInterval(seconds)']/resample_ratio)
-            dataset2.attrs.modify('InterrogationRate(Hz)',
-                                dataset2.attrs['InterrogationRate(Hz)']*resample_ratio)
-
-        os.remove(file1_path)
-
-        logging.info(f"Finished file {i+start_idx}/{len(files)} | {files[i]} | Time elapsed: {time.time() - start_time:.2f} s")
-
-
-    # Process last file
-    file1_path = os.path.join(source_dir, files[-2])
-    file2_path = os.path.join(source_dir, files[-1])
-
-    file2_path_new = os.path.join(target_dir, files[-1])
-    shutil.copyfile(file2_path, file2_path_new)
-
-    with h5py.File(file1_path, 'r') as f1, \
-         h5py.File(file2_path_new, 'r+') as f2:
-
-        dataset1 = f1['Acoustic']
-        dataset2 = f2['Acoustic']
-
-        datasets_data = np.concatenate([dataset1, dataset2], axis=0)
-        data_downsampled = resample_poly(datasets_data, up=up, down=down, axis=0)
-
-        start_idx_sig2 = dataset1.shape[0]
-        end_idx_sig2 = dataset1.shape[0]+dataset2.shape[0]
-        start_idx_resampled = int(np.round(start_idx_sig2 * resample_ratio))
-        end_idx_resampled = int(np.round(end_idx_sig2 * resample_ratio))
-
-        data_downsampled = data_downsampled[start_idx_resampled:end_idx_resampled]
-
-        assert data_downsampled.shape[0] == dataset2.shape[0]/2.5 and data_downsampled.shape[1] == dataset2.shape[1]
-
-        dataset2.resize(data_downsampled.shape)
-        dataset2[...] = data_downsampled
-        dataset2.attrs.modify('TimeSamplingInterval(seconds)',
-                            dataset2.attrs['TimeSamplingInterval(seconds)']/resample_ratio)
-        dataset2.attrs.modify('InterrogationRate(Hz)',
-                            dataset2.attrs['InterrogationRate(Hz)']*resample_ratio)
-
-    os.remove(file1_path)
-    os.remove(file2_path)
-
-    logging.info(f"Finished file {end_idx}/{len(files)} | {files[-1]}")
+    return files[start_idx:end_idx + 1], start_idx, end_idx
+
+
+def channel_blocks(n_channels, channel_block):
+    """
+    Returns the (start, stop) column ranges of consecutive blocks of at most channel_block channels.
+    A channel_block of None or 0 gives a single block with all channels.
+    """
+    if not channel_block or channel_block >= n_channels:
+        return [(0, n_channels)]
+    return [(c, min(c + channel_block, n_channels)) for c in range(0, n_channels, channel_block)]
+
+
+def update_sampling_attrs(dataset, resample_ratio):
+    dataset.attrs.modify('TimeSamplingInterval(seconds)',
+                         dataset.attrs['TimeSamplingInterval(seconds)']/resample_ratio)
+    dataset.attrs.modify('InterrogationRate(Hz)',
+                         dataset.attrs['InterrogationRate(Hz)']*resample_ratio)
+
+
+def update_channel_attrs(f, spatial):
+    dataset = f['Acoustic']
+    if 'NumberOfLoci' in dataset.attrs:
+        dataset.attrs.modify('NumberOfLoci', len(spatial))
+    spatial.write_positions(f)
+
+
+def finish_output(source_path, target_path, shape, n_samples, journal=None, stream_offset=None):
+    """
+    Renames the complete output from its partial path to target_path, and records it in the journal (see journal.py).
+    """
+    os.replace(partial_path(target_path), target_path)
+    if journal is not None:
+        journal.record(target_path, os.path.basename(source_path), n_samples, shape, stream_offset)
+
+
+def write_downsampled(source_path, target_path, data_downsampled, resample_ratio, output_options=None, spatial=None,
+                      metrics=NULL_METRICS, journal=None, n_samples=None, stream_offset=None):
+    """
+    Writes the downsampled data to target_path as a new file with the metadata of source_path
+    and updated sampling attributes. output_options are passed to das_io.create_output
+    (chunks, compression, compression_opts, shuffle). With a SpatialDecimator (see spatial.py) as
+    spatial, the channels are decimated first and their positions are written to the file.
+    metrics: optional RunMetrics (see metrics.py), recording the time and bytes under the source filename.
+    journal: optional Journal (see journal.py) recording the complete output, with the length of the input
+             (n_samples) and its position in the stream (stream_offset).
+
+    The file is written to a partial path and renamed to target_path once complete.
+    """
+    filename = os.path.basename(source_path)
+    if spatial is not None:
+        with metrics.stage('resample', filename):
+            data_downsampled = spatial(data_downsampled)
+    with metrics.stage('write', filename):
+        with create_output(source_path, partial_path(target_path), data_downsampled.shape, **(output_options or {})) as f:
+            dataset = f['Acoustic']
+            dataset[...] = data_downsampled
+            update_sampling_attrs(dataset, resample_ratio)
+            if spatial is not None:
+                update_channel_attrs(f, spatial)
+        finish_output(source_path, target_path, data_downsampled.shape, n_samples, journal, stream_offset)
+    metrics.add(filename, bytes_written=os.path.getsize(target_path))
+
+
+@contextmanager
+def open_source(file_path, metrics=NULL_METRICS, filename=None):
+    """
+    Opens the 'Acoustic' dataset of a source file (see das_io.open_acoustic), recording the open stage
+    under filename (default: the name of the file).
+    """
+    with ExitStack() as stack:
+        with metrics.stage('open', filename or os.path.basename(file_path)):
+            dataset = stack.enter_context(open_acoustic(file_path))
+        yield dataset
+
+
+def downsample_group(file_paths, target, target_path, up, down, channel_block=None, output_options=None,
+                     engine='polyphase', spatial=None, data=None, writer=None, metrics=NULL_METRICS, journal=None):
+    """
+    Downsamples file_paths[target], using the other files (its temporal neighbours) for edge continuity.
+    engine: name of a resampling engine of resampling.py, or an engine instance.
+    spatial: optional SpatialDecimator (see spatial.py); the decimated channels are then assembled in
+             memory before writing, since every output channel may combine several channel blocks.
+    data: optional in-memory 'Acoustic' arrays of file_paths (e.g. prefetched), instead of reading the files.
+    writer: optional BackgroundWriter (see pipeline.py); the output is then assembled in memory and
+            written by the writer thread.
+    metrics: optional RunMetrics (see metrics.py); the reads are recorded under every file, the other
+             stages under file_paths[target].
+    journal: optional Journal (see journal.py) recording the complete output.
+
+    The files are concatenated and resampled one block of channels at a time, so that only
+    len(file_paths) * channel_block columns are held in memory. The result keeps the dtype of the
+    source dataset and is written to target_path, a new file with the metadata of file_paths[target]
+    (through a partial file that is renamed once complete).
+    """
+    resample_ratio = up / down
+    engine = make_engine(engine, up, down)
+    filenames = [os.path.basename(path) for path in file_paths]
+    filename = filenames[target]
+
+    with ExitStack() as stack:
+        if data is not None:
+            datasets = data
+        else:
+            datasets = [stack.enter_context(open_source(path, metrics)) for path in file_paths]
+
+        # Find indices for the target signal
+        start_idx_sig = sum(dataset.shape[0] for dataset in datasets[:target])
+        end_idx_sig = start_idx_sig + datasets[target].shape[0]
+        start_idx_resampled = int(np.round(start_idx_sig * resample_ratio))
+        end_idx_resampled = int(np.round(end_idx_sig * resample_ratio))
+
+        n_samples, n_channels = datasets[target].shape
+        assert (end_idx_resampled - start_idx_resampled) * down == n_samples * up, \
+            "the triplet method needs file lengths divisible by down / gcd(up, down); use --streaming otherwise"
+
+        shape = (end_idx_resampled - start_idx_resampled, n_channels)
+        buffered = spatial is not None or writer is not None
+        if not buffered:
+            with metrics.stage('write', filename):
+                f_new = stack.enter_context(create_output(file_paths[target], partial_path(target_path), shape,
+                                                          **(output_options or {})))
+            dataset_new = f_new['Acoustic']
+        else:
+            dataset_new = np.empty(shape, dtype=datasets[target].dtype)
+
+        # Prefetched inputs are already in memory, so copying them is assembly rather than a read
+        read_stage = 'read' if data is None else 'concat'
+        bounds = np.cumsum([0] + [dataset.shape[0] for dataset in datasets])
+        for c0, c1 in channel_blocks(n_channels, channel_block):
+            # The files are read directly into the concatenated block
+            datasets_data = np.empty((bounds[-1], c1 - c0), dtype=datasets[target].dtype)
+            for dataset, name, r0, r1 in zip(datasets, filenames, bounds[:-1], bounds[1:]):
+                with metrics.stage(read_stage, name):
+                    datasets_data[r0:r1] = dataset[:, c0:c1]
+                if data is None:
+                    metrics.add(name, bytes_read=(r1 - r0) * (c1 - c0) * datasets_data.itemsize)
+            with metrics.stage('resample', filename):
+                data_downsampled = engine(datasets_data)
+            with metrics.stage('write' if not buffered else 'concat', filename):
+                dataset_new[:, c0:c1] = data_downsampled[start_idx_resampled:end_idx_resampled].astype(datasets[target].dtype)
+
+        if not buffered:
+            with metrics.stage('write', filename):
+                update_sampling_attrs(dataset_new, resample_ratio)
+        elif writer is not None:
+            writer.submit(write_downsampled, file_paths[target], target_path, dataset_new, resample_ratio,
+                          output_options, spatial, metrics, journal, n_samples)
+        else:
+            write_downsampled(file_paths[target], target_path, dataset_new, resample_ratio, output_options, spatial,
+                              metrics, journal, n_samples)
+
+    if not buffered:
+        with metrics.stage('write', filename):
+            finish_output(file_paths[target], target_path, shape, n_samples, journal)
+        metrics.add(filename, bytes_written=os.path.getsize(target_path))
+
+
+def remove_source(file_path, metrics=NULL_METRICS, keep=False, missing_ok=False):
+    """
+    Removes a source file (unless keep, or missing_ok and the file no longer exists) and emits its metrics record.
+    """
+    filename = os.path.basename(file_path)
+    if not keep and not (missing_ok and not os.path.exists(file_path)):
+        with metrics.stage('delete', filename):
+            os.remove(file_path)
+    metrics.file_done(filename)
+
+
+def completed_outputs(files, target_dir, journal, resume):
+    """
+    Returns, for every file, whether its output in target_dir is verified complete in the journal
+    (all False unless resume). Leftover partial outputs of an interrupted run are removed.
+    """
+    if not resume:
+        return [False] * len(files)
+    if journal is None:
+        raise ValueError("Resuming needs the journal of the target directory")
+    n_partial = remove_partial_files(target_dir)
+    done = [journal.is_complete(os.path.join(target_dir, f)) for f in files]
+    logging.info(f"Resuming: {sum(done)}/{len(files)} files already complete, {n_partial} partial outputs removed")
+    return done
+
+
+def check_sources(source_dir, files, needed):
+    """
+    Raises FileNotFoundError if the source of a file that must be read (to resume a run) is missing.
+    """
+    missing = [files[i] for i in needed if not os.path.exists(os.path.join(source_dir, files[i]))]
+    if missing:
+        raise FileNotFoundError(f"Cannot resume: {len(missing)} source files needed by incomplete outputs are missing, "
+                                f"e.g. {missing[0]}")
+
+
+def incomplete_runs(done):
+    """
+    Returns the (start, stop) index ranges of the consecutive files whose outputs are not complete.
+    """
+    runs, a = [], None
+    for i, complete in enumerate(list(done) + [True]):
+        if not complete and a is None:
+            a = i
+        elif complete and a is not None:
+            runs.append((a, i))
+            a = None
+    return runs
+
+
+def resume_offset(journal, target_dir, files, a):
+    """
+    Returns the number of samples in the stream before files[a], from the journal entry of the previous
+    (complete) file, or None if it is not known.
+    """
+    if a == 0:
+        return 0
+    entry = journal.get(os.path.join(target_dir, files[a-1]))
+    if entry is None or entry.get('stream_offset') is None:
+        return None
+    return entry['stream_offset'] + entry['n_samples']
+
+
+def process_files(source_dir, target_dir, start_idx, end_idx, up, down, filenames, channel_block=None,
+                  output_options=None, engine='polyphase', spatial=None, prefetch=0, write_queue=0,
+                  metrics=NULL_METRICS, journal=None, resume=False, index_path=None):
+    """
+    Downsamples the files with the triplet method (see downsample_group).
+    prefetch: number of files read ahead by a reader thread (0: read in the compute loop).
+    write_queue: number of outputs queued for a writer thread, which also removes the source files
+                 (0: write in the compute loop). See pipeline.py.
+    metrics: optional RunMetrics (see metrics.py) recording the stages of every file.
+    journal: optional Journal (see journal.py) recording the complete outputs.
+    resume: skip the files whose outputs are verified complete in the journal; their sources are only read
+            as neighbours of the remaining files.
+    index_path: path of the archive index of source_dir (default: in the cache directory, see archive_index.py).
+    """
+    files, start_idx, end_idx = load_filenames(source_dir, filenames, start_idx, end_idx, index_path)
+    engine = make_engine(engine, up, down)  # the filter is designed once for all files
+    paths = [os.path.join(source_dir, f) for f in files]
+    targets = [os.path.join(target_dir, f) for f in files]
+    metrics.start(len(files))
+
+    def group(i):
+        # The file and its neighbours, and the position of the file in the group
+        lo, hi = max(0, i - 1), min(len(files), i + 2)
+        return paths[lo:hi], i - lo
+
+    done = completed_outputs(files, target_dir, journal, resume)
+    needed = sorted({j for i in range(len(files)) if not done[i] for j in range(max(0, i - 1), min(len(files), i + 2))})
+    check_sources(source_dir, files, needed)
+
+    with ExitStack() as stack:
+        prefetcher = None
+        if prefetch:
+            prefetcher = stack.enter_context(Prefetcher([paths[j] for j in needed], prefetch,
+                                                        partial(read_file, metrics=metrics)))
+        writer = stack.enter_context(BackgroundWriter(write_queue)) if write_queue else None
+        loaded = {}
+
+        def load(group):
+            # In-memory data of the files of a group, taken from the prefetcher in file order
+            if prefetcher is None:
+                return None
+            while any(path not in loaded for path in group):
+                path, data = next(prefetcher)
+                loaded[path] = data
+            return [loaded[path] for path in group]
+
+        def remove(i):
+            # The sources of complete outputs may already have been removed by the interrupted run
+            loaded.pop(paths[i], None)
+            if writer is not None:
+                writer.submit(remove_source, paths[i], metrics, False, done[i])
+            else:
+                remove_source(paths[i], metrics, False, done[i])
+
+        # Start downsampling
+        logging.info(f"Starting downsampling of {len(files)} files...")
+
+        # Every file is processed with its previous and next file (only one neighbour for the first and last file)
+        for i in range(len(files)):
+            start_time = time.time()
+
+            if done[i]:
+                logging.info(f"Skipped file {i+start_idx}/{len(files)} | {files[i]} | already complete")
+            else:
+                file_paths, target = group(i)
+                downsample_group(file_paths, target, targets[i], up, down, channel_block, output_options,
+                                 engine, spatial, load(file_paths), writer, metrics, journal)
+                logging.info(f"Finished file {i+start_idx}/{len(files)} | {files[i]} | Time elapsed: {time.time() - start_time:.2f} s")
+
+            # Keep the previous file until the current one has been written, so that an interrupted run
+            # can be resumed from the current file
+            if i > 0:
+                remove(i - 1)
+
+        remove(len(files) - 1)
+
+    metrics.finish()
+
+
+def pyramid_levels(target_dir, up, down, pyramid=()):
+    """
+    Returns (up, down, resample ratio, target directory) of every output level: the level up/down,
+    followed by the `pyramid` levels (up, down) that each resample the previous level.
+    Without pyramid levels, the output is written to target_dir. Otherwise every level is written to a
+    subdirectory named after its total decimation factor, e.g. 'x2.5', 'x10' and 'x50'.
+    """
+    levels, resample_ratio = [], Fraction(1)
+    for level_up, level_down in [(up, down)] + list(pyramid):
+        resample_ratio *= Fraction(level_up, level_down)
+        level_dir = os.path.join(target_dir, f"x{float(1 / resample_ratio):g}") if pyramid else target_dir
+        levels.append((level_up, level_down, float(resample_ratio), level_dir))
+    return levels
+
+
+def downsample_shard(source_dir, target_dir, files, up, down, halo=(None, None), keep=(), index_offset=0,
+                     channel_block=None, output_options=None, engine='polyphase', sample_offset=None, pyramid=(),
+                     spatial=None, prefetch=0, write_queue=0, metrics=NULL_METRICS, journal=None):
+    """
+    Streams the files through StreamingResamplers and writes their downsampled versions.
+
+    Every file is read one block of channels at a time, and each channel block has its own
+    resampler, so at most about one input file plus one output file are held in memory.
+
+    halo: (previous file, next file) outside of `files` that only provide filter context at the
+          shard edges. Only the tail of the previous and the head of the next file are read.
+    keep: source files that must not be removed, e.g. shard edge files still needed as halos
+          by neighbouring shards.
+    sample_offset: number of samples in the stream before files[0] (default: the length of the previous
+                   halo file), which sets the phase of the output grid when file lengths are not
+                   divisible by down / gcd(up, down).
+    pyramid: further (up, down) levels, each resampling the output of the previous level in the same
+             pass (see pyramid_levels for the target directories). Not supported with halos.
+    spatial: optional SpatialDecimator (see spatial.py) applied to the channels of every output file.
+    prefetch, write_queue: depths of the reader and writer threads of the I/O pipeline (see pipeline.py);
+                           0 reads or writes in the compute loop.
+    metrics: optional RunMetrics (see metrics.py) recording the stages of every file; the reads of the halo
+             files are recorded under the shard edge files they serve.
+    journal: optional Journal (see journal.py) recording the complete outputs, with the position of every
+             source file in the stream (from sample_offset).
+    """
+    levels = pyramid_levels(target_dir, up, down, pyramid)
+    metrics.start(len(files))
+    resamplers = {}
+    n_samples = {}               # (level, filename) -> length of the input of the level
+    stream_offsets = {}          # filename -> samples in the stream before the file
+    written = [0] * len(levels)  # number of files written per level
+    removed = 0                  # number of source files removed
+
+    if pyramid and halo != (None, None):
+        raise ValueError("Pyramid levels cannot be combined with halo files (parallel shards)")
+    for _, _, _, level_dir in levels:
+        os.makedirs(level_dir, exist_ok=True)
+
+    def remove(filename):
+        remove_source(os.path.join(source_dir, filename), metrics, keep=filename in keep)
+
+    def get_resamplers(dataset):
+        if not resamplers:
+            for block in channel_blocks(dataset.shape[1], channel_block):
+                resamplers[block] = ResamplerCascade([(level_up, level_down) for level_up, level_down, _, _ in levels],
+                                                     engine)
+        return resamplers.items()
+
+    def push(dataset, filename, context=False):
+        # Reads every channel block of the file (only the head needed as filter context with context=True)
+        # and pushes it through its resampler
+        blocks_downsampled = []
+        for (c0, c1), resampler in get_resamplers(dataset):
+            with metrics.stage('read', filename):
+                block = read_block(dataset, slice(resampler.context if context else None), slice(c0, c1))
+            if prefetcher is None or context:  # prefetched files are counted by the reader thread
+                metrics.add(filename, bytes_read=block.nbytes)
+            with metrics.stage('resample', filename):
+                blocks_downsampled.append(((c0, c1), resampler.push(block)))
+        return blocks_downsampled
+
+    def assemble(blocks_downsampled, filename):
+        # Combines the outputs of the channel blocks into (level, data) pairs; the cascades of all channel
+        # blocks produce their outputs in the same order
+        n_channels = list(resamplers)[-1][1]
+        outputs = []
+        with metrics.stage('concat', filename):
+            for j, (k, block_downsampled) in enumerate(blocks_downsampled[0][1]):
+                data_downsampled = np.empty((block_downsampled.shape[0], n_channels), dtype=block_downsampled.dtype)
+                for (c0, c1), block_outputs in blocks_downsampled:
+                    data_downsampled[:, c0:c1] = block_outputs[j][1]
+                outputs.append((k, data_downsampled))
+        return outputs
+
+    def write(filename, level_dir, data_downsampled, resample_ratio, n_input, stream_offset, message, start_time):
+        write_downsampled(os.path.join(source_dir, filename), os.path.join(level_dir, filename),
+                          data_downsampled, resample_ratio, output_options, spatial, metrics, journal, n_input,
+                          stream_offset)
+        logging.info(f"{message} | Time elapsed: {time.time() - start_time:.2f} s")
+
+    with ExitStack() as stack:
+        # Optional I/O pipeline: a reader thread prefetching the files, and a writer thread for the
+        # outputs and removals (in order, so that a file is only removed after the preceding writes)
+        prefetcher = None
+        if prefetch:
+            prefetcher = stack.enter_context(Prefetcher([os.path.join(source_dir, f) for f in files], prefetch,
+                                                        partial(read_file, metrics=metrics)))
+        writer = stack.enter_context(BackgroundWriter(write_queue)) if write_queue else None
+
+        def source(filename):
+            if prefetcher is None:
+                return open_source(os.path.join(source_dir, filename), metrics)
+            return nullcontext(next(prefetcher)[1])
+
+        def run(fn, *args):
+            if writer is not None:
+                writer.submit(fn, *args)
+            else:
+                fn(*args)
+
+        position = sample_offset or 0
+        if halo[0] is not None:
+            with open_source(os.path.join(source_dir, halo[0]), metrics, files[0]) as dataset:
+                position = sample_offset or dataset.shape[0]
+                for (c0, c1), resampler in get_resamplers(dataset):
+                    tail_start = max(0, dataset.shape[0] - resampler.tail_length)
+                    with metrics.stage('read', files[0]):
+                        tail = read_block(dataset, slice(tail_start, None), slice(c0, c1))
+                    metrics.add(files[0], bytes_read=tail.nbytes)
+                    with metrics.stage('resample', files[0]):
+                        resampler.prime(tail, position)
+
+        # The output of file i-1 is ready once the head of file i has been read (file i-k-1 at level k)
+        for i in range(len(files) + 1):
+            start_time = time.time()
+
+            if i < len(files):
+                with source(files[i]) as dataset:
+                    n_samples[0, files[i]] = dataset.shape[0]
+                    stream_offsets[files[i]] = position
+                    position += dataset.shape[0]
+                    outputs = assemble(push(dataset, files[i]), files[i])
+            elif halo[1] is not None:
+                with open_source(os.path.join(source_dir, halo[1]), metrics, files[-1]) as dataset:
+                    outputs = assemble(push(dataset, files[-1], context=True), files[-1])
+            else:
+                with metrics.stage('resample', files[-1]):
+                    blocks_downsampled = [(block, resampler.flush()) for block, resampler in resamplers.items()]
+                outputs = assemble(blocks_downsampled, files[-1])
+
+            for k, data_downsampled in outputs:
+                filename = files[written[k]]
+                level_up, level_down, resample_ratio, level_dir = levels[k]
+                # Exact when the input length is divisible by down / gcd(up, down); otherwise off by at most one sample
+                n_input = n_samples.pop((k, filename))
+                assert abs(data_downsampled.shape[0] - n_input * level_up / level_down) < 1
+                if k + 1 < len(levels):
+                    n_samples[k + 1, filename] = data_downsampled.shape[0]
+
+                level_info = f" | level x{1 / resample_ratio:g}" if pyramid else ""
+                stream_offset = stream_offsets.pop(filename) if k == 0 else None
+                run(write, filename, level_dir, data_downsampled, resample_ratio, n_input, stream_offset,
+                    f"Finished file {written[k]+index_offset} | {filename}{level_info}", start_time)
+                written[k] += 1
+
+            # Like the triplet method, keep the previous file until the current one has been written at every
+            # level, so that an interrupted run can be restarted from the current index
+            while removed < min(written) - 1:
+                run(remove, files[removed])
+                removed += 1
+
+        run(remove, files[-1])
+
+    metrics.finish()
+
+
+def process_files_streaming(source_dir, target_dir, start_idx, end_idx, up, down, filenames, channel_block=None,
+                            output_options=None, engine='polyphase', pyramid=(), spatial=None, prefetch=0, write_queue=0,
+                            metrics=NULL_METRICS, journal=None, resume=False, index_path=None):
+    """
+    Streaming alternative to process_files. Every file is read and filtered exactly once, while
+    the resampler carries a short tail of samples across file boundaries. The output is the same
+    as with the triplet method. With pyramid levels, the coarser levels are produced in the same pass.
+
+    With resume, every run of consecutive incomplete files is streamed on its own, with the complete files
+    around it as halos and its position in the stream taken from the journal. Not supported with pyramid levels.
+    """
+    if resume and pyramid:
+        raise ValueError("Resuming is not supported with pyramid levels")
+    files, start_idx, end_idx = load_filenames(source_dir, filenames, start_idx, end_idx, index_path)
+    done = completed_outputs(files, target_dir, journal, resume)
+    runs = incomplete_runs(done)
+
+    logging.info(f"Starting streaming downsampling of {len(files)} files...")
+
+    for a, b in runs:
+        halo = (files[a-1] if a > 0 else None, files[b] if b < len(files) else None)
+        if resume:
+            check_sources(source_dir, files, [j for j in range(a - 1, b + 1) if 0 <= j < len(files)])
+        downsample_shard(source_dir, target_dir, files[a:b], up, down, halo=halo, index_offset=start_idx + a,
+                         channel_block=channel_block, output_options=output_options, engine=engine,
+                         sample_offset=resume_offset(journal, target_dir, files, a) if resume else None,
+                         pyramid=pyramid, spatial=spatial, prefetch=prefetch, write_queue=write_queue,
+                         metrics=metrics, journal=journal)
+
+    # The sources of the complete files were only kept as halos
+    for i in range(len(files)):
+        if done[i]:
+            remove_source(os.path.join(source_dir, files[i]), metrics, missing_ok=True)
+
+
+def process_files_parallel(source_dir, target_dir, start_idx, end_idx, up, down, filenames, workers,
+                           channel_block=None, output_options=None, engine='polyphase', spatial=None, prefetch=0,
+                           write_queue=0, metrics=NULL_METRICS, journal=None, resume=False, index_path=None):
+    """
+    Splits the sorted files into `workers` contiguous shards and downsamples them in a process pool.
+
+    Each shard reads the neighbouring files of the adjacent shards as halos, so the result is
+    identical to a single streaming run. The edge files of a shard are only removed after both
+    shards that use them have finished. Every shard records its own metrics (see RunMetrics.for_worker).
+    With resume, only the runs of incomplete files are split into shards (see process_files_streaming).
+    """
+    files, start_idx, end_idx = load_filenames(source_dir, filenames, start_idx, end_idx, index_path)
+    done = completed_outputs(files, target_dir, journal, resume)
+    runs = incomplete_runs(done)
+    n_todo = sum(b - a for a, b in runs)
+
+    # Position of every file in the stream, so that all shards share the output grid of a single run
+    index = ArchiveIndex.open(source_dir, index_path)
+    lengths = dict(zip(index.filenames.tolist(), index.n_samples.tolist()))
+    sample_offsets = {}
+
+    # The workers are shared among the runs in proportion to their number of files
+    shards = []
+    for a, b in runs:
+        n_shards = max(1, min(b - a, round(workers * (b - a) / n_todo)))
+        bounds = [a + round(k * (b - a) / n_shards) for k in range(n_shards + 1)]
+        shards += [(bounds[k], bounds[k+1]) for k in range(n_shards)]
+
+        offset = resume_offset(journal, target_dir, files, a) if resume else 0
+        if offset is None:  # unknown position, the phase is taken from the previous file (see downsample_shard)
+            offset = lengths[files[a-1]]
+        for i in range(a, b):
+            sample_offsets[i] = offset
+            offset += lengths[files[i]]
+
+        if resume:
+            check_sources(source_dir, files, [j for j in range(a - 1, b + 1) if 0 <= j < len(files)])
+    n_shards = len(shards)
+
+    logging.info(f"Starting parallel downsampling of {n_todo} files in {n_shards} shards...")
+
+    # Shard edge files are also read by the neighbouring shards, so they are removed once all their users are done
+    users = {}
+    for k in range(n_shards - 1):
+        (a0, b0), (a1, b1) = shards[k], shards[k+1]
+        if b0 == a1:
+            users.setdefault(files[b0-1], {k}).add(k + 1)
+            users.setdefault(files[a1], {k + 1}).add(k)
+
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, n_shards))) as executor:
+        futures = {}
+        for k, (a, b) in enumerate(shards):
+            halo = (files[a-1] if a > 0 else None, files[b] if b < len(files) else None)
+            keep = {f for f in users if f in files[a:b]}
+            future = executor.submit(downsample_shard, source_dir, target_dir, files[a:b], up, down,
+                                     halo=halo, keep=keep, index_offset=start_idx + a, channel_block=channel_block,
+                                     output_options=output_options, engine=engine,
+                                     sample_offset=int(sample_offsets[a]), spatial=spatial, prefetch=prefetch,
+                                     write_queue=write_queue, metrics=metrics.for_worker(k), journal=journal)
+            futures[future] = k
+
+        for future in as_completed(futures):
+            k = futures[future]
+            future.result()
+            logging.info(f"Finished shard {k+1}/{n_shards} | files {start_idx + shards[k][0]}-{start_idx + shards[k][1] - 1}")
+
+            for filename in list(users):
+                users[filename].discard(k)
+                if not users[filename]:
+                    del users[filename]
+                    os.remove(os.path.join(source_dir, filename))
+
+    # The sources of the complete files were only kept as halos
+    for i in range(len(files)):
+        if done[i] and os.path.exists(os.path.join(source_dir, files[i])):
+            os.remove(os.path.join(source_dir, files[i]))
 
 
 def main():
@@ -225,14 +759,60 @@ def main():
     parser.add_argument('--start_idx', type=int, default=0, help='Index to start processing files from')
     parser.add_argument('--end_idx', type=int, default=-1, help='Index to stop processing files at')
     parser.add_argument('--filenames', type=str, default=None, help='Path to file containing filenames to process')
+    parser.add_argument('--index', type=str, default=None,
+                        help='Path of the archive index of source_dir (default: in the cache directory, see archive_index.py)')
     parser.add_argument('--up', type=int, default=2, help='Upsampling factor')
     parser.add_argument('--down', type=int, default=5, help='Downsampling factor')
+    parser.add_argument('--engine', type=str, default='polyphase', choices=sorted(ENGINES),
+                        help='Resampling engine (see resampling.py; python resampling.py prints an accuracy report)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Read and filter every file once, carrying the filter state across file boundaries')
+    parser.add_argument('--channel_block', type=int, default=256,
+                        help='Number of channels resampled at once, bounds the peak memory (0 for all channels)')
+    parser.add_argument('--chunks', type=str, default=None,
+                        help="Chunk shape of the output 'Acoustic' dataset, e.g. '4800,64' (default: contiguous, or automatic with compression)")
+    parser.add_argument('--compression', type=str, default=None, choices=['gzip', 'lzf'],
+                        help="Compression filter of the output 'Acoustic' dataset")
+    parser.add_argument('--compression_opts', type=int, default=None, help='Compression level for gzip (0-9)')
+    parser.add_argument('--shuffle', action='store_true', help='Apply the HDF5 shuffle filter before compression')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes; the files are split into shards that are processed in parallel (implies --streaming)')
+    parser.add_argument('--pyramid', type=str, default=None,
+                        help="Further levels resampling the previous one in the same pass, e.g. '1/4,1/5' for 2.5x, 10x "
+                             "and 50x in the subdirectories x2.5, x10 and x50 of target_dir (implies --streaming)")
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='Number of files read ahead by a reader thread (0: no prefetching, see pipeline.py)')
+    parser.add_argument('--write_queue', type=int, default=0,
+                        help='Number of outputs queued for a writer thread that also removes the source files (0: synchronous writes)')
+    parser.add_argument('--spatial_spacing', type=float, default=None,
+                        help='Resample the channels onto a uniform measured depth grid with this spacing in meters (see spatial.py)')
+    parser.add_argument('--gauge_length', type=float, default=None,
+                        help='Average the channels over this gauge length in meters, one output channel per gauge length '
+                             '(or per --spatial_spacing)')
+    parser.add_argument('--md_range', type=str, default=None,
+                        help="Keep only the channels within this measured depth range in meters, e.g. '2400,3100'")
+    parser.add_argument('--channel_positions', type=str, default=CHANNEL_POSITIONS,
+                        help='CSV file with the MD_m, EASTING_m, NORTHING_m and TVD_m of every channel')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help='JSONL file of the per-file stage timings (default: downsample_<date>_metrics.jsonl in log_dir, '
+                             "'none' to disable, see metrics.py)")
+    parser.add_argument('--prometheus', type=str, default=None,
+                        help='Prometheus textfile (e.g. for the node_exporter textfile collector) with the rolling summary')
+    parser.add_argument('--summary_every', type=int, default=10,
+                        help='Number of files between two progress summaries (p50/p95 per stage, ETA)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip the files whose outputs are complete in the journal of target_dir (see journal.py)')
 
     args = parser.parse_args()
+    if args.pyramid and args.workers > 1:
+        parser.error("--pyramid is only supported with a single worker")
+    if args.pyramid and args.resume:
+        parser.error("--resume is not supported with --pyramid")
 
     # Setup logging
     date_stamp = datetime.now().strftime("%Y-%m-%d-%H:%M:%S")
-    logging.basicConfig(filename=os.path.join(args.log_dir, f"validation_{date_stamp}.log"),
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(args.log_dir, f"downsample_{date_stamp}.log"),
                         filemode="w",
                         level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s',)
@@ -249,12 +829,43 @@ def main():
     filenames = args.filenames
     up = args.up
     down = args.down
+    streaming = args.streaming
+    engine = args.engine
+    workers = args.workers
+    prefetch = args.prefetch
+    write_queue = args.write_queue
+    pyramid = [tuple(int(f) for f in level.split('/')) for level in args.pyramid.split(',')] if args.pyramid else []
+    channel_block = args.channel_block
+    spatial = None
+    if args.spatial_spacing or args.gauge_length or args.md_range:
+        md_range = tuple(float(md) for md in args.md_range.split(',')) if args.md_range else None
+        spatial = SpatialDecimator(load_channel_positions(args.channel_positions), args.spatial_spacing,
+                                   args.gauge_length, md_range)
+        logging.info(f"Spatial decimation ({spatial.mode}) from {spatial.n_input} to {len(spatial)} channels")
+    metrics_path = args.metrics or os.path.join(log_dir, f"downsample_{date_stamp}_metrics.jsonl")
+    metrics = RunMetrics(metrics_path if metrics_path.lower() != 'none' else None, args.prometheus, args.summary_every)
+    output_options = {
+        'chunks': tuple(int(c) for c in args.chunks.split(',')) if args.chunks else None,
+        'compression': args.compression,
+        'compression_opts': args.compression_opts,
+        'shuffle': args.shuffle,
+    }
 
     os.makedirs(target_dir, exist_ok=True)
-    os.makedirs(log_dir, exist_ok=True)
+    journal = Journal(target_dir)
 
     # Main processing
-    process_files(source_dir, target_dir, start_idx, end_idx, up, down, filenames)
+    if workers > 1:
+        process_files_parallel(source_dir, target_dir, start_idx, end_idx, up, down, filenames, workers, channel_block,
+                               output_options, engine, spatial, prefetch, write_queue, metrics, journal, args.resume,
+                               index_path=args.index)
+    elif streaming or pyramid:
+        process_files_streaming(source_dir, target_dir, start_idx, end_idx, up, down, filenames, channel_block,
+                                output_options, engine, pyramid, spatial, prefetch, write_queue, metrics, journal,
+                                args.resume, index_path=args.index)
+    else:
+        process_files(source_dir, target_dir, start_idx, end_idx, up, down, filenames, channel_block, output_options,
+                      engine, spatial, prefetch, write_queue, metrics, journal, args.resume, index_path=args.index)
 
     logging.info("Finished processing all files.")
 
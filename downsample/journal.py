@@ -0,0 +1,137 @@
+"""
+Completion Journal of FORGE DAS Downsampling Runs
+
+This module records the outputs that downsample.py has completely written, so that a run interrupted by
+the SLURM time limit (or a node failure) can be resumed with --resume: finished files are skipped and
+only the file(s) in flight are processed again, without recomputing --start_idx from the logs.
+
+Crash Safety:
+    - Outputs are written to '<target>.partial' and renamed to their final name once complete (os.replace
+      is atomic), so a final name never refers to a half-written file
+    - After the rename, a line is appended to the journal ('.downsample_journal.jsonl' in the target
+      directory) and flushed to disk; a crash between the rename and the journal line only causes the
+      file to be written again
+    - Journal lines that were cut short by a crash are ignored when the journal is loaded
+
+Journal Entries (JSONL):
+    'file' (output path relative to the target directory, e.g. 'x10/16B_...h5' for pyramid levels),
+    'source' (source filename), 'n_samples' (source length), 'shape' (output shape), 'size' (bytes),
+    'stream_offset' (samples in the stream before the source file, streaming modes only) and 'time'
+
+    An output is verified complete when it has a journal entry, exists with the journaled size and its
+    'Acoustic' dataset has the journaled shape.
+
+Usage Example:
+    journal = Journal(target_dir)
+    os.replace(partial_path, target_path)
+    journal.record(target_path, source_filename, n_samples, shape)
+    journal.is_complete(target_path)  # True
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import json
+import threading
+import h5py
+from datetime import datetime
+
+JOURNAL_FILENAME = '.downsample_journal.jsonl'
+PARTIAL_SUFFIX = '.partial'
+
+
+def partial_path(target_path):
+    """
+    Returns the temporary path an output is written to before it is renamed to target_path.
+    """
+    return target_path + PARTIAL_SUFFIX
+
+
+def remove_partial_files(directory):
+    """
+    Removes the leftover partial outputs of an interrupted run from directory, returns their number.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    partial_files = [f for f in os.listdir(directory) if f.endswith(PARTIAL_SUFFIX)]
+    for f in partial_files:
+        os.remove(os.path.join(directory, f))
+    return len(partial_files)
+
+
+class Journal:
+    """
+    Append-only record of the completed outputs of a target directory (thread- and process-safe appends).
+    """
+
+    def __init__(self, target_dir, path=None):
+        self.target_dir = target_dir
+        self.path = path or os.path.join(target_dir, JOURNAL_FILENAME)
+        self._lock = threading.Lock()
+        self.entries = self._load()
+
+    def __getstate__(self):
+        # Sent to the worker processes of the parallel mode without the lock
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        entries = {}
+        self._cut_short = False
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    self._cut_short = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # line cut short by a crash
+                        continue
+                    entries[entry['file']] = entry
+        return entries
+
+    def key(self, target_path):
+        return os.path.relpath(target_path, self.target_dir)
+
+    def record(self, target_path, source, n_samples, shape, stream_offset=None):
+        """
+        Records target_path (already renamed to its final name) as complete.
+        """
+        entry = {
+            'file': self.key(target_path),
+            'source': source,
+            'n_samples': int(n_samples),
+            'shape': [int(n) for n in shape],
+            'size': os.path.getsize(target_path),
+            'stream_offset': int(stream_offset) if stream_offset is not None else None,
+            'time': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            with open(self.path, 'a') as f:
+                # Start on a new line after a line cut short by a crash (blank lines are skipped when loading)
+                f.write(('\n' if self._cut_short else '') + json.dumps(entry) + '\n')
+                self._cut_short = False
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[entry['file']] = entry
+
+    def get(self, target_path):
+        return self.entries.get(self.key(target_path))
+
+    def is_complete(self, target_path):
+        """
+        Returns whether target_path is journaled, exists with the journaled size and has the journaled shape.
+        """
+        entry = self.get(target_path)
+        if entry is None or not os.path.exists(target_path) or os.path.getsize(target_path) != entry['size']:
+            return False
+        try:
+            with h5py.File(target_path, 'r') as f:
+                return list(f['Acoustic'].shape) == entry['shape']
+        except (OSError, KeyError):
+            return False
@@ -0,0 +1,399 @@
+"""
+Live Downsampling of FORGE DAS Files as They Land
+
+This script watches the acquisition directory during stimulation monitoring, where a new
+"16B_StrainRate_*.h5" file arrives every ~12 s, and downsamples every file with a bounded latency,
+without rerunning downsample.py on a fresh generate_filenames.py pickle.
+
+Algorithm Overview:
+    1. Poll the source directory through its archive index (see archive_index.py): a poll is a single
+       os.stat when nothing changed, and only the headers of new files are read
+    2. A new file is taken once it has not been modified for --settle seconds (written completely)
+    3. The file is pushed through the streaming resamplers (see resampling.py), which keep the filter
+       tail of the previous file in memory, so every file is read exactly once
+    4. The output of a file is written as soon as the head of its successor has been read; it is then
+       identical to the output of downsample.py
+    5. At the live edge, if no successor has arrived --edge_timeout seconds after the file landed, the
+       output is written as if the stream ended there (zero-padded edge). When the successor arrives,
+       the output is rewritten with the exact edge ('revised')
+    6. A gap in time (or a change of the channel count) ends the stream; the next file starts a new one
+
+Latency:
+    The end-to-end latency of a file is the time from its last modification (the end of the acquisition
+    write) to its first output. It is logged for every file, added to the metrics records
+    ('latency_seconds') and summarized as p50/p95 in the rolling summary and the Prometheus textfile
+    (see metrics.py). It is bounded by about --edge_timeout plus the processing time of one file.
+
+Restarting:
+    Outputs are written through partial files and recorded in the journal of the target directory (see
+    journal.py). On start, the files whose outputs are complete are skipped, except the last one, which is
+    processed again (with the tail of its predecessor as filter context) so that a zero-padded edge
+    written at shutdown is revised once its successor arrives. With --remove_sources, the sources of
+    the newest two files of the stream are therefore kept (also at shutdown): a source is removed once
+    the output of its successor is final too, or when its stream ends at a gap.
+
+Command Line Usage:
+    python live.py --source_dir /path/to/acquisition --target_dir /path/to/output \\
+                   [--up 2 --down 5] [--poll_interval 1] [--edge_timeout 30] [--remove_sources]
+
+    Test with synthetic files (one file every 12 s):
+    python ../benchmarks/synthetic_forge.py --target_dir /tmp/live_source --n_files 20 --interval 12
+    python live.py --source_dir /tmp/live_source --target_dir /tmp/live_target --exit_after_idle 60
+
+Dependencies:
+    - dascore environment (see requirements.txt)
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import sys
+import copy
+import time
+import signal
+import logging
+import argparse
+import numpy as np
+from datetime import datetime
+from downsample import write_downsampled, open_source, channel_blocks
+from resampling import StreamingResampler, ENGINES
+from metrics import RunMetrics, NULL_METRICS
+from journal import Journal, remove_partial_files
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from das_io import read_block
+from archive_index import ArchiveIndex, to_epoch_ns
+
+GAP_TOLERANCE_NS = 1_000_000_000  # start times in the filenames are truncated to seconds
+
+
+class LiveDownsampler:
+    """
+    Downsamples the files of source_dir in time order as they land, keeping the filter state of the
+    stream in memory between polls.
+
+    edge_timeout: seconds after the landing of the newest file after which its output is written
+                  without waiting for its successor (None: always wait).
+    settle: seconds without modification after which a file is considered completely written.
+    remove_sources: remove every source file once the outputs of the file and of its successor are final.
+    """
+
+    def __init__(self, source_dir, target_dir, up, down, engine='polyphase', channel_block=None, output_options=None,
+                 edge_timeout=30.0, settle=2.0, remove_sources=False, start_time=None, index_path=None,
+                 metrics=NULL_METRICS, journal=None):
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.up, self.down = up, down
+        self.engine = engine
+        self.channel_block = channel_block
+        self.output_options = output_options
+        self.edge_timeout = edge_timeout
+        self.settle = settle
+        self.remove_sources = remove_sources
+        self.metrics = metrics
+        self.journal = journal
+
+        self.index = ArchiveIndex.open(source_dir, index_path)
+        self.resamplers = {}   # (c0, c1) -> StreamingResampler of the current stream
+        self.pending = None    # last pushed file, whose output waits for the head of its successor
+        self.kept = None       # last file with a final output, whose source is kept as context of its successor
+        self.end = None        # (end time, number of channels) of the last file of the current stream
+        self.position = 0      # samples of the current stream before the next file
+        self.next_ns = int(to_epoch_ns(start_time)) if start_time is not None else None  # start of the next file
+        self.stopped = False
+
+        os.makedirs(target_dir, exist_ok=True)
+        remove_partial_files(target_dir)
+        self.restart()
+
+    def restart(self):
+        """
+        Continues after the last complete output of the journal (processing that file again), so that a
+        restarted watcher neither recomputes the archive nor leaves a zero-padded edge behind.
+        """
+        if self.journal is None:
+            return
+        first = np.searchsorted(self.index.start_ns, self.next_ns) if self.next_ns is not None else 0
+        complete = [self.journal.is_complete(os.path.join(self.target_dir, f)) for f in self.index.filenames[first:]]
+        n_complete = next((i for i, done in enumerate(complete) if not done), len(complete))
+        if n_complete == 0:
+            return
+
+        last = first + n_complete - 1
+        if last > 0 and self.continuous(self.file_end(last - 1, self.index.n_samples[last - 1]), last) and self.prime(last - 1):
+            self.next_ns = int(self.index.start_ns[last])
+        else:
+            # Without the context of its predecessor the last output cannot be improved, so the stream
+            # continues after it (from its tail if its source is still there)
+            self.prime(last)
+            self.next_ns = int(self.index.start_ns[last]) + 1
+        logging.info(f"Restarting after {n_complete} complete files, the last one being {self.index.filenames[last]}")
+
+    def prime(self, i):
+        """
+        Uses the tail of file i of the index as the filter context of the stream, at its journaled position.
+        Returns False if its source file no longer exists.
+        """
+        filename = self.index.filenames[i]
+        path = os.path.join(self.source_dir, filename)
+        if not os.path.exists(path):
+            return False
+        entry = self.journal.get(os.path.join(self.target_dir, filename))
+        with open_source(path) as dataset:
+            self.position = dataset.shape[0]
+            if entry is not None and entry.get('stream_offset') is not None:
+                self.position += entry['stream_offset']
+            for (c0, c1), resampler in self.get_resamplers(dataset):
+                tail = read_block(dataset, slice(max(0, dataset.shape[0] - resampler.tail_length), None), slice(c0, c1))
+                resampler.prime(tail, self.position)
+            self.end = self.file_end(i, dataset.shape[0])
+        self.kept = filename
+        return True
+
+    def get_resamplers(self, dataset):
+        if not self.resamplers:
+            for block in channel_blocks(dataset.shape[1], self.channel_block):
+                self.resamplers[block] = StreamingResampler(self.up, self.down, self.engine)
+        return self.resamplers.items()
+
+    def file_end(self, i, n_samples):
+        """
+        Returns the end time and the number of channels of file i of the index (of n_samples samples).
+        Index positions change when files are removed, so the stream keeps these instead.
+        """
+        return int(self.index.start_ns[i] + round(n_samples * self.index.dt[i] * 1e9)), int(self.index.n_channels[i])
+
+    def continuous(self, end, j):
+        """
+        Returns whether file j of the index directly follows a file ending at `end` (see file_end) in time,
+        up to the one second resolution of the start times in the filenames.
+        """
+        end_ns, n_channels = end
+        return abs(int(self.index.start_ns[j]) - end_ns) < GAP_TOLERANCE_NS and self.index.n_channels[j] == n_channels
+
+    def scan(self):
+        """
+        Returns the indices of the new, completely written files in time order.
+        """
+        self.index.refresh()
+        first = np.searchsorted(self.index.start_ns, self.next_ns, side='left') if self.next_ns is not None else 0
+        ready = []
+        for i in range(first, len(self.index)):
+            try:
+                modified = os.path.getmtime(os.path.join(self.source_dir, self.index.filenames[i]))
+            except FileNotFoundError:  # removed since the last refresh
+                continue
+            if time.time() - modified < self.settle:
+                break  # still being written; the following files are taken after it
+            ready.append(i)
+        return ready
+
+    def push(self, i):
+        """
+        Reads file i of the index into the stream, and writes the output of its predecessor.
+        """
+        filename = self.index.filenames[i]
+        path = os.path.join(self.source_dir, filename)
+        landed = os.path.getmtime(path)
+        self.next_ns = int(self.index.start_ns[i]) + 1
+
+        if self.end is not None and not self.continuous(self.end, i):
+            logging.info(f"Gap before {filename}, starting a new stream")
+            self.close_stream()
+
+        with open_source(path, self.metrics) as dataset:
+            n_samples = dataset.shape[0]
+            blocks_downsampled = []
+            for (c0, c1), resampler in self.get_resamplers(dataset):
+                with self.metrics.stage('read', filename):
+                    block = read_block(dataset, slice(None), slice(c0, c1))
+                self.metrics.add(filename, bytes_read=block.nbytes)
+                with self.metrics.stage('resample', filename):
+                    blocks_downsampled.append(((c0, c1), resampler.push(block)))
+
+        if self.pending is not None:
+            self.emit(blocks_downsampled, final=True)
+            self.release(self.kept)
+            self.kept = self.pending['filename']
+        self.pending = {'filename': filename, 'n_samples': n_samples, 'stream_offset': self.position,
+                        'landed': landed, 'latency': None}
+        self.position += n_samples
+        self.end = self.file_end(i, n_samples)
+
+    def check_edge(self):
+        """
+        Writes the output of the newest file without its successor once edge_timeout has passed.
+        """
+        if (self.pending is None or self.pending['latency'] is not None or self.edge_timeout is None
+                or time.time() - self.pending['landed'] < self.edge_timeout):
+            return
+        # Flushing shallow copies leaves the stream untouched (the resamplers replace their state arrays)
+        with self.metrics.stage('resample', self.pending['filename']):
+            blocks_downsampled = [(block, copy.copy(resampler).flush()) for block, resampler in self.resamplers.items()]
+        self.emit(blocks_downsampled, final=False)
+
+    def close_stream(self, shutdown=False):
+        """
+        Ends the current stream, writing the output of its last file as if the stream ended there.
+        At a gap, the sources of the stream are released; at shutdown, they are kept for the restart.
+        """
+        if self.pending is not None and self.pending['latency'] is None:
+            with self.metrics.stage('resample', self.pending['filename']):
+                blocks_downsampled = [(block, resampler.flush()) for block, resampler in self.resamplers.items()]
+            self.emit(blocks_downsampled, final=True)
+        elif self.pending is not None:  # already written at the edge timeout, with the same zero-padded edge
+            self.emit(None, final=True, write=False)
+        if not shutdown:
+            self.release(self.kept)
+            self.release(self.pending['filename'] if self.pending is not None else None)
+            self.kept = None
+        self.resamplers = {}
+        self.pending = None
+        self.end = None
+        self.position = 0
+
+    def emit(self, blocks_downsampled, final, write=True):
+        """
+        Writes the output of the pending file (final: no later revision).
+        """
+        pending = self.pending
+        filename = pending['filename']
+        source_path = os.path.join(self.source_dir, filename)
+        if write:
+            n_channels = list(self.resamplers)[-1][1]
+            n_rows, dtype = blocks_downsampled[0][1].shape[0], blocks_downsampled[0][1].dtype
+            with self.metrics.stage('concat', filename):
+                data_downsampled = np.empty((n_rows, n_channels), dtype=dtype)
+                for (c0, c1), block_downsampled in blocks_downsampled:
+                    data_downsampled[:, c0:c1] = block_downsampled
+            write_downsampled(source_path, os.path.join(self.target_dir, filename), data_downsampled,
+                              self.up / self.down, self.output_options, None, self.metrics, self.journal,
+                              pending['n_samples'], pending['stream_offset'])
+
+            if pending['latency'] is None:
+                pending['latency'] = time.time() - pending['landed']
+                edge = "" if final else f" | edge timeout after {self.edge_timeout:g} s"
+                logging.info(f"Finished file {filename} | Latency: {pending['latency']:.2f} s{edge}")
+            else:
+                logging.info(f"Revised file {filename} with the head of its successor")
+
+        if final:
+            self.metrics.file_done(filename, pending['latency'])
+
+    def release(self, filename):
+        """
+        Removes the source of filename (if remove_sources), once no output of the stream needs it anymore.
+        """
+        if self.remove_sources and filename is not None:
+            with self.metrics.stage('delete', filename):
+                os.remove(os.path.join(self.source_dir, filename))
+
+    def stop(self, *args):
+        """
+        Stops the watcher after the current file (usable as a signal handler).
+        """
+        logging.info("Stop requested")
+        self.stopped = True
+
+    def poll(self):
+        """
+        Pushes the new files into the stream and writes the edge output if it is due. Returns the number of new files.
+        """
+        n_new = 0
+        for i in self.scan():
+            if self.stopped:
+                break
+            self.push(i)
+            n_new += 1
+        self.check_edge()
+        return n_new
+
+    def run(self, poll_interval=1.0, exit_after_idle=None):
+        """
+        Polls the source directory until stop() is called (or exit_after_idle seconds without a new file),
+        then ends the stream.
+        """
+        logging.info(f"Watching {self.source_dir} every {poll_interval:g} s")
+        last_arrival = time.time()
+        while not self.stopped:
+            if self.poll():
+                last_arrival = time.time()
+            if exit_after_idle is not None and time.time() - last_arrival > exit_after_idle:
+                logging.info(f"No new file for {exit_after_idle:g} s, stopping")
+                break
+            if not self.stopped:
+                time.sleep(poll_interval)
+
+        self.close_stream(shutdown=True)
+        self.metrics.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsample DAS HDF5 files as they arrive in a directory.")
+    parser.add_argument('--source_dir', type=str, required=True, help='Directory to which the acquisition writes the HDF5 files')
+    parser.add_argument('--target_dir', type=str, required=True, help='Target directory to save downsampled HDF5 files')
+    parser.add_argument('--log_dir', type=str, default='./downsample_logs', help='Directory to save log files')
+    parser.add_argument('--up', type=int, default=2, help='Upsampling factor')
+    parser.add_argument('--down', type=int, default=5, help='Downsampling factor')
+    parser.add_argument('--engine', type=str, default='polyphase', choices=sorted(ENGINES),
+                        help='Resampling engine (see resampling.py)')
+    parser.add_argument('--channel_block', type=int, default=256,
+                        help='Number of channels resampled at once, bounds the peak memory (0 for all channels)')
+    parser.add_argument('--chunks', type=str, default=None,
+                        help="Chunk shape of the output 'Acoustic' dataset, e.g. '4800,64'")
+    parser.add_argument('--compression', type=str, default=None, choices=['gzip', 'lzf'],
+                        help="Compression filter of the output 'Acoustic' dataset")
+    parser.add_argument('--poll_interval', type=float, default=1.0, help='Seconds between two scans of source_dir')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='Seconds without modification after which a file is considered completely written')
+    parser.add_argument('--edge_timeout', type=float, default=30.0,
+                        help='Seconds after the landing of the newest file after which it is written without its '
+                             'successor (revised when the successor arrives; negative: always wait)')
+    parser.add_argument('--start_time', type=str, default=None,
+                        help='Skip the files starting before this UTC time, e.g. 20240408T154300 (default: all files)')
+    parser.add_argument('--remove_sources', action='store_true', help='Remove every source file once the outputs of the file and of its successor are final '
+                             '(the newest two sources are kept for a restart)')
+    parser.add_argument('--exit_after_idle', type=float, default=None,
+                        help='Stop after this many seconds without a new file (default: run until interrupted)')
+    parser.add_argument('--index', type=str, default=None,
+                        help='Path of the archive index of source_dir (default: in the cache directory, see archive_index.py)')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help="JSONL file of the per-file metrics and latencies (default: in log_dir, 'none' to disable)")
+    parser.add_argument('--prometheus', type=str, default=None,
+                        help='Prometheus textfile with the rolling summary, including the latency percentiles')
+    parser.add_argument('--summary_every', type=int, default=10,
+                        help='Number of files between two progress summaries')
+    args = parser.parse_args()
+
+    # Setup logging
+    date_stamp = datetime.now().strftime("%Y-%m-%d-%H:%M:%S")
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(args.log_dir, f"live_{date_stamp}.log"),
+                        filemode="w",
+                        level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s',)
+
+    for arg, value in vars(args).items():
+        logging.info(f'{arg} = {value}')
+
+    metrics_path = args.metrics or os.path.join(args.log_dir, f"live_{date_stamp}_metrics.jsonl")
+    metrics = RunMetrics(metrics_path if metrics_path.lower() != 'none' else None, args.prometheus, args.summary_every)
+    output_options = {
+        'chunks': tuple(int(c) for c in args.chunks.split(',')) if args.chunks else None,
+        'compression': args.compression,
+    }
+
+    os.makedirs(args.target_dir, exist_ok=True)
+    watcher = LiveDownsampler(args.source_dir, args.target_dir, args.up, args.down, args.engine, args.channel_block,
+                              output_options, args.edge_timeout if args.edge_timeout >= 0 else None, args.settle,
+                              args.remove_sources, args.start_time, args.index, metrics, Journal(args.target_dir))
+
+    # Ctrl-C, and the SIGTERM of SLURM and systemd, end the stream after the current file
+    signal.signal(signal.SIGINT, watcher.stop)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    watcher.run(args.poll_interval, args.exit_after_idle)
+
+
+if __name__ == "__main__":
+    main()
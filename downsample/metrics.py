@@ -0,0 +1,326 @@
+"""
+Per-Stage Metrics of FORGE DAS Downsampling Runs
+
+This module instruments downsample.py: every source file gets a record with the time spent in each
+processing stage, the bytes read and written, its throughput and the peak resident memory of the
+process, so that long SLURM jobs can be monitored and a slow node can be diagnosed as I/O- or CPU-bound.
+
+Stages:
+    - open:     opening the source file (HDF5 metadata, memory map)
+    - read:     reading the 'Acoustic' samples into memory
+    - concat:   assembling arrays in memory (concatenating prefetched inputs, placing the resampled
+                channel blocks into the output array)
+    - resample: temporal resampling, and spatial decimation when enabled
+    - write:    creating and writing the output file(s)
+    - delete:   removing the source file
+
+    The stages of a file are summed over all the steps that touch it (e.g. the three reads of a file by
+    the triplet method); the record of a file is emitted when its source file is removed (or released,
+    for files kept for neighbouring shards). Stages can run in the reader and writer threads of the I/O
+    pipeline (pipeline.py), so their sum can exceed the wall time per file.
+
+Outputs:
+    - JSONL: one record per file (--metrics), e.g.
+      {"time": "...", "worker": null, "file": "16B_...h5", "seconds": {"open": 0.01, "read": 2.1, ...},
+       "bytes_read": 718080000, "bytes_written": 287232000, "throughput_mb_s": 152.3, "wall_seconds": 4.7,
+       "peak_rss_mb": 2210.4}, plus "latency_seconds" in live mode (live.py)
+    - Rolling summary: every `summary_every` files, a log line with the progress, files/s, MB/s, ETA,
+      the p50/p95 of every stage over the last `window` files, the I/O vs compute share of the time, and
+      the p50/p95 end-to-end latency in live mode
+    - Prometheus: optionally, the same summary as a node_exporter textfile (--prometheus), replaced
+      atomically on every update
+
+Usage Example:
+    metrics = RunMetrics('run_metrics.jsonl', prometheus_path='/var/lib/node_exporter/downsample.prom')
+    metrics.start(n_files=len(files))
+    with metrics.stage('read', filename):
+        data = dataset[...]
+    metrics.add(filename, bytes_read=data.nbytes)
+    metrics.file_done(filename)
+    metrics.finish()
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import numpy as np
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+STAGES = ('open', 'read', 'concat', 'resample', 'write', 'delete')
+IO_STAGES = ('open', 'read', 'write', 'delete')
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the current process in bytes (None if unknown).
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024  # kilobytes on Linux
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class NullMetrics:
+    """
+    Metrics that record nothing, the default of the downsampling functions.
+    """
+
+    enabled = False
+
+    def stage(self, name, filename):
+        return nullcontext()
+
+    def add(self, filename, stage=None, seconds=0.0, bytes_read=0, bytes_written=0):
+        pass
+
+    def file_done(self, filename, latency=None):
+        pass
+
+    def start(self, n_files=None):
+        pass
+
+    def finish(self):
+        pass
+
+    def for_worker(self, worker):
+        return self
+
+
+NULL_METRICS = NullMetrics()
+
+
+class RunMetrics:
+    """
+    Collects the stage timings and byte counts of every file of a run (thread-safe).
+
+    jsonl_path: file to which the per-file records are appended (None: no records)
+    prometheus_path: node_exporter textfile with the rolling summary (None: no textfile)
+    summary_every: number of files between two summaries (log line and textfile); 0 disables them
+    window: number of most recent files over which the stage percentiles are computed
+    worker: optional worker (shard) number, added to the records and as a Prometheus label
+    """
+
+    enabled = True
+
+    def __init__(self, jsonl_path=None, prometheus_path=None, summary_every=10, window=100, worker=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.summary_every = summary_every
+        self.window = window
+        self.worker = worker
+        self._lock = threading.Lock()
+        self.start()
+
+    def __getstate__(self):
+        # Sent to the worker processes of the parallel mode without the lock
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def for_worker(self, worker):
+        """
+        Returns fresh metrics with the same outputs for a worker process (its own Prometheus textfile).
+        """
+        prometheus_path = self.prometheus_path
+        if prometheus_path is not None:
+            root, ext = os.path.splitext(prometheus_path)
+            prometheus_path = f"{root}_{worker}{ext}"
+        return RunMetrics(self.jsonl_path, prometheus_path, self.summary_every, self.window, worker)
+
+    def start(self, n_files=None):
+        """
+        Resets the counters at the start of a run of n_files files (used for the ETA).
+        """
+        self.n_files = n_files
+        self.n_done = 0
+        self.start_time = self.last_time = time.time()
+        self.pending = {}  # filename -> stage seconds and bytes of the files in progress
+        self.history = {stage: deque(maxlen=self.window) for stage in STAGES}
+        self.latencies = deque(maxlen=self.window)
+        self.stage_totals = dict.fromkeys(STAGES, 0.0)
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @contextmanager
+    def stage(self, name, filename):
+        """
+        Times the enclosed block as stage `name` of filename.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(filename, name, time.perf_counter() - start)
+
+    def add(self, filename, stage=None, seconds=0.0, bytes_read=0, bytes_written=0):
+        bytes_read, bytes_written = int(bytes_read), int(bytes_written)
+        with self._lock:
+            record = self.pending.setdefault(filename, {'seconds': dict.fromkeys(STAGES, 0.0),
+                                                        'bytes_read': 0, 'bytes_written': 0})
+            if stage is not None:
+                record['seconds'][stage] += seconds
+                self.stage_totals[stage] += seconds
+            record['bytes_read'] += bytes_read
+            record['bytes_written'] += bytes_written
+            self.bytes_read += bytes_read
+            self.bytes_written += bytes_written
+
+    def file_done(self, filename, latency=None):
+        """
+        Emits the record of filename, and the rolling summary every summary_every files.
+        latency: optional end-to-end latency in seconds, from the arrival of the source file to its output
+                 (live mode, see live.py).
+        """
+        with self._lock:
+            pending = self.pending.pop(filename, None) or {'seconds': {}, 'bytes_read': 0, 'bytes_written': 0}
+            now = time.time()
+            seconds = {stage: round(pending['seconds'].get(stage, 0.0), 6) for stage in STAGES}
+            busy = sum(seconds.values())
+            rss = peak_rss()
+            record = {
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'worker': self.worker,
+                'file': filename,
+                'seconds': seconds,
+                'bytes_read': pending['bytes_read'],
+                'bytes_written': pending['bytes_written'],
+                'throughput_mb_s': round(pending['bytes_read'] / 1e6 / busy, 3) if busy > 0 else None,
+                'wall_seconds': round(now - self.last_time, 6),
+                'peak_rss_mb': round(rss / 1e6, 1) if rss is not None else None,
+            }
+            if latency is not None:
+                record['latency_seconds'] = round(latency, 3)
+                self.latencies.append(latency)
+            self.last_time = now
+            self.n_done += 1
+            for stage in STAGES:
+                self.history[stage].append(seconds[stage])
+
+            if self.jsonl_path is not None:
+                with open(self.jsonl_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+
+            if self.summary_every and self.n_done % self.summary_every == 0:
+                self._report()
+
+    def summary(self):
+        """
+        Returns the rolling summary: progress, rates, ETA, stage percentiles and I/O share.
+        """
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        files_per_s = self.n_done / elapsed
+        remaining = self.n_files - self.n_done if self.n_files is not None else None
+        total = sum(self.stage_totals.values())
+        return {
+            'files_done': self.n_done,
+            'files_total': self.n_files,
+            'elapsed_seconds': elapsed,
+            'files_per_s': files_per_s,
+            'read_mb_s': self.bytes_read / 1e6 / elapsed,
+            'write_mb_s': self.bytes_written / 1e6 / elapsed,
+            'eta_seconds': remaining / files_per_s if remaining is not None and files_per_s > 0 else None,
+            'stage_p50': {stage: float(np.percentile(h, 50)) if h else 0.0 for stage, h in self.history.items()},
+            'stage_p95': {stage: float(np.percentile(h, 95)) if h else 0.0 for stage, h in self.history.items()},
+            'stage_totals': dict(self.stage_totals),
+            'io_share': sum(self.stage_totals[s] for s in IO_STAGES) / total if total > 0 else None,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_bytes': peak_rss(),
+            'latency_p50': float(np.percentile(self.latencies, 50)) if self.latencies else None,
+            'latency_p95': float(np.percentile(self.latencies, 95)) if self.latencies else None,
+        }
+
+    def _report(self):
+        summary = self.summary()
+        progress = f"{summary['files_done']}" + (f"/{summary['files_total']}" if summary['files_total'] is not None else "")
+        eta = format_duration(summary['eta_seconds']) if summary['eta_seconds'] is not None else "n/a"
+        stages = ", ".join(f"{stage} {summary['stage_p50'][stage]:.2f}/{summary['stage_p95'][stage]:.2f}"
+                           for stage in STAGES)
+        io_share = f"{100 * summary['io_share']:.0f}%" if summary['io_share'] is not None else "n/a"
+        rss = f"{summary['peak_rss_bytes'] / 1e9:.2f} GB" if summary['peak_rss_bytes'] is not None else "n/a"
+        worker = f"Worker {self.worker} | " if self.worker is not None else ""
+        logging.info(f"{worker}Progress {progress} files | {summary['files_per_s']:.3f} files/s, "
+                     f"{summary['read_mb_s']:.1f} MB/s read, {summary['write_mb_s']:.1f} MB/s written | ETA {eta} | "
+                     f"p50/p95 s: {stages} | I/O {io_share} of stage time | peak RSS {rss}"
+                     + (f" | latency p50/p95 {summary['latency_p50']:.1f}/{summary['latency_p95']:.1f} s"
+                        if summary['latency_p50'] is not None else ""))
+        if self.prometheus_path is not None:
+            self.write_prometheus(summary)
+
+    def write_prometheus(self, summary=None):
+        """
+        Writes the summary in the Prometheus text format to prometheus_path (atomically, through a temporary file).
+        """
+        summary = summary or self.summary()
+        labels = f'worker="{self.worker}"' if self.worker is not None else ''
+
+        def sample(name, value, **extra):
+            label = ",".join([labels] * bool(labels) + [f'{k}="{v}"' for k, v in extra.items()])
+            return f"{name}{{{label}}} {value}" if label else f"{name} {value}"
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + samples)
+
+        metric('downsample_files_done', 'gauge', 'Files finished in this run', [sample('downsample_files_done', summary['files_done'])])
+        if summary['files_total'] is not None:
+            metric('downsample_files_total', 'gauge', 'Files to process in this run',
+                   [sample('downsample_files_total', summary['files_total'])])
+        metric('downsample_files_per_second', 'gauge', 'Average number of files finished per second',
+               [sample('downsample_files_per_second', summary['files_per_s'])])
+        if summary['eta_seconds'] is not None:
+            metric('downsample_eta_seconds', 'gauge', 'Estimated time until the end of the run',
+                   [sample('downsample_eta_seconds', summary['eta_seconds'])])
+        metric('downsample_bytes_read_total', 'counter', 'Bytes of Acoustic data read',
+               [sample('downsample_bytes_read_total', summary['bytes_read'])])
+        metric('downsample_bytes_written_total', 'counter', 'Bytes of output files written',
+               [sample('downsample_bytes_written_total', summary['bytes_written'])])
+        metric('downsample_stage_seconds_total', 'counter', 'Time spent per processing stage',
+               [sample('downsample_stage_seconds_total', summary['stage_totals'][s], stage=s) for s in STAGES])
+        metric('downsample_stage_seconds', 'gauge', 'Percentiles of the stage time per file over the recent files',
+               [sample('downsample_stage_seconds', summary[f'stage_p{q}'][s], stage=s, quantile=f"0.{q}")
+                for s in STAGES for q in (50, 95)])
+        if summary['peak_rss_bytes'] is not None:
+            metric('downsample_peak_rss_bytes', 'gauge', 'Peak resident set size of the process',
+                   [sample('downsample_peak_rss_bytes', summary['peak_rss_bytes'])])
+        if summary['latency_p50'] is not None:
+            metric('downsample_latency_seconds', 'gauge', 'Percentiles of the end-to-end latency over the recent files',
+                   [sample('downsample_latency_seconds', summary[f'latency_p{q}'], quantile=f"0.{q}") for q in (50, 95)])
+        metric('downsample_last_update_timestamp_seconds', 'gauge', 'Time of the last update',
+               [sample('downsample_last_update_timestamp_seconds', f"{time.time():.3f}")])
+
+        tmp_path = f"{self.prometheus_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+    def finish(self):
+        """
+        Reports the final summary of the run.
+        """
+        with self._lock:
+            if self.n_done:
+                self._report()
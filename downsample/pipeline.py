@@ -0,0 +1,160 @@
+"""
+Pipelined I/O for FORGE DAS Downsampling
+
+This module overlaps the three stages of downsampling a sequence of files: reading the next files,
+resampling the current one, and writing (and removing) the finished ones. On network storage the
+wall time per file then approaches max(read, compute, write) instead of their sum.
+
+Pipeline Stages:
+    - Prefetcher: a reader thread that loads the next `depth` files into memory ahead of the compute
+      stage (memory-mapped contiguous files are copied, so the read happens in the thread)
+    - Compute: the resampling, in the calling thread (NumPy/SciPy release the GIL while filtering)
+    - BackgroundWriter: a writer thread that runs the queued writes and file removals in submission order,
+      with at most `depth` pending tasks, so that a source file is only removed after the outputs that
+      were submitted before its removal have been written
+
+    Errors of the threads are raised in the calling thread (on the next call, or when closing). After a
+    failed task, the writer drops all later tasks, so that no source is removed after a failed write.
+    HDF5 calls through h5py are serialized by its global lock, so the overlap comes from the memory-mapped
+    reads and the compute stage.
+
+Usage Example:
+    with Prefetcher(file_paths, depth=2) as prefetcher, BackgroundWriter(depth=2) as writer:
+        for path, data in prefetcher:
+            writer.submit(write_downsampled, path, target_path, resample(data), resample_ratio)
+            writer.submit(os.remove, path)
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import queue
+import threading
+from contextlib import ExitStack
+from das_io import open_acoustic, read_block
+from metrics import NULL_METRICS
+
+_DONE = object()
+
+
+def read_file(file_path, metrics=NULL_METRICS):
+    """
+    Reads the whole 'Acoustic' dataset of file_path into memory.
+    metrics: optional RunMetrics (see metrics.py) recording the open and read stages of the file.
+    """
+    filename = os.path.basename(file_path)
+    with ExitStack() as stack:
+        with metrics.stage('open', filename):
+            dataset = stack.enter_context(open_acoustic(file_path))
+        with metrics.stage('read', filename):
+            data = read_block(dataset)
+    metrics.add(filename, bytes_read=data.nbytes)
+    return data
+
+
+class Prefetcher:
+    """
+    Iterates over (path, data) of file_paths, read by a background thread at most `depth` files ahead.
+    """
+
+    def __init__(self, file_paths, depth=2, read=read_file):
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(list(file_paths), read), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, file_paths, read):
+        try:
+            for path in file_paths:
+                if not self._put((path, read(path))):
+                    return
+        except BaseException as error:
+            self._put((None, error))
+            return
+        self._put(_DONE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._queue.get()
+        if item is _DONE:
+            self._queue.put(_DONE)
+            raise StopIteration
+        path, data = item
+        if isinstance(data, BaseException):
+            raise data
+        return path, data
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BackgroundWriter:
+    """
+    Runs submitted tasks (e.g. writes and file removals) in order in a background thread,
+    with at most `depth` tasks waiting. The first error stops the writer: every later task is dropped,
+    and the error is raised by every following submit() and by close().
+    """
+
+    def __init__(self, depth=2):
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is _DONE:
+                return
+            if self._error is None:
+                fn, args, kwargs = task
+                try:
+                    fn(*args, **kwargs)
+                except BaseException as error:
+                    self._error = error
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, fn, *args, **kwargs):
+        self._raise()
+        self._queue.put((fn, args, kwargs))
+
+    def close(self):
+        """
+        Waits for the pending tasks, and raises the first error of the writer thread, if any.
+        """
+        self._queue.put(_DONE)
+        self._thread.join()
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            # Already failing: finish the pending tasks (unless a task failed), but keep the original exception
+            self._queue.put(_DONE)
+            self._thread.join()
@@ -0,0 +1,160 @@
+"""
+Spatial Decimation of FORGE DAS Data Along Measured Depth
+
+This module reduces the channel axis of DAS recordings, using the interpolated positions of the
+1496 channels of well 16B (channel_interpolation/interpolated_das_positions_cubic_1496.csv, with
+measured depth, easting, northing and true vertical depth per channel). It complements the temporal
+downsampling of downsample.py, which applies it to every output file (--spatial_spacing, --gauge_length,
+--md_range).
+
+Decimation Modes:
+    - Crop:     keep the original channels inside a measured depth interval (e.g. the stimulated interval)
+    - Resample: resample the channels onto a uniform measured depth grid, with a Kaiser-windowed sinc
+                anti-aliasing filter (cutoff at the Nyquist wavenumber of the coarser of the input and
+                output spacings, the same window as the temporal filter). The filter is evaluated at the
+                actual channel depths, so irregular channel spacing is handled exactly
+    - Bin:      average the channels over a gauge length, with one output channel per gauge length
+                (or per given spacing)
+
+    Every output channel is a weighted sum of input channels, so the decimation is a sparse linear map
+    that is built once and applied to each block of data as a matrix product. The weights of every
+    output channel sum to one.
+
+Output Positions:
+    The measured depth, easting, northing and true vertical depth of every output channel (interpolated
+    along the well trajectory) are written to the 'ChannelPositions' group of the output files, together
+    with the decimation parameters.
+
+Usage Example:
+    from spatial import SpatialDecimator, load_channel_positions
+
+    decimator = SpatialDecimator(load_channel_positions(), spacing=5.0, md_range=(2400, 3100))
+    data_decimated = decimator(data)  # [time, 1496] -> [time, len(decimator)]
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+CHANNEL_POSITIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'channel_interpolation', 'interpolated_das_positions_cubic_1496.csv')
+POSITION_COLUMNS = ('MD_m', 'EASTING_m', 'NORTHING_m', 'TVD_m')
+
+
+def load_channel_positions(path=CHANNEL_POSITIONS):
+    """
+    Returns the channel positions table (one row per channel, columns POSITION_COLUMNS).
+    """
+    positions = pd.read_csv(path)
+    missing = [c for c in POSITION_COLUMNS if c not in positions.columns]
+    if missing:
+        raise ValueError(f"{path} is missing the columns {missing}")
+    return positions[list(POSITION_COLUMNS)]
+
+
+def kaiser_sinc(distance, cutoff, half_width, beta=5.0):
+    """
+    Kaiser-windowed sinc low-pass kernel at the given distances (cutoff in cycles per unit distance).
+    """
+    taper = np.clip(1 - (distance / half_width) ** 2, 0, None)
+    return np.sinc(2 * cutoff * distance) * np.i0(beta * np.sqrt(taper)) / np.i0(beta)
+
+
+class SpatialDecimator:
+    """
+    Sparse linear map from the input channels to decimated channels along measured depth.
+
+    positions: channel positions table (see load_channel_positions), one row per input channel
+    spacing: measured depth spacing of the output channels in meters (resample mode, or the bin
+             spacing with gauge_length); None keeps the original channels (crop mode)
+    gauge_length: averaging length in meters (bin mode)
+    md_range: (min, max) measured depth of the output channels; default: the whole fiber
+    """
+
+    def __init__(self, positions, spacing=None, gauge_length=None, md_range=None, half_width=10):
+        md = positions['MD_m'].to_numpy(dtype=np.float64)
+        if np.any(np.diff(md) <= 0):
+            raise ValueError("The channel measured depths must be strictly increasing")
+        md_min, md_max = md_range if md_range is not None else (md[0], md[-1])
+        input_spacing = float(np.median(np.diff(md)))
+
+        self.n_input = len(md)
+        self.spacing = spacing
+        self.gauge_length = gauge_length
+        self.md_range = (float(md_min), float(md_max))
+
+        if gauge_length is not None:
+            self.mode = 'bin'
+            spacing = spacing or gauge_length
+            md_out = np.arange(md_min + gauge_length / 2, md_max - gauge_length / 2 + 1e-9, spacing)
+            weights = [self._bin(md, x, gauge_length) for x in md_out]
+        elif spacing is not None:
+            self.mode = 'resample'
+            md_out = np.arange(md_min, md_max + 1e-9, spacing)
+            effective_spacing = max(spacing, input_spacing)
+            weights = [self._kernel(md, x, 0.5 / effective_spacing, half_width * effective_spacing) for x in md_out]
+        else:
+            self.mode = 'crop'
+            channels = np.flatnonzero((md >= md_min) & (md <= md_max))
+            md_out = md[channels]
+            weights = [(np.array([i]), np.ones(1)) for i in channels]
+
+        if len(md_out) == 0:
+            raise ValueError(f"No output channels in the measured depth range {self.md_range}")
+
+        rows = np.concatenate([channels for channels, _ in weights])
+        columns = np.concatenate([np.full(len(channels), j) for j, (channels, _) in enumerate(weights)])
+        values = np.concatenate([w for _, w in weights])
+        self.matrix = sparse.csr_matrix((values, (rows, columns)), shape=(self.n_input, len(md_out)))
+
+        # Positions of the output channels, interpolated along the well trajectory
+        self.positions = pd.DataFrame({column: np.interp(md_out, md, positions[column].to_numpy())
+                                       for column in POSITION_COLUMNS})
+
+    def __len__(self):
+        return self.matrix.shape[1]
+
+    @staticmethod
+    def _kernel(md, x, cutoff, half_width):
+        lo, hi = np.searchsorted(md, [x - half_width, x + half_width])
+        channels = np.arange(lo, hi)
+        weights = kaiser_sinc(md[channels] - x, cutoff, half_width)
+        if weights.sum() <= 0:
+            raise ValueError(f"No channels within the kernel half width around {x:.2f} m; increase half_width")
+        return channels, weights / weights.sum()
+
+    @staticmethod
+    def _bin(md, x, gauge_length):
+        lo, hi = np.searchsorted(md, [x - gauge_length / 2, x + gauge_length / 2])
+        if hi <= lo:
+            raise ValueError(f"No channels within the gauge length around {x:.2f} m; increase gauge_length")
+        return np.arange(lo, hi), np.full(hi - lo, 1 / (hi - lo))
+
+    def __call__(self, data):
+        """
+        Decimates data [time, input channels] to [time, output channels], keeping its dtype.
+        """
+        if data.shape[1] != self.n_input:
+            raise ValueError(f"Expected {self.n_input} channels (one per channel position), got {data.shape[1]}")
+        matrix = self.matrix.astype(np.result_type(data.dtype, np.float32))
+        return np.asarray((matrix.T @ data.T).T).astype(data.dtype, copy=False)
+
+    def write_positions(self, f):
+        """
+        Writes the output channel positions and decimation parameters to the 'ChannelPositions' group of an open h5py file.
+        """
+        if 'ChannelPositions' in f:
+            del f['ChannelPositions']
+        group = f.create_group('ChannelPositions')
+        for column in POSITION_COLUMNS:
+            group.create_dataset(column, data=self.positions[column].to_numpy())
+        group.attrs['Mode'] = self.mode
+        group.attrs['MDRange(m)'] = self.md_range
+        if self.spacing is not None:
+            group.attrs['Spacing(m)'] = self.spacing
+        if self.gauge_length is not None:
+            group.attrs['GaugeLength(m)'] = self.gauge_length
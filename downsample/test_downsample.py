@@ -0,0 +1,235 @@
+import os
+import time
+import h5py
+import numpy as np
+import pytest
+from datetime import timedelta
+from scipy.signal import resample_poly
+
+import downsample as ds
+from journal import Journal, JOURNAL_FILENAME, PARTIAL_SUFFIX
+from live import LiveDownsampler
+from resampling import StreamingResampler
+from synthetic_forge import FIRST_SEQNO, START_TIME, synthetic_filename, write_synthetic_file
+
+
+def read_outputs(directory):
+    outputs = {}
+    for f in sorted(os.listdir(directory)):
+        if f.endswith('.h5'):
+            with h5py.File(os.path.join(directory, f), 'r') as h5:
+                outputs[f] = h5['Acoustic'][...]
+    return outputs
+
+
+def assert_same_outputs(outputs, reference):
+    assert list(outputs) == list(reference)
+    for f in reference:
+        np.testing.assert_array_equal(outputs[f], reference[f], err_msg=f)
+
+
+@pytest.mark.parametrize('n_samples', [1000, 1001, 997])
+def test_streaming_resampler_matches_whole_stream(n_samples):
+    rng = np.random.default_rng(0)
+    blocks = [rng.standard_normal((n_samples, 3)) for _ in range(4)]
+    resampler = StreamingResampler(2, 5)
+    outputs = [resampler.push(block) for block in blocks] + [resampler.flush()]
+    assert outputs[0] is None
+
+    # Every block yields the output samples whose input time falls inside it, including the tail of the last block
+    stream = np.concatenate(blocks)
+    bounds = [-(-k * n_samples * 2 // 5) for k in range(len(blocks) + 1)]
+    assert [out.shape[0] for out in outputs[1:]] == list(np.diff(bounds))
+    np.testing.assert_allclose(np.concatenate(outputs[1:]), resample_poly(stream, 2, 5, axis=0), atol=1e-12)
+
+
+def test_streaming_resampler_primed_on_tail():
+    rng = np.random.default_rng(1)
+    blocks = [rng.standard_normal((1001, 2)) for _ in range(3)]
+    reference = StreamingResampler(2, 5)
+    expected = [reference.push(block) for block in blocks][2:] + [reference.flush()]
+
+    # A worker that only gets the tail of the preceding block continues the same output grid
+    resampler = StreamingResampler(2, 5)
+    resampler.prime(blocks[0][-resampler.tail_length:], n_samples=blocks[0].shape[0])
+    outputs = [resampler.push(block) for block in blocks[1:]][1:] + [resampler.flush()]
+    for output, expected_output in zip(outputs, expected):
+        np.testing.assert_array_equal(output, expected_output)
+
+
+def test_direct_write_keeps_metadata(make_archive, tmp_path):
+    source_dir, filenames = make_archive('source', n_files=3)
+    with h5py.File(os.path.join(source_dir, filenames[0]), 'r') as f:
+        source_attrs = dict(f['Acoustic'].attrs)
+
+    target_dir = str(tmp_path / 'target')
+    os.makedirs(target_dir)
+    ds.process_files(source_dir, target_dir, 0, -1, 2, 5, None)
+
+    assert sorted(os.listdir(target_dir)) == filenames
+    assert not [f for f in os.listdir(source_dir) if f.endswith('.h5')]
+    with h5py.File(os.path.join(target_dir, filenames[0]), 'r') as f:
+        dataset = f['Acoustic']
+        assert dataset.shape == (400, 8) and dataset.dtype == np.float32
+        assert dataset.attrs['InterrogationRate(Hz)'] == pytest.approx(source_attrs['InterrogationRate(Hz)'] * 2 / 5)
+        assert dataset.attrs['TimeSamplingInterval(seconds)'] == pytest.approx(
+            source_attrs['TimeSamplingInterval(seconds)'] * 5 / 2)
+        assert dataset.attrs['NumberOfLoci'] == source_attrs['NumberOfLoci']
+
+
+def run(mode, source_dir, target_dir, workers=3):
+    os.makedirs(target_dir)
+    if mode == 'triplet':
+        ds.process_files(source_dir, target_dir, 0, -1, 2, 5, None)
+    elif mode == 'streaming':
+        ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, channel_block=3)
+    else:
+        ds.process_files_parallel(source_dir, target_dir, 0, -1, 2, 5, None, workers)
+    return read_outputs(target_dir)
+
+
+def test_streaming_and_parallel_match_triplet(make_archive, tmp_path):
+    outputs = {mode: run(mode, make_archive(f'source_{mode}', n_files=7)[0], str(tmp_path / mode))
+               for mode in ('triplet', 'streaming', 'parallel')}
+    assert len(outputs['triplet']) == 7
+    assert_same_outputs(outputs['streaming'], outputs['triplet'])
+    assert_same_outputs(outputs['parallel'], outputs['triplet'])
+
+
+@pytest.mark.parametrize('workers', [2, 4, 6])
+def test_parallel_halos_on_uneven_files(make_archive, tmp_path, workers):
+    # 1001 samples per file: the output grid is shifted from file to file, which the halos must carry over
+    reference = run('streaming', make_archive('source_streaming', n_files=6, duration=1.001)[0],
+                    str(tmp_path / 'streaming'))
+    outputs = run('parallel', make_archive('source_parallel', n_files=6, duration=1.001)[0],
+                  str(tmp_path / 'parallel'), workers)
+    assert sum(output.shape[0] for output in outputs.values()) == -(-6 * 1001 * 2 // 5)
+    assert_same_outputs(outputs, reference)
+
+
+def test_pyramid_levels_match_cascaded_resampling(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=4)
+    stream = np.concatenate(list(read_outputs(source_dir).values()))
+    target_dir = str(tmp_path / 'pyramid')
+    ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, channel_block=3, pyramid=[(1, 4), (1, 5)])
+
+    # Every level resamples the previous one as a continuous stream, split at the file boundaries
+    expected = stream.astype(np.float64)
+    for level, (up, down) in zip(('x2.5', 'x10', 'x50'), ((2, 5), (1, 4), (1, 5))):
+        expected = resample_poly(expected, up, down, axis=0).astype(np.float32).astype(np.float64)
+        outputs = read_outputs(os.path.join(target_dir, level))
+        assert list(outputs) == filenames
+        np.testing.assert_allclose(np.concatenate(list(outputs.values())), expected, atol=1e-5, err_msg=level)
+        with h5py.File(os.path.join(target_dir, level, filenames[0]), 'r') as f:
+            assert f['Acoustic'].attrs['InterrogationRate(Hz)'] == pytest.approx(1000 / float(level[1:]))
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.mark.parametrize('resume_mode', ['triplet', 'streaming', 'parallel'])
+@pytest.mark.parametrize('crash_at', [0, 3])
+def test_resume_after_crash(make_archive, tmp_path, monkeypatch, resume_mode, crash_at):
+    reference = run('streaming', make_archive('source_reference', n_files=6)[0], str(tmp_path / 'reference'))
+
+    # Crash while renaming the output of file crash_at, leaving it as a partial file
+    source_dir, filenames = make_archive('source', n_files=6)
+    target_dir = str(tmp_path / 'target')
+    os.makedirs(target_dir)
+    finish_output = ds.finish_output
+    finished = []
+
+    def crashing(source_path, target_path, *args, **kwargs):
+        if len(finished) == crash_at:
+            raise Crash
+        finished.append(target_path)
+        return finish_output(source_path, target_path, *args, **kwargs)
+
+    monkeypatch.setattr(ds, 'finish_output', crashing)
+    with pytest.raises(Crash):
+        ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, journal=Journal(target_dir))
+    monkeypatch.setattr(ds, 'finish_output', finish_output)
+
+    assert os.listdir(target_dir).count(filenames[crash_at] + PARTIAL_SUFFIX) == 1
+    assert len(Journal(target_dir).entries) == crash_at
+    with open(os.path.join(target_dir, JOURNAL_FILENAME), 'a') as f:
+        f.write('{"file": "16B_')  # journal line cut short by the crash
+
+    journal = Journal(target_dir)
+    if resume_mode == 'triplet':
+        ds.process_files(source_dir, target_dir, 0, -1, 2, 5, None, journal=journal, resume=True)
+    elif resume_mode == 'streaming':
+        ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, journal=journal, resume=True)
+    else:
+        ds.process_files_parallel(source_dir, target_dir, 0, -1, 2, 5, None, 2, journal=journal, resume=True)
+
+    assert_same_outputs(read_outputs(target_dir), reference)
+    assert not [f for f in os.listdir(target_dir) if f.endswith(PARTIAL_SUFFIX)]
+    assert not [f for f in os.listdir(source_dir) if f.endswith('.h5')]
+    assert all(Journal(target_dir).is_complete(os.path.join(target_dir, f)) for f in filenames)
+
+
+def test_journal_rejects_truncated_output(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=2)
+    target_dir = str(tmp_path / 'target')
+    os.makedirs(target_dir)
+    ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, journal=Journal(target_dir))
+    target_path = os.path.join(target_dir, filenames[0])
+    assert Journal(target_dir).is_complete(target_path)
+
+    with open(target_path, 'r+b') as f:
+        f.truncate(os.path.getsize(target_path) // 2)
+    assert not Journal(target_dir).is_complete(target_path)
+    assert Journal(target_dir).is_complete(os.path.join(target_dir, filenames[1]))
+
+
+def feed_live(source_dir, target_dir, n_files, restart_after=None, **kwargs):
+    """
+    Writes the files of a synthetic archive one by one to source_dir, polling a LiveDownsampler after every file.
+    Returns the number of outputs after every poll.
+    """
+    def start():
+        return LiveDownsampler(source_dir, target_dir, 2, 5, channel_block=3, settle=0, journal=Journal(target_dir),
+                               **kwargs)
+
+    os.makedirs(source_dir)
+    watcher = start()
+    n_outputs = []
+    for n in range(1, n_files + 1):
+        time.sleep(0.05)  # the directory signature has the resolution of the kernel clock tick
+        filename = synthetic_filename(START_TIME + timedelta(seconds=n - 1), FIRST_SEQNO + n - 1)
+        write_synthetic_file(os.path.join(source_dir, filename), 1000, 8, 1000.0, seed=n - 1)
+        # After a restart, the last complete file is pushed again before the new one
+        assert watcher.poll() == (2 if restart_after is not None and n == restart_after + 1 else 1)
+        n_outputs.append(len(read_outputs(target_dir)))
+        if n == restart_after:
+            watcher.stop()
+            watcher.run()
+            watcher = start()
+    watcher.stop()
+    watcher.run()
+    return n_outputs
+
+
+@pytest.mark.parametrize('edge_timeout', [None, 0])
+def test_live_matches_streaming(make_archive, tmp_path, edge_timeout):
+    reference = run('streaming', make_archive('source_reference', n_files=5)[0], str(tmp_path / 'reference'))
+    target_dir = str(tmp_path / 'live')
+    n_outputs = feed_live(str(tmp_path / 'source'), target_dir, 5, edge_timeout=edge_timeout)
+
+    # Without a timeout, an output waits for the head of its successor; with edge_timeout=0 it is written
+    # right away with a zero-padded edge, and revised when the successor arrives
+    assert n_outputs == ([0, 1, 2, 3, 4] if edge_timeout is None else [1, 2, 3, 4, 5])
+    assert_same_outputs(read_outputs(target_dir), reference)
+
+
+@pytest.mark.parametrize('remove_sources', [False, True])
+def test_live_restart_from_journal(make_archive, tmp_path, remove_sources):
+    reference = run('streaming', make_archive('source_reference', n_files=5)[0], str(tmp_path / 'reference'))
+    source_dir, target_dir = str(tmp_path / 'source'), str(tmp_path / 'live')
+    feed_live(source_dir, target_dir, 5, restart_after=3, remove_sources=remove_sources)
+
+    assert_same_outputs(read_outputs(target_dir), reference)
+    # The newest two sources are kept, so that a restart can revise the zero-padded edge of the newest output
+    assert len(os.listdir(source_dir)) == (2 if remove_sources else 5)
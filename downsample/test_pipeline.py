@@ -0,0 +1,54 @@
+import os
+import pytest
+
+import downsample as ds
+from pipeline import BackgroundWriter
+
+
+def test_writer_drops_tasks_after_failure():
+    ran = []
+
+    def fail():
+        raise OSError("No space left on device")
+
+    with pytest.raises(OSError):
+        with BackgroundWriter(depth=4) as writer:
+            writer.submit(ran.append, 'write 0')
+            writer.submit(fail)
+            for k in range(1, 10):
+                writer.submit(ran.append, f'remove {k}')
+    assert ran == ['write 0']
+
+
+def test_writer_error_is_raised_again_on_close():
+    writer = BackgroundWriter(depth=1)
+    writer.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        for _ in range(10):
+            writer.submit(print, "not run")
+    with pytest.raises(ZeroDivisionError):
+        writer.close()
+
+
+def test_failed_write_keeps_sources(make_archive, tmp_path, monkeypatch):
+    source_dir, filenames = make_archive(n_files=6)
+    target_dir = str(tmp_path / 'target')
+    write_downsampled = ds.write_downsampled
+    removed = []
+
+    def failing_write(source_path, *args, **kwargs):
+        if os.path.basename(source_path) == filenames[3]:
+            raise OSError("No space left on device")
+        return write_downsampled(source_path, *args, **kwargs)
+
+    def recording_remove(file_path, *args, **kwargs):
+        removed.append(os.path.basename(file_path))
+
+    monkeypatch.setattr(ds, 'write_downsampled', failing_write)
+    monkeypatch.setattr(ds, 'remove_source', recording_remove)
+    with pytest.raises(OSError):
+        ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, write_queue=4)
+
+    # File 2 is the predecessor of the failed file and must be kept to resume from it
+    assert removed == filenames[:2]
+    assert sorted(os.listdir(target_dir)) == filenames[:3]
@@ -0,0 +1,84 @@
+import os
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+import downsample as ds
+from spatial import POSITION_COLUMNS, SpatialDecimator, load_channel_positions
+
+
+def straight_well(n_channels=40, md_start=100.0):
+    # Channels every meter along a straight, inclined well
+    md = md_start + np.arange(n_channels, dtype=np.float64)
+    return pd.DataFrame({'MD_m': md, 'EASTING_m': 2 * md, 'NORTHING_m': np.full(n_channels, 5.0), 'TVD_m': md / 2})
+
+
+def test_crop_keeps_channels_in_range():
+    decimator = SpatialDecimator(straight_well(), md_range=(110, 119.5))
+    data = np.random.default_rng(0).standard_normal((50, 40)).astype(np.float32)
+
+    assert decimator.mode == 'crop' and len(decimator) == 10
+    output = decimator(data)
+    assert output.dtype == np.float32
+    np.testing.assert_array_equal(output, data[:, 10:20])
+    np.testing.assert_array_equal(decimator.positions['MD_m'], np.arange(110, 120))
+
+
+def test_bin_averages_gauge_lengths():
+    decimator = SpatialDecimator(straight_well(), gauge_length=5.0)
+    data = np.random.default_rng(0).standard_normal((50, 40))
+
+    # Bins of 5 channels centered at 102.5 m, 107.5 m, ... (the last bin would end past the fiber)
+    assert decimator.mode == 'bin' and len(decimator) == 7
+    np.testing.assert_allclose(decimator(data), data[:, :35].reshape(50, 7, 5).mean(axis=2))
+    positions = decimator.positions
+    np.testing.assert_allclose(positions['MD_m'], 102.5 + 5 * np.arange(7))
+    np.testing.assert_allclose(positions['EASTING_m'], 2 * positions['MD_m'])
+    np.testing.assert_allclose(positions['TVD_m'], positions['MD_m'] / 2)
+
+
+def test_resample_filters_short_wavelengths():
+    positions = straight_well(n_channels=100)
+    md = positions['MD_m'].to_numpy()
+    decimator = SpatialDecimator(positions, spacing=2.0)
+    md_out = decimator.positions['MD_m'].to_numpy()
+
+    assert decimator.mode == 'resample' and len(decimator) == 50
+    np.testing.assert_allclose(np.asarray(decimator.matrix.sum(axis=0)).ravel(), 1.0)
+    # A linear trend is kept away from the ends of the fiber, the wavenumber of the input Nyquist is removed
+    interior = (md_out >= md[0] + 20) & (md_out <= md[-1] - 20)
+    trend = decimator((3.0 + 0.5 * md)[np.newaxis])[0]
+    np.testing.assert_allclose(trend[interior], 3.0 + 0.5 * md_out[interior], rtol=1e-10)
+    alternating = decimator(np.cos(np.pi * md)[np.newaxis])[0]
+    assert np.abs(alternating[interior]).max() < 1e-2
+
+
+def test_default_positions():
+    positions = load_channel_positions()
+    assert list(positions.columns) == list(POSITION_COLUMNS) and len(positions) == 1496
+    decimator = SpatialDecimator(positions, spacing=5.0, md_range=(2400, 3100))
+    assert len(decimator) == 141
+    with pytest.raises(ValueError):
+        decimator(np.zeros((10, 1000)))
+
+
+def test_downsampled_files_have_channel_positions(make_archive, tmp_path):
+    source_dir, filenames = make_archive('source', n_files=3, n_channels=40)
+    reference_dir, target_dir = str(tmp_path / 'reference'), str(tmp_path / 'target')
+    ds.process_files_streaming(make_archive('source_reference', n_files=3, n_channels=40)[0], reference_dir,
+                               0, -1, 2, 5, None)
+    decimator = SpatialDecimator(straight_well(), gauge_length=5.0)
+    ds.process_files_streaming(source_dir, target_dir, 0, -1, 2, 5, None, spatial=decimator)
+
+    assert sorted(os.listdir(target_dir)) == filenames
+    for filename in filenames:
+        with h5py.File(os.path.join(reference_dir, filename), 'r') as f:
+            expected = decimator(f['Acoustic'][...])
+        with h5py.File(os.path.join(target_dir, filename), 'r') as f:
+            np.testing.assert_allclose(f['Acoustic'][...], expected, rtol=1e-5, atol=1e-6)
+            assert f['Acoustic'].attrs['NumberOfLoci'] == 7
+            group = f['ChannelPositions']
+            assert group.attrs['Mode'] == 'bin' and group.attrs['GaugeLength(m)'] == 5.0
+            for column in POSITION_COLUMNS:
+                np.testing.assert_allclose(group[column][...], decimator.positions[column])
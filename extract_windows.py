@@ -0,0 +1,257 @@
+"""
+Batch Event-Window Extraction for FORGE DAS Data
+
+This script extracts fixed-length DAS windows around many catalog events at once, e.g. to build
+machine learning datasets from the GES16Aand16BStimulationMonitoringApril2024 catalogs.
+
+Algorithm Overview:
+    1. Load the catalogs and compute the UTC time of every event (trigger time, or the start of
+       the 'Matched File' plus 'Time Offset (s)' for catalogs without trigger columns)
+    2. Plan the reads: for every event window [t - before, t + after), find the overlapping files
+       and the row ranges inside them with the archive index, and group the pieces by file
+    3. Read each source file once (the union of the rows needed by all its events) in a process pool
+    4. Stream the pieces into one stacked output array [event, time, channel] as they arrive
+
+Output Format:
+    HDF5 (.h5): dataset 'windows' [n_events, n_window, n_channels] in the source dtype, dataset
+                'channels' with the channel numbers, and group 'events' with per-event metadata
+                (time_ns, catalog, catalog_row, complete and the catalog columns). Dataset names are the
+                normalized column names with '/' replaced by '_' (e.g. 'P S/N' -> 'P_S_N'), with the
+                original column name in the 'column' attribute.
+                Attributes: 'before(seconds)', 'after(seconds)', 'TimeSamplingInterval(seconds)'
+    NumPy (.npy): memory-mapped array of the windows, with the per-event metadata in <output>.csv
+
+    Parts of a window not covered by any file (gaps, edges of the archive) are filled with zeros and
+    the event is marked as not complete.
+
+Command Line Usage:
+    python extract_windows.py --catalogs /path/to/16BStimulationCatalogues \
+                              --source_dir /path/to/das/files \
+                              --output windows.h5 \
+                              --before 0.5 --after 1.5 \
+                              --channels 0:1496:2 --workers 8
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import h5py
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections import defaultdict
+from archive_index import ArchiveIndex
+from das_io import open_acoustic
+from catalog import catalog_files, normalize_name, parse_catalog_times
+
+
+def load_catalogs(paths):
+    """
+    Loads catalog CSVs (files, or directories of FORGE*.csv files) into one DataFrame,
+    with the source file and row of every event in the 'catalog' and 'catalog_row' columns.
+    """
+    csv_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            csv_paths += catalog_files([path])
+        else:
+            csv_paths.append(path)
+
+    catalogs = []
+    for csv_path in csv_paths:
+        df = pd.read_csv(csv_path)
+        df['catalog'] = os.path.basename(csv_path)
+        df['catalog_row'] = np.arange(len(df))
+        catalogs.append(df)
+    return pd.concat(catalogs, ignore_index=True)
+
+
+def event_times(df, index):
+    """
+    Returns the UTC event times of a catalog in epoch nanoseconds, with -1 for events without a valid time.
+    Uses the trigger times if available, otherwise the 'Matched File' start plus 'Time Offset (s)'.
+    """
+    if 'Trig_Date' in map(normalize_name, df.columns):
+        times = parse_catalog_times(df, 'Trig')
+        return np.where(times.notna(), times.to_numpy(dtype='datetime64[ns]').astype(np.int64), -1)
+
+    starts = dict(zip(index.filenames.tolist(), index.start_ns.tolist()))
+    start_ns = df['Matched File'].map(starts)
+    times = start_ns + np.round(df['Time Offset (s)'] * 1e9)
+    return times.fillna(-1).to_numpy().astype(np.int64)
+
+
+def snap_to_samples(times_ns, index):
+    """
+    Returns the times (epoch nanoseconds) moved to the first sample at or after them of the file that
+    covers them. Times outside of the files (gaps, edges of the archive) are returned unchanged.
+    """
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    first = np.minimum(np.searchsorted(index.end_ns, times_ns, side='right'), len(index) - 1)
+    start_ns, dt_ns = index.start_ns[first], index.dt[first] * 1e9
+    inside = (times_ns > start_ns) & (times_ns < index.end_ns[first])
+    # Offsets relative to the file start, to keep the nanosecond arithmetic exact
+    offsets = np.round(np.ceil((times_ns - start_ns) / dt_ns - 1e-6) * dt_ns).astype(np.int64)
+    return np.where(inside, start_ns + offsets, times_ns)
+
+
+def plan_reads(times_ns, index, before, after):
+    """
+    Plans the reads of the windows [t - before, t + after) of all events.
+
+    Returns (n_window, reads, n_covered), where reads maps a file index to the pieces read from it as
+    (event, row_start, row_end, window_start), and n_covered is the number of window rows covered by files.
+    """
+    dt_ns = float(index.dt[0]) * 1e9
+    n_window = int(round((before + after) * 1e9 / dt_ns))
+    start_ns, end_ns = index.start_ns, index.end_ns
+
+    reads = defaultdict(list)
+    n_covered = np.zeros(len(times_ns), dtype=np.int64)
+    window_starts = snap_to_samples(np.asarray(times_ns, dtype=np.int64) - int(round(before * 1e9)), index)
+    for k, t in enumerate(times_ns):
+        if t < 0:
+            continue
+        t0 = int(window_starts[k])
+        first = int(np.searchsorted(end_ns, t0, side='right'))
+        t1 = t0 + int(round(n_window * dt_ns))
+        last = int(np.searchsorted(start_ns, t1, side='left')) - 1
+        for i in range(first, last + 1):
+            # Offsets relative to the file start, to keep the nanosecond arithmetic exact
+            offset = int(t0 - start_ns[i])
+            row_start = max(0, int(np.ceil(offset / dt_ns - 1e-6)))
+            row_end = min(int(index.n_samples[i]), int(np.ceil((t1 - t0 + offset) / dt_ns - 1e-6)))
+            window_start = int(round(row_start - offset / dt_ns))
+            row_end = min(row_end, row_start + n_window - window_start)
+            if row_end > row_start:
+                reads[i].append((k, row_start, row_end, window_start))
+                n_covered[k] += row_end - row_start
+    return n_window, reads, n_covered
+
+
+def read_pieces(file_path, pieces, channels):
+    """
+    Reads the union of the rows needed by all pieces of one file once, and returns the pieces
+    as (event, window_start, data).
+    """
+    row_min = min(row_start for _, row_start, _, _ in pieces)
+    row_max = max(row_end for _, _, row_end, _ in pieces)
+    with open_acoustic(file_path) as dataset:
+        block = np.asarray(dataset[row_min:row_max, channels])
+    return [(k, window_start, block[row_start - row_min:row_end - row_min])
+            for k, row_start, row_end, window_start in pieces]
+
+
+def create_output(output, n_events, n_window, channel_numbers, dtype, events, attrs):
+    """
+    Creates the stacked output array and writes the per-event metadata. Returns (windows, handle to close).
+    """
+    shape = (n_events, n_window, len(channel_numbers))
+    if output.endswith('.npy'):
+        windows = np.lib.format.open_memmap(output, mode='w+', dtype=dtype, shape=shape)
+        events.to_csv(output + '.csv', index=False)
+        return windows, None
+
+    f = h5py.File(output, 'w')
+    windows = f.create_dataset('windows', shape=shape, dtype=dtype, fillvalue=0)
+    f.create_dataset('channels', data=channel_numbers)
+    for key, value in attrs.items():
+        windows.attrs[key] = value
+    group = f.create_group('events')
+    for column in events.columns:
+        values = events[column]
+        name = normalize_name(column).replace('/', '_')
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            dataset = group.create_dataset(name, data=values.to_numpy())
+        else:
+            # Missing values are written as 'nan' (with pandas 3, astype(str) keeps them as NaN)
+            dataset = group.create_dataset(name, data=values.to_numpy(dtype=object).astype(str).astype(object),
+                                           dtype=h5py.string_dtype())
+        dataset.attrs['column'] = column
+    return windows, f
+
+
+def extract_windows(catalogs, source_dir, output, before, after, channels=None, workers=1, index_path=None):
+    """
+    Extracts the windows [t - before, t + after) around all events of the catalogs into one stacked output.
+    See the module docstring for the output format.
+    """
+    index = ArchiveIndex.open(source_dir, index_path)
+    events = load_catalogs(catalogs)
+    times_ns = event_times(events, index)
+
+    n_window, reads, n_covered = plan_reads(times_ns, index, before, after)
+    channels = channels if channels is not None else slice(None)
+    channel_numbers = np.arange(int(index.n_channels[0]))[channels]
+    with h5py.File(os.path.join(source_dir, index.filenames[0]), 'r') as f:
+        dtype = f['Acoustic'].dtype
+
+    events['time_ns'] = times_ns
+    events['complete'] = n_covered == n_window
+    attrs = {'before(seconds)': before, 'after(seconds)': after,
+             'TimeSamplingInterval(seconds)': float(index.dt[0])}
+    windows, handle = create_output(output, len(events), n_window, channel_numbers, dtype, events, attrs)
+
+    logging.info(f"Extracting {len(events)} windows of {n_window} samples from {len(reads)} files...")
+
+    # Keep a bounded number of files in flight, so that memory stays bounded for large catalogs
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        tasks = iter(sorted(reads.items()))
+        done_files = 0
+        while True:
+            while len(pending) < 2 * workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                i, pieces = task
+                pending.add(executor.submit(read_pieces, os.path.join(source_dir, index.filenames[i]), pieces, channels))
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for k, window_start, data in future.result():
+                    windows[k, window_start:window_start + data.shape[0]] = data
+                done_files += 1
+            logging.info(f"Read {done_files}/{len(reads)} files")
+
+    if handle is not None:
+        handle.close()
+    else:
+        windows.flush()
+
+    logging.info(f"Finished extracting windows into {output} ({int(events['complete'].sum())}/{len(events)} complete)")
+    return events
+
+
+def parse_channels(text):
+    # "start:stop[:step]" -> slice
+    return slice(*[int(part) if part else None for part in text.split(':')])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract DAS windows around catalog events into one stacked file.")
+    parser.add_argument('--catalogs', type=str, nargs='+', required=True,
+                        help='Catalog CSV files, or directories containing FORGE*.csv catalogs')
+    parser.add_argument('--source_dir', type=str, required=True, help='Directory containing the DAS HDF5 files')
+    parser.add_argument('--output', type=str, required=True, help='Output file (.h5 or .npy)')
+    parser.add_argument('--before', type=float, default=0.5, help='Window length before the event time in seconds')
+    parser.add_argument('--after', type=float, default=1.5, help='Window length after the event time in seconds')
+    parser.add_argument('--channels', type=str, default=None, help="Channel range and stride, e.g. '0:1496:2'")
+    parser.add_argument('--workers', type=int, default=1, help='Number of reader processes')
+    parser.add_argument('--index', type=str, default=None, help='Path of the archive index of source_dir')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    channels = parse_channels(args.channels) if args.channels else None
+    extract_windows(args.catalogs, args.source_dir, args.output, args.before, args.after, channels,
+                    args.workers, args.index)
+
+
+if __name__ == "__main__":
+    main()
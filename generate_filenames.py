@@ -8,20 +8,22 @@ The filenames are expected to be in the format:
 The script saves the list of filenames sorted chronologically to a pickle file for later use.
 Key use is the downsample.py script, which uses this list to process the files in the correct order.
 
+The sorted list is taken from the persistent archive index of the directory (see archive_index.py),
+which is built once and then refreshed incrementally, instead of listing and parsing every filename.
+
 Author: Danilo Dordevic
 Last Updated: August 2025
 """
 
-import os
 import pickle
-from datetime import datetime
-from utils import timestamp2datetime, timestampFromFilename
+from archive_index import ArchiveIndex
 
 
 source_dir = "/lab_downsize/v1.0.0"
 filenames = "/scratch/ddordevic/FORGE/filenames_FORGE.pkl"
+index_path = "/scratch/ddordevic/FORGE/archive_index_FORGE.npz"
 
-files = [f for f in os.listdir(source_dir) if f.endswith('.h5') and f.startswith('16B')]
-files = sorted(files, key=lambda f: timestamp2datetime(timestampFromFilename(f)))
+index = ArchiveIndex.open(source_dir, index_path)
+files = [f for f in index.filenames.tolist() if f.startswith('16B')]
 with open(filenames, "wb") as f:
     pickle.dump(files, f)
@@ -0,0 +1,285 @@
+"""
+Streaming Spectral Statistics of the FORGE DAS Archive
+
+This script computes archive-wide spectral statistics over an arbitrary time range: per-channel Welch
+power spectral densities and frequency-wavenumber (FK) spectra, accumulated over fixed-size blocks of
+data streamed from the files, in a process pool. It characterizes the noise of days of recordings and
+checks the anti-aliasing of downsampled products (the PSD close to the Nyquist frequency), without
+loading whole files into memory at once.
+
+Algorithm Overview:
+    1. Find the files of the time range with the archive index, and cut every run of contiguous files into
+       blocks of `block` samples (blocks continue across file boundaries, and restart after gaps between
+       files; the samples at the end of a run that do not fill a block are skipped)
+    2. Split the blocks into contiguous shards, one per worker, and stream every shard block by block, so
+       that the blocks, and the statistics, do not depend on the number of workers
+    3. For every block, compute the Welch PSD of every channel (segments of `nperseg` samples) and the
+       FK power of every segment (Hann tapers in time and space, rfft in time, fft along the channels)
+    4. Accumulate running sums of the PSD and FK power, and histograms of the PSD in dB for the
+       percentiles; the accumulators of the workers are merged at the end
+
+Output Format (.npz):
+    - 'frequencies' (Hz), 'wavenumbers' (cycles per meter), 'channels' (channel numbers)
+    - 'psd_mean' [channel, frequency]: mean Welch PSD over all blocks
+    - 'psd_percentiles' [channel group, percentile, frequency]: PSD percentiles in dB over all blocks and
+      the channels of a group ('channel_groups' holds the first channel index of every group)
+    - 'percentiles', 'fk_mean' [frequency, wavenumber]: mean FK power (wavenumbers centered)
+    - 'n_blocks', 'start_ns', 'end_ns', 'fs', 'dx' (channel spacing of the selected channels)
+
+Command Line Usage:
+    python spectral_stats.py --source_dir /path/to/das/files \
+                             --start_time 20240408T000000 --end_time 20240409T000000 \
+                             --output spectra_20240408.npz --channels 0:1496:2 --workers 8
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import time
+import argparse
+import logging
+import numpy as np
+from scipy import fft
+from scipy.signal import welch, get_window
+from concurrent.futures import ProcessPoolExecutor
+from archive_index import ArchiveIndex, to_epoch_ns
+from das_io import open_acoustic
+from extract_windows import parse_channels
+
+CHANNEL_SPACING = 1.021095  # meters
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class SpectralAccumulator:
+    """
+    Running sums of the Welch PSD and FK power of blocks of [time, channel] data, and histograms of the
+    PSD in dB per channel group, which can be merged across processes.
+    """
+
+    def __init__(self, n_channels, fs, nperseg=1024, channel_groups=16, db_range=(-150.0, 50.0), db_step=0.5):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.n_channels = n_channels
+        self.n_frequencies = nperseg // 2 + 1
+        self.db_edges = np.arange(db_range[0], db_range[1] + db_step / 2, db_step)
+        self.group_starts = np.unique(np.linspace(0, n_channels, channel_groups, endpoint=False).astype(np.int64))
+        self.channel_group = np.searchsorted(self.group_starts, np.arange(n_channels), side='right') - 1
+
+        self.n_blocks = 0
+        self.psd_sum = np.zeros((n_channels, self.n_frequencies))
+        self.fk_sum = np.zeros((self.n_frequencies, n_channels))
+        self.n_segments = 0
+        self.histogram = np.zeros((len(self.group_starts), self.n_frequencies, len(self.db_edges) - 1), dtype=np.int64)
+        self.taper = np.outer(get_window('hann', nperseg), get_window('hann', n_channels)).astype(np.float32)
+
+    def update(self, block):
+        """
+        Adds a block [time, channel] of at least nperseg samples.
+        """
+        frequencies, psd = welch(block, fs=self.fs, nperseg=self.nperseg, axis=0)
+        self.psd_sum += psd.T
+        self.n_blocks += 1
+
+        # Histogram of the PSD in dB, per (channel group, frequency), with values outside the range in the edge bins
+        psd_db = 10 * np.log10(np.maximum(psd, 1e-300))
+        bins = np.clip(np.searchsorted(self.db_edges, psd_db, side='right') - 1, 0, len(self.db_edges) - 2)
+        cells = (self.channel_group[None, :] * self.n_frequencies + np.arange(self.n_frequencies)[:, None]) \
+            * (len(self.db_edges) - 1) + bins
+        self.histogram += np.bincount(cells.ravel(), minlength=self.histogram.size).reshape(self.histogram.shape)
+
+        # FK power of the non-overlapping segments of the block
+        for s0 in range(0, block.shape[0] - self.nperseg + 1, self.nperseg):
+            segment = block[s0:s0 + self.nperseg].astype(np.float32) * self.taper
+            spectrum = fft.fft(fft.rfft(segment, axis=0), axis=1)
+            self.fk_sum += np.abs(spectrum) ** 2
+            self.n_segments += 1
+
+    def merge(self, other):
+        self.n_blocks += other.n_blocks
+        self.n_segments += other.n_segments
+        self.psd_sum += other.psd_sum
+        self.fk_sum += other.fk_sum
+        self.histogram += other.histogram
+        return self
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """
+        Returns the PSD percentiles in dB [channel group, percentile, frequency], interpolated within the histogram bins.
+        """
+        cumulative = np.cumsum(self.histogram, axis=-1)
+        total = np.maximum(cumulative[..., -1:], 1)
+        result = np.empty((len(self.group_starts), len(percentiles), self.n_frequencies))
+        for j, q in enumerate(percentiles):
+            target = q / 100 * total
+            b = np.minimum((cumulative < target).sum(axis=-1), len(self.db_edges) - 2)
+            below = np.take_along_axis(cumulative, b[..., None], -1)[..., 0] - \
+                np.take_along_axis(self.histogram, b[..., None], -1)[..., 0]
+            count = np.maximum(np.take_along_axis(self.histogram, b[..., None], -1)[..., 0], 1)
+            fraction = np.clip((target[..., 0] - below) / count, 0, 1)
+            result[:, j] = self.db_edges[b] + fraction * (self.db_edges[1] - self.db_edges[0])
+        return result
+
+    def summary(self, percentiles=PERCENTILES, dx=CHANNEL_SPACING):
+        """
+        Returns the summary arrays (see the module docstring) as a dict.
+        """
+        return {'frequencies': np.fft.rfftfreq(self.nperseg, 1 / self.fs),
+                'wavenumbers': np.fft.fftshift(np.fft.fftfreq(self.n_channels, dx)),
+                'psd_mean': self.psd_sum / max(self.n_blocks, 1),
+                'psd_percentiles': self.percentiles(percentiles),
+                'percentiles': np.array(percentiles),
+                'channel_groups': self.group_starts,
+                'fk_mean': np.fft.fftshift(self.fk_sum / max(self.n_segments, 1), axes=1),
+                'n_blocks': self.n_blocks}
+
+
+def row_ranges(index, first, last, start_ns, end_ns):
+    """
+    Returns (file index, row_start, row_end) of the rows of files first..last within [start_ns, end_ns).
+    """
+    ranges = []
+    for i in range(first, last + 1):
+        dt_ns = index.dt[i] * 1e9
+        row_start = max(0, int(np.ceil((start_ns - index.start_ns[i]) / dt_ns - 1e-6)))
+        row_end = min(int(index.n_samples[i]), int(np.ceil((end_ns - index.start_ns[i]) / dt_ns - 1e-6)))
+        if row_end > row_start:
+            ranges.append((i, row_start, row_end))
+    return ranges
+
+
+def block_shards(ranges, contiguous, block, n_shards):
+    """
+    Cuts the row ranges into blocks of `block` samples (see the module docstring), and splits the blocks into
+    n_shards shards. Returns the (ranges, contiguous) of every shard, in the format of process_shard.
+    """
+    blocks = []
+    pieces, n_pieces = [], 0
+    for (i, row_start, row_end), continues in zip(ranges, contiguous):
+        if not continues:
+            pieces, n_pieces = [], 0
+        row = row_start
+        while row < row_end:
+            row_stop = min(row_end, row + block - n_pieces)
+            pieces.append((i, row, row_stop))
+            n_pieces += row_stop - row
+            row = row_stop
+            if n_pieces == block:
+                blocks.append(pieces)
+                pieces, n_pieces = [], 0
+
+    shards = []
+    bounds = [round(k * len(blocks) / n_shards) for k in range(n_shards + 1)]
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        shard_ranges, shard_contiguous = [], []
+        for pieces in blocks[a:b]:
+            for j, (i, row_start, row_end) in enumerate(pieces):
+                if shard_ranges and shard_ranges[-1][0] == i and shard_ranges[-1][2] == row_start:
+                    shard_ranges[-1] = (i, shard_ranges[-1][1], row_end)  # consecutive blocks of the same file
+                else:
+                    shard_ranges.append((i, row_start, row_end))
+                    shard_contiguous.append(j > 0)
+        shards.append((shard_ranges, shard_contiguous))
+    return shards
+
+
+def process_shard(source_dir, filenames, ranges, contiguous, channels, n_channels, fs, block, accumulator_options):
+    """
+    Streams the row ranges of a shard of files in blocks of `block` samples into a SpectralAccumulator,
+    reading at most one block at a time. The samples of an unfinished block are carried into the next range.
+    contiguous[j] tells whether ranges[j] directly continues ranges[j - 1]; otherwise the pending samples are dropped.
+    """
+    accumulator = SpectralAccumulator(n_channels, fs, **accumulator_options)
+    pending = []
+    n_pending = 0
+    for (i, row_start, row_end), continues in zip(ranges, contiguous):
+        if not continues:
+            pending, n_pending = [], 0
+        with open_acoustic(os.path.join(source_dir, filenames[i])) as dataset:
+            row = row_start
+            while row < row_end:
+                row_stop = min(row_end, row + block - n_pending)
+                pending.append(np.asarray(dataset[row:row_stop, channels]))
+                n_pending += row_stop - row
+                row = row_stop
+                if n_pending == block:
+                    accumulator.update(np.concatenate(pending, axis=0) if len(pending) > 1 else pending[0])
+                    pending, n_pending = [], 0
+    return accumulator
+
+
+def spectral_stats(source_dir, start_time, end_time, output, channels=None, block=8192, nperseg=1024,
+                   channel_groups=16, db_range=(-150.0, 50.0), percentiles=PERCENTILES, dx=CHANNEL_SPACING,
+                   workers=1, index_path=None):
+    """
+    Computes the spectral statistics of the recordings within [start_time, end_time) and writes them to
+    output (.npz, see the module docstring). Returns the summary dict.
+    """
+    index = ArchiveIndex.open(source_dir, index_path)
+    start_ns, end_ns = int(to_epoch_ns(start_time)), int(to_epoch_ns(end_time))
+    first, last = index.files_between(start_ns, end_ns)
+    ranges = row_ranges(index, first, last, start_ns, end_ns)
+    if not ranges:
+        raise ValueError(f"No DAS files in {source_dir} cover {start_time} - {end_time}")
+
+    channels = channels if channels is not None else slice(None)
+    channel_numbers = np.arange(int(index.n_channels[first]))[channels]
+    fs = 1 / float(index.dt[first])
+    dx = dx * (channels.step or 1)
+    if block < nperseg:
+        raise ValueError("block must be at least nperseg samples")
+
+    # A range continues the previous one if it starts where the previous one ends, without a gap
+    contiguous = [False]
+    for (i, row_start, _), (j, _, row_end) in zip(ranges[1:], ranges[:-1]):
+        gap = index.start_ns[i] + row_start * index.dt[i] * 1e9 - (index.start_ns[j] + row_end * index.dt[j] * 1e9)
+        contiguous.append(abs(gap) < index.dt[i] * 1e9 / 2)
+
+    shards = [shard for shard in block_shards(ranges, contiguous, block, max(1, workers)) if shard[0]] or [([], [])]
+    options = {'nperseg': nperseg, 'channel_groups': channel_groups, 'db_range': db_range}
+
+    logging.info(f"Computing spectral statistics of {len(ranges)} files in {len(shards)} shards...")
+    start = time.time()
+    accumulator = None
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(process_shard, source_dir, index.filenames, shard_ranges, shard_contiguous,
+                                   channels, len(channel_numbers), fs, block, options)
+                   for shard_ranges, shard_contiguous in shards]
+        for future in futures:
+            result = future.result()
+            accumulator = result if accumulator is None else accumulator.merge(result)
+
+    summary = accumulator.summary(percentiles, dx)
+    summary.update({'channels': channel_numbers, 'start_ns': start_ns, 'end_ns': end_ns, 'fs': fs, 'dx': dx})
+    np.savez(output, **summary)
+    logging.info(f"Finished {accumulator.n_blocks} blocks in {time.time() - start:.2f} s | {output}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute Welch PSD and FK statistics over a time range of the DAS archive.")
+    parser.add_argument('--source_dir', type=str, required=True, help='Directory containing the DAS HDF5 files')
+    parser.add_argument('--start_time', type=str, required=True, help='Start time (UTC), e.g. 20240408T154300')
+    parser.add_argument('--end_time', type=str, required=True, help='End time (UTC, exclusive)')
+    parser.add_argument('--output', type=str, required=True, help='Output file (.npz)')
+    parser.add_argument('--channels', type=str, default=None, help="Channel range and stride, e.g. '0:1496:2'")
+    parser.add_argument('--block', type=int, default=8192, help='Number of samples per block')
+    parser.add_argument('--nperseg', type=int, default=1024, help='Welch and FK segment length in samples')
+    parser.add_argument('--channel_groups', type=int, default=16, help='Number of channel groups for the PSD percentiles')
+    parser.add_argument('--db_range', type=str, default='-150,50', help='Range of the PSD histograms in dB, e.g. -150,50')
+    parser.add_argument('--percentiles', type=str, default=','.join(map(str, PERCENTILES)), help='PSD percentiles, e.g. 5,50,95')
+    parser.add_argument('--dx', type=float, default=CHANNEL_SPACING, help='Channel spacing in meters (multiplied by the channel stride)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes')
+    parser.add_argument('--index', type=str, default=None, help='Path of the archive index of source_dir')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    channels = parse_channels(args.channels) if args.channels else None
+    spectral_stats(args.source_dir, args.start_time, args.end_time, args.output, channels, args.block, args.nperseg,
+                   args.channel_groups, tuple(float(v) for v in args.db_range.split(',')),
+                   tuple(float(q) for q in args.percentiles.split(',')), args.dx, args.workers, args.index)
+
+
+if __name__ == "__main__":
+    main()
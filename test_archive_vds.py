@@ -0,0 +1,68 @@
+import os
+import h5py
+import numpy as np
+import pytest
+from datetime import timedelta
+
+from archive_vds import ArchiveVDS, build_vds
+from synthetic_forge import FIRST_SEQNO, START_TIME
+
+
+def read_archive(source_dir, filenames, channels=slice(None)):
+    data = []
+    for filename in filenames:
+        with h5py.File(os.path.join(source_dir, filename), 'r') as f:
+            data.append(f['Acoustic'][:, channels])
+    return np.concatenate(data)
+
+
+def test_slice_across_file_boundary(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=3)
+    vds_path = str(tmp_path / 'archive_vds.h5')
+    assert build_vds(source_dir, vds_path)
+    assert not build_vds(source_dir, vds_path)
+
+    with ArchiveVDS(vds_path) as vds:
+        # 0.7 s - 1.2 s: rows 700-999 of the first file and 0-200 of the second (the end time is inclusive)
+        data, times, channel_numbers = vds.slice(START_TIME + timedelta(seconds=0.7),
+                                                 START_TIME + timedelta(seconds=1.2), channels=slice(1, None, 3))
+    np.testing.assert_array_equal(data, read_archive(source_dir, filenames, slice(1, None, 3))[700:1201])
+    np.testing.assert_array_equal(channel_numbers, [1, 4, 7])
+    assert times[0] == np.datetime64(START_TIME + timedelta(seconds=0.7))
+    assert np.all(np.diff(times) == np.timedelta64(1, 'ms'))
+
+
+def test_slice_after_update_with_gap(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=2)
+    vds_path = str(tmp_path / 'archive_vds.h5')
+    build_vds(source_dir, vds_path)
+    # Two more files after a 3 s gap
+    _, new_filenames = make_archive(n_files=2, start_time=START_TIME + timedelta(seconds=5),
+                                    first_seqno=FIRST_SEQNO + 5, seed=5)
+    assert build_vds(source_dir, vds_path)
+
+    start_time, end_time = START_TIME + timedelta(seconds=1.5), START_TIME + timedelta(seconds=5.5)
+    with ArchiveVDS(vds_path) as vds:
+        assert vds.dataset.shape == (4000, 8)
+        data, times, _ = vds.slice(start_time, end_time)
+    np.testing.assert_array_equal(data, read_archive(source_dir, filenames + new_filenames)[1500:2501])
+    assert times[499] == np.datetime64(START_TIME + timedelta(seconds=1.999))
+    assert times[500] == np.datetime64(START_TIME + timedelta(seconds=5))
+
+
+@pytest.mark.parametrize('seconds', [(0.7, 1.2), (0.0, 2.999), (1.5, 5.5)])
+def test_slice_matches_read_das_segment(make_archive, tmp_path, seconds):
+    pytest.importorskip('dascore')
+    from utils import read_das_segment
+
+    source_dir, _ = make_archive(n_files=3)
+    make_archive(n_files=2, start_time=START_TIME + timedelta(seconds=5), first_seqno=FIRST_SEQNO + 5, seed=5)
+    vds_path = str(tmp_path / 'archive_vds.h5')
+    build_vds(source_dir, vds_path)
+
+    start_time, end_time = (START_TIME + timedelta(seconds=s) for s in seconds)
+    with ArchiveVDS(vds_path) as vds:
+        data, times, channel_numbers = vds.slice(start_time, end_time, channels=slice(2, 6))
+    expected = read_das_segment(start_time, end_time, source_dir, channels=slice(2, 6))
+    for value, expected_value in zip((data, times, channel_numbers), expected):
+        np.testing.assert_array_equal(value, expected_value)
@@ -0,0 +1,70 @@
+import os
+import h5py
+import numpy as np
+import pytest
+from datetime import timedelta
+
+from block_cache import BlockCache
+from synthetic_forge import START_TIME
+
+
+def read_rows(file_path, row_start, row_end, channels=slice(None)):
+    with h5py.File(file_path, 'r') as f:
+        return f['Acoustic'][row_start:row_end, channels]
+
+
+def test_read_counts_aligned_blocks(make_archive):
+    source_dir, filenames = make_archive(n_files=1)
+    file_path = os.path.join(source_dir, filenames[0])
+    cache = BlockCache(block_rows=300)
+
+    # Rows 250-700 span the blocks [0, 300), [300, 600) and [600, 900)
+    channels = slice(2, 6)
+    np.testing.assert_array_equal(cache.read(file_path, 250, 700, channels), read_rows(file_path, 250, 700, channels))
+    assert (cache.hits, cache.misses, len(cache)) == (0, 3, 3)
+
+    # Overlapping rows are served from the cached blocks, and only the last block is read
+    np.testing.assert_array_equal(cache.read(file_path, 100, 1000, channels), read_rows(file_path, 100, 1000, channels))
+    assert (cache.hits, cache.misses, len(cache)) == (3, 4, 4)
+
+    # Other channels are other blocks
+    np.testing.assert_array_equal(cache.read(file_path, 0, 10), read_rows(file_path, 0, 10))
+    assert (cache.hits, cache.misses) == (3, 5)
+    with pytest.raises(ValueError):
+        cache.read(file_path, 0, 10)[0, 0] = 1.0
+
+
+def test_evicted_blocks_are_spilled(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=1)
+    file_path = os.path.join(source_dir, filenames[0])
+    # Room for two blocks of 300 rows x 8 float32 channels
+    cache = BlockCache(max_bytes=2 * 300 * 8 * 4, block_rows=300, spill_dir=str(tmp_path / 'spill'))
+
+    expected = read_rows(file_path, 0, 1000)
+    np.testing.assert_array_equal(cache.read(file_path, 0, 1000), expected)
+    assert cache.stats()['evictions'] == 2 and cache.stats()['spilled_blocks'] == 2
+    # Every block of the second read comes from memory or the spill directory, none from the file
+    np.testing.assert_array_equal(cache.read(file_path, 0, 1000), expected)
+    assert cache.spill_hits == 4 and cache.misses == 4
+
+
+def test_read_das_segment_with_cache(make_archive):
+    pytest.importorskip('dascore')
+    from utils import read_das_segment
+
+    source_dir, filenames = make_archive(n_files=3)
+    cache = BlockCache(block_rows=300)
+    start_time, end_time = START_TIME + timedelta(seconds=0.75), START_TIME + timedelta(seconds=2.1)
+
+    expected, expected_times, expected_channels = read_das_segment(start_time, end_time, source_dir,
+                                                                   channels=slice(1, 7))
+    assert expected.shape == (1351, 6)
+    for n_misses in (7, 7):  # the second read is served from the cache
+        data, times, channel_numbers = read_das_segment(start_time, end_time, source_dir, channels=slice(1, 7),
+                                                        cache=cache)
+        np.testing.assert_array_equal(data, expected)
+        np.testing.assert_array_equal(times, expected_times)
+        np.testing.assert_array_equal(channel_numbers, expected_channels)
+        assert cache.misses == n_misses
+    # Blocks [600, 900) and [900, 1000) of the first file, all four of the second, [0, 300) of the third
+    assert cache.hits == 7
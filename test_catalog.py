@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog
+from catalog import load_catalogs, query_catalog
+
+
+def write_catalogs(csv_dir):
+    """
+    Writes two padded catalogs of well 16B: 'Stage' is numeric in the first and text in the second,
+    and 'Matched File' has missing values.
+    """
+    csv_dir.mkdir()
+    pd.DataFrame({'Source': [147, 148],
+                  ' Trig Date ': [' 08/04/2024', ' 08/04/2024'],
+                  '    Trig Time   ': [' 09:43:00.250000 ', ' 09:43:01.500000 '],
+                  ' Origin Date ': [' 08/04/2024', ' 08/04/2024'],
+                  '   Origin Time  ': [' 09:43:00.200000 ', ' 09:43:01.450000 '],
+                  ' Stage': [7, 7],
+                  ' MomMag': [-0.5, 0.25],
+                  'Matched File': ['16B_StrainRate_20240408T154300+0000_44000.h5', None]}) \
+        .to_csv(csv_dir / 'FORGE16bApril24NetworkStage 7.csv', index=False)
+    pd.DataFrame({'Source': [149],
+                  ' Trig Date ': [' 09/04/2024'],
+                  '    Trig Time   ': ['bad time'],
+                  ' Origin Date ': [' 09/04/2024'],
+                  '   Origin Time  ': [' 10:00:00.000000 '],
+                  ' Stage': ['7b'],
+                  ' MomMag': [1.0],
+                  'Matched File': [None]}) \
+        .to_csv(csv_dir / 'FORGE16bApril24NetworkStage 7b.csv', index=False)
+
+
+def test_cached_table_equals_parsed_table(tmp_path, monkeypatch):
+    csv_dir = tmp_path / 'catalogs'
+    write_catalogs(csv_dir)
+    parsed = load_catalogs([str(csv_dir)], cache_path=False)
+    assert parsed['Stage'].tolist() == ['7', '7', '7b']
+    assert parsed['Trigger_UTC'].iloc[0] == pd.Timestamp('2024-04-08T15:43:00.25')
+    assert parsed['Trigger_UTC'].isna().tolist() == [False, False, True]
+    assert parsed['Catalog_Stage'].tolist() == ['Stage 7', 'Stage 7', 'Stage 7b']
+
+    pd.testing.assert_frame_equal(load_catalogs([str(csv_dir)]), parsed)
+
+    def fail(csv_path):
+        raise AssertionError(f"{csv_path} parsed again")
+
+    monkeypatch.setattr(catalog, 'parse_catalog', fail)
+    cached = load_catalogs([str(csv_dir)])
+    pd.testing.assert_frame_equal(cached, parsed)
+    pd.testing.assert_frame_equal(query_catalog(cached, stages='Stage 7', min_magnitude=0),
+                                  query_catalog(parsed, stages='Stage 7', min_magnitude=0))
+
+    # A modified catalog is parsed again
+    with pytest.raises(AssertionError, match='parsed again'):
+        (csv_dir / 'FORGE16bApril24NetworkStage 7b.csv').write_text('Source\n150\n')
+        load_catalogs([str(csv_dir)])
@@ -0,0 +1,66 @@
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import timedelta
+
+from catalog import UTC_OFFSET
+from extract_windows import extract_windows
+from synthetic_forge import FIRST_SEQNO, START_TIME
+
+# Event times in ms after START_TIME: inside a file, across a file boundary, across the start of the archive,
+# into and out of the gap between 3 s and 5 s, across the end of the archive
+EVENT_MS = [750, 1050, 30, 2950, 5050, 6900]
+
+
+def write_catalog(csv_path, event_ms):
+    local_time = pd.to_datetime([START_TIME + timedelta(milliseconds=ms) for ms in event_ms]) - UTC_OFFSET
+    df = pd.DataFrame({'Source': np.arange(len(event_ms)),
+                       ' Trig Date ': local_time.strftime('%d/%m/%Y'),
+                       '    Trig Time   ': local_time.strftime('%H:%M:%S.%f'),
+                       ' MomMag': np.linspace(-1, 1, len(event_ms))})
+    # An event without a trigger time
+    df.loc[len(df)] = [len(df), '', '', 0.0]
+    df.to_csv(csv_path, index=False)
+
+
+def read_stream(source_dir, filenames, padding=1000):
+    """
+    Returns the archive as one array with a row per ms after START_TIME - padding ms, zero where no file covers it.
+    """
+    stream = np.zeros((padding + 8000, 8), dtype=np.float32)
+    for filename, start_ms in zip(filenames, (0, 1000, 2000, 5000, 6000)):
+        with h5py.File(f'{source_dir}/{filename}', 'r') as f:
+            stream[padding + start_ms:padding + start_ms + 1000] = f['Acoustic'][...]
+    return stream
+
+
+@pytest.mark.parametrize('output', ['windows.h5', 'windows.npy'])
+def test_windows_match_archive_slices(make_archive, tmp_path, output):
+    source_dir, filenames = make_archive(n_files=3)
+    _, new_filenames = make_archive(n_files=2, start_time=START_TIME + timedelta(seconds=5),
+                                    first_seqno=FIRST_SEQNO + 5, seed=5)
+    csv_path = str(tmp_path / 'FORGE16bApril24NetworkStage 1.csv')
+    write_catalog(csv_path, EVENT_MS)
+    output = str(tmp_path / output)
+
+    events = extract_windows([csv_path], source_dir, output, before=0.1, after=0.2, channels=slice(1, None, 2),
+                             workers=2)
+    if output.endswith('.h5'):
+        with h5py.File(output, 'r') as f:
+            windows = f['windows'][...]
+            np.testing.assert_array_equal(f['channels'][...], [1, 3, 5, 7])
+            np.testing.assert_array_equal(f['events/complete'][...], events['complete'])
+            assert f['events/MomMag'].attrs['column'] == ' MomMag'
+            assert f['events/Trig_Date'].asstr()[6] == 'nan'
+    else:
+        windows = np.load(output)
+        np.testing.assert_array_equal(pd.read_csv(output + '.csv')['complete'], events['complete'])
+
+    stream = read_stream(source_dir, filenames + new_filenames)
+    assert windows.shape == (7, 300, 4)
+    for k, ms in enumerate(EVENT_MS):
+        np.testing.assert_array_equal(windows[k], stream[1000 + ms - 100:1000 + ms + 200, 1::2], err_msg=str(ms))
+    assert not windows[6].any()
+    assert events['complete'].tolist() == [True, True, False, False, False, False, False]
+    assert events['time_ns'].iloc[6] == -1
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from datetime import timedelta
+
+from spectral_stats import block_shards, spectral_stats
+from synthetic_forge import FIRST_SEQNO, START_TIME
+
+
+def test_block_shards_cover_the_same_blocks():
+    # Two runs of contiguous files (1000 + 1000 samples, then 500 samples after a gap)
+    ranges = [(0, 0, 1000), (1, 0, 1000), (2, 0, 500)]
+    contiguous = [False, True, False]
+    for n_shards in (1, 2, 3, 5):
+        shards = block_shards(ranges, contiguous, 300, n_shards)
+        pieces = [(i, row) for shard_ranges, _ in shards for i, row_start, row_end in shard_ranges
+                  for row in range(row_start, row_end)]
+        # 6 blocks of the first run (the last 200 samples are skipped), 1 of the second
+        assert pieces == [(0, row) for row in range(1000)] + [(1, row) for row in range(800)] + \
+                         [(2, row) for row in range(300)]
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_statistics_do_not_depend_on_workers(make_archive, tmp_path, workers):
+    source_dir, _ = make_archive(n_files=3)
+    make_archive(n_files=3, start_time=START_TIME + timedelta(seconds=5), first_seqno=FIRST_SEQNO + 5, seed=5)
+    options = dict(block=700, nperseg=128, channel_groups=2, db_range=(-40.0, 40.0))
+
+    reference = spectral_stats(source_dir, '20240408T154300', '20240408T154310', str(tmp_path / 'reference.npz'),
+                               workers=1, **options)
+    summary = spectral_stats(source_dir, '20240408T154300', '20240408T154310', str(tmp_path / 'summary.npz'),
+                             workers=workers, **options)
+    assert reference['n_blocks'] == 2 * (3000 // 700)
+    for key in reference:
+        np.testing.assert_allclose(summary[key], reference[key], rtol=1e-12, err_msg=key)
@@ -0,0 +1,101 @@
+import os
+import json
+import shutil
+import h5py
+import numpy as np
+
+from verify_archive import build_manifest, compare_manifests, load_manifest
+
+
+def write_catalog(path, values):
+    # A blank line after the header, as left by hand edits of the catalogs
+    lines = ['Source, MomMag ,Location', ''] + [f"{k},{value:.4f},\"Stage 1\"" for k, value in enumerate(values)]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def make_manifests(make_archive, tmp_path, change):
+    """
+    Writes the manifest of an archive with a catalog directory, and that of a copy modified by change(copy_dir).
+    """
+    source_dir, filenames = make_archive(n_files=3)
+    csv_dir = tmp_path / 'archive' / 'catalogs'
+    csv_dir.mkdir()
+    write_catalog(csv_dir / 'FORGE16bApril24NetworkStage 1.csv', np.linspace(-1, 1, 25))
+
+    copy_dir = str(tmp_path / 'copy')
+    shutil.copytree(source_dir, copy_dir)
+    change(copy_dir, filenames)
+    manifests = str(tmp_path / 'a.jsonl'), str(tmp_path / 'b.jsonl')
+    build_manifest(manifests[0], source_dir, [str(csv_dir)], block_rows=300, csv_block_rows=10)
+    build_manifest(manifests[1], copy_dir, [os.path.join(copy_dir, 'catalogs')], block_rows=300, csv_block_rows=10)
+    return manifests, filenames
+
+
+def test_build_manifest(make_archive, tmp_path):
+    manifests, filenames = make_manifests(make_archive, tmp_path, lambda copy_dir, filenames: None)
+    header, records = load_manifest(manifests[0])
+    assert header['block_rows'] == 300 and header['csv_block_rows'] == 10
+    assert sorted(records) == filenames + ['catalogs/FORGE16bApril24NetworkStage 1.csv']
+
+    record = records[filenames[0]]
+    assert record['shape'] == [1000, 8] and len(record['blocks']) == 4
+    assert record['attrs']['InterrogationRate(Hz)'] == 1000.0
+    catalog = records['catalogs/FORGE16bApril24NetworkStage 1.csv']
+    assert catalog['columns'] == ['Source', 'MomMag', 'Location'] and catalog['rows'] == 26
+    assert len(catalog['blocks']) == 3
+
+    # Identical copies have identical hashes
+    assert compare_manifests(*manifests).empty
+
+
+def test_build_manifest_reuses_unchanged_records(make_archive, tmp_path):
+    source_dir, filenames = make_archive(n_files=3)
+    manifest = str(tmp_path / 'manifest.jsonl')
+    build_manifest(manifest, source_dir, block_rows=300)
+
+    # Tamper with a hash in the manifest: an unchanged file keeps its (tampered) record...
+    with open(manifest) as f:
+        lines = f.readlines()
+    record = json.loads(lines[1])
+    record['blocks'][0] = 'tampered'
+    lines[1] = json.dumps(record) + '\n'
+    with open(manifest, 'w') as f:
+        f.writelines(lines)
+    assert build_manifest(manifest, source_dir, block_rows=300)[record['file']]['blocks'][0] == 'tampered'
+
+    # ...while a modified file, a different block size or refresh hash it again
+    with h5py.File(os.path.join(source_dir, filenames[1]), 'r+') as f:
+        f['Acoustic'][0, 0] += 1
+    records = build_manifest(manifest, source_dir, block_rows=300)
+    assert records[filenames[0]]['blocks'][0] == 'tampered'
+    _, previous = load_manifest(manifest)
+    assert records[filenames[1]] == previous[filenames[1]]
+    assert build_manifest(manifest, source_dir, block_rows=500)[filenames[0]]['block_rows'] == 500
+    assert build_manifest(manifest, source_dir, block_rows=300, refresh=True)[filenames[0]]['blocks'][0] != 'tampered'
+
+
+def test_compare_manifests(make_archive, tmp_path):
+    def change(copy_dir, filenames):
+        with h5py.File(os.path.join(copy_dir, filenames[0]), 'r+') as f:
+            f['Acoustic'][650, 3] *= 1 + 1e-6  # block 2, within the tolerance
+        with h5py.File(os.path.join(copy_dir, filenames[1]), 'r+') as f:
+            f['Acoustic'][10, 0] += 1.0
+        os.remove(os.path.join(copy_dir, filenames[2]))
+        # First line of block 1, but row 9 of a DataFrame without the blank line (block 0 when split by rows)
+        values = np.linspace(-1, 1, 25)
+        values[9] += 0.5
+        write_catalog(os.path.join(copy_dir, 'catalogs', 'FORGE16bApril24NetworkStage 1.csv'), values)
+
+    manifests, filenames = make_manifests(make_archive, tmp_path, change)
+    differences = compare_manifests(*manifests, rtol=1e-5).set_index('file')
+    assert differences.loc[filenames[0], 'status'] == 'within_tolerance'
+    assert differences.loc[filenames[0], 'details'].startswith('1/4 blocks differ, first at row 600')
+    assert differences.loc[filenames[1], 'status'] == 'blocks_different'
+    assert differences.loc[filenames[1], 'max_abs_diff'] == 1.0
+    assert differences.loc[filenames[2], 'status'] == 'missing_in_b'
+
+    catalog = differences.loc['catalogs/FORGE16bApril24NetworkStage 1.csv']
+    assert catalog['status'] == 'blocks_different' and catalog['blocks'] == 1
+    assert np.isclose(catalog['max_abs_diff'], 0.5)
+    assert compare_manifests(*manifests, numeric=False).set_index('file').loc[filenames[0], 'status'] == 'blocks_different'
@@ -0,0 +1,325 @@
+"""
+Travel-Time Tables and Moveout-Aligned Window Extraction for FORGE DAS Data
+
+This module computes the theoretical P and S travel times from all catalog events to all 1496 DAS
+channels at once (the backprojection of channel_interpolation/README.md, section 5), stores them as
+an [event, channel] table on disk, and uses the table to extract windows from the DAS archive that
+are aligned on the predicted arrival at every channel.
+
+Travel Times:
+    - Event positions: the catalog X (east), Y (north) and Depth (true vertical depth) in feet relative
+      to the wellhead, converted to absolute UTM coordinates in meters
+    - Channel positions: EASTING_m, NORTHING_m and TVD_m of interpolated_das_positions_cubic_1496.csv
+    - Straight rays in a homogeneous medium: t = distance / velocity (Vp = 5821 m/s, Vs = 3414 m/s)
+    - Computed with NumPy broadcasting, `chunk_size` events at a time, so memory stays bounded
+
+Table File (HDF5):
+    - 'P', 'S': travel times in seconds [n_events, n_channels] (float32, NaN for events without location)
+    - 'channels/EASTING_m', 'channels/NORTHING_m', 'channels/TVD_m', 'channels/MD_m': channel positions
+    - 'events/...': origin_ns (UTC origin time in epoch nanoseconds, -1 if missing), event coordinates
+      and the identifying catalog columns (Source, Source_File, Well, Catalog_Stage, MomMag)
+    - Attributes 'Vp(m/s)', 'Vs(m/s)' and 'key', a hash of the inputs. The table is only recomputed
+      when the catalogs, channel positions or velocities change.
+
+Aligned Windows:
+    For every event and channel, the window [arrival - before, arrival + after) of the chosen phase is
+    extracted, so that the arrivals line up at sample `before / dt` of every trace. The union of the
+    windows of all channels of an event is read once (with the reads of all events grouped by file, as in
+    extract_windows.py), and the channels are shifted by their moveout in memory.
+    Output: HDF5 with 'windows' [n_events, n_window, n_channels], 'channels', 'travel_times' and the
+    'events' metadata (with 'complete' = False where the window is not fully covered by files).
+
+Command Line Usage:
+    python traveltimes.py --table travel_times.h5
+    python traveltimes.py --table travel_times.h5 --source_dir /path/to/das/files \
+                          --output aligned_windows.h5 --phase P --before 0.05 --after 0.25 --workers 8
+
+Usage Example:
+    from traveltimes import build_travel_time_table, TravelTimeTable
+
+    build_travel_time_table("travel_times.h5")
+    with TravelTimeTable("travel_times.h5") as table:
+        p_arrivals = table.arrival_ns('P', events=slice(0, 10))  # [10, 1496] epoch nanoseconds
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import os
+import sys
+import h5py
+import hashlib
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from archive_index import ArchiveIndex
+from catalog import CATALOG_DIRS, load_catalogs
+from extract_windows import snap_to_samples, plan_reads, read_pieces, create_output, parse_channels
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downsample'))
+from spatial import CHANNEL_POSITIONS
+VP = 5821.0  # m/s
+VS = 3414.0  # m/s
+FEET = 0.3048
+WELLHEAD = (334655.43, 4263463.12)  # UTM easting, northing in meters
+EVENT_COLUMNS = ('Source', 'Source_File', 'Well', 'Catalog_Stage', 'MomMag')
+
+
+def event_coordinates(events, wellhead=WELLHEAD):
+    """
+    Returns the absolute event positions [n_events, 3] (easting, northing, depth in meters) of a catalog table.
+    """
+    return np.column_stack([wellhead[0] + events['X'].to_numpy(dtype=np.float64) * FEET,
+                            wellhead[1] + events['Y'].to_numpy(dtype=np.float64) * FEET,
+                            events['Depth'].to_numpy(dtype=np.float64) * FEET])
+
+
+def channel_coordinates(positions):
+    """
+    Returns the channel positions [n_channels, 3] (easting, northing, TVD in meters) of a channel positions table.
+    """
+    return positions[['EASTING_m', 'NORTHING_m', 'TVD_m']].to_numpy(dtype=np.float64)
+
+
+def travel_times(event_xyz, channel_xyz, velocities=(VP, VS), chunk_size=256, out=None):
+    """
+    Computes the travel times [n_events, n_channels] from every event to every channel for every velocity,
+    chunk_size events at a time. out: optional arrays (e.g. h5py datasets) to write to, one per velocity.
+    Returns out, or new float32 arrays.
+    """
+    n_events, n_channels = len(event_xyz), len(channel_xyz)
+    if out is None:
+        out = [np.empty((n_events, n_channels), dtype=np.float32) for _ in velocities]
+
+    for e0 in range(0, n_events, chunk_size):
+        e1 = min(e0 + chunk_size, n_events)
+        distance = np.sqrt(((event_xyz[e0:e1, None, :] - channel_xyz[None, :, :]) ** 2).sum(axis=-1))
+        for times, velocity in zip(out, velocities):
+            times[e0:e1] = (distance / velocity).astype(np.float32)
+    return out
+
+
+def table_key(origin_ns, event_xyz, channel_xyz, vp, vs):
+    digest = hashlib.sha1()
+    for array in (origin_ns, event_xyz, channel_xyz, np.array([vp, vs])):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def build_travel_time_table(table_path, csv_dirs=CATALOG_DIRS, positions_path=CHANNEL_POSITIONS, vp=VP, vs=VS,
+                            wellhead=WELLHEAD, chunk_size=256, refresh=False):
+    """
+    Computes the P and S travel-time table of all catalog events and channels and writes it to table_path
+    (see the module docstring). Returns False if an up-to-date table already exists, True if it was written.
+    """
+    events = load_catalogs(csv_dirs)
+    positions = pd.read_csv(positions_path)
+    event_xyz = event_coordinates(events, wellhead)
+    channel_xyz = channel_coordinates(positions)
+    origin = events['Origin_UTC']
+    origin_ns = np.where(origin.notna(), origin.to_numpy(dtype='datetime64[ns]').astype(np.int64), -1)
+
+    key = table_key(origin_ns, event_xyz, channel_xyz, vp, vs)
+    if not refresh and os.path.exists(table_path):
+        with h5py.File(table_path, 'r') as f:
+            if f.attrs.get('key') == key:
+                return False
+
+    logging.info(f"Computing the travel times of {len(events)} events to {len(positions)} channels...")
+    tmp_path = table_path + '.tmp'
+    with h5py.File(tmp_path, 'w') as f:
+        shape = (len(events), len(positions))
+        chunks = (min(chunk_size, len(events)), len(positions))
+        out = [f.create_dataset(phase, shape=shape, dtype=np.float32, chunks=chunks) for phase in ('P', 'S')]
+        travel_times(event_xyz, channel_xyz, (vp, vs), chunk_size, out)
+
+        group = f.create_group('channels')
+        for column in ('EASTING_m', 'NORTHING_m', 'TVD_m', 'MD_m'):
+            group.create_dataset(column, data=positions[column].to_numpy())
+
+        group = f.create_group('events')
+        group.create_dataset('origin_ns', data=origin_ns)
+        for name, values in zip(('easting_m', 'northing_m', 'depth_m'), event_xyz.T):
+            group.create_dataset(name, data=values)
+        for column in EVENT_COLUMNS:
+            values = events[column]
+            if pd.api.types.is_numeric_dtype(values):
+                group.create_dataset(column, data=values.to_numpy())
+            else:
+                group.create_dataset(column, data=values.to_numpy(dtype=object).astype(str).astype(object),
+                                     dtype=h5py.string_dtype())
+
+        f.attrs['Vp(m/s)'] = vp
+        f.attrs['Vs(m/s)'] = vs
+        f.attrs['key'] = key
+    os.replace(tmp_path, table_path)
+    return True
+
+
+class TravelTimeTable:
+    """
+    Reader of a travel-time table written by build_travel_time_table.
+    """
+
+    def __init__(self, table_path):
+        self.file = h5py.File(table_path, 'r')
+        group = self.file['events']
+        self.origin_ns = group['origin_ns'][...]
+        self.events = pd.DataFrame({name: group[name].asstr()[...] if h5py.check_string_dtype(group[name].dtype)
+                                    else group[name][...] for name in group})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __len__(self):
+        return len(self.origin_ns)
+
+    @property
+    def n_channels(self):
+        return self.file['P'].shape[1]
+
+    def travel_times(self, phase, events=slice(None), channels=slice(None)):
+        """
+        Returns the travel times in seconds [events, channels] of a phase ('P' or 'S').
+        """
+        return self.file[phase][events, channels]
+
+    def arrival_ns(self, phase, events=slice(None), channels=slice(None)):
+        """
+        Returns the UTC arrival times in epoch nanoseconds [events, channels] of a phase, with -1 for
+        events without origin time or location.
+        """
+        times = self.travel_times(phase, events, channels).astype(np.float64)
+        origin_ns = np.asarray(self.origin_ns[events])[..., None]
+        valid = (origin_ns >= 0) & np.isfinite(times)
+        arrival = origin_ns + np.round(np.where(valid, times, 0) * 1e9).astype(np.int64)
+        return np.where(valid, arrival, -1)
+
+
+def extract_aligned_windows(table_path, source_dir, output, phase='P', before=0.05, after=0.25, channels=None,
+                            workers=1, index_path=None):
+    """
+    Extracts the windows [arrival - before, arrival + after) of a phase at every channel, for all events
+    of the travel-time table, into one stacked HDF5 output (see the module docstring).
+    """
+    if not output.endswith('.h5'):
+        raise ValueError("The aligned windows are written to an HDF5 (.h5) file")
+    index = ArchiveIndex.open(source_dir, index_path)
+    dt_ns = float(index.dt[0]) * 1e9
+    channels = channels if channels is not None else slice(None)
+
+    with TravelTimeTable(table_path) as table:
+        arrival_ns = table.arrival_ns(phase, channels=channels)
+        events = table.events
+        channel_numbers = np.arange(table.n_channels)[channels]
+        phase_times = table.travel_times(phase, channels=channels)
+
+    # Every event is read as one union window from its earliest arrival, and every channel is shifted by its
+    # moveout, to the first sample at or after its own arrival - before (as the union window start)
+    before_ns = int(round(before * 1e9))
+    valid = np.all(arrival_ns >= 0, axis=1)
+    first_ns = np.where(valid, arrival_ns.min(axis=1), -1)
+    union_start_ns = snap_to_samples(first_ns - before_ns, index)
+    shifts = np.ceil((arrival_ns - before_ns - union_start_ns[:, None]) / dt_ns - 1e-6)
+    shifts = np.where(valid[:, None], shifts, 0).astype(np.int64)
+    max_shift = int(shifts.max()) if len(shifts) else 0
+
+    n_union, reads, n_covered = plan_reads(first_ns, index, before, after + max_shift * dt_ns / 1e9)
+    n_window = n_union - max_shift
+    with h5py.File(os.path.join(source_dir, index.filenames[0]), 'r') as f:
+        dtype = f['Acoustic'].dtype
+
+    # A window is complete if the union of the windows of its channels is covered by files
+    events['complete'] = valid & (n_covered == n_union)
+    attrs = {'phase': phase, 'before(seconds)': before, 'after(seconds)': after,
+             'TimeSamplingInterval(seconds)': float(index.dt[0])}
+    windows, handle = create_output(output, len(events), n_window, channel_numbers, dtype, events, attrs)
+    handle.create_dataset('travel_times', data=phase_times)
+
+    logging.info(f"Extracting {len(events)} {phase}-aligned windows of {n_window} samples from {len(reads)} files...")
+
+    # Union windows are assembled per event, and aligned and written once all their pieces have arrived
+    n_pieces = np.zeros(len(events), dtype=np.int64)
+    for pieces in reads.values():
+        for k, _, _, _ in pieces:
+            n_pieces[k] += 1
+    buffers = {}
+    columns = np.arange(len(channel_numbers))
+    rows = np.arange(n_window)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        tasks = iter(sorted(reads.items()))
+        done_files = 0
+        while True:
+            while len(pending) < 2 * workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                i, pieces = task
+                pending.add(executor.submit(read_pieces, os.path.join(source_dir, index.filenames[i]), pieces, channels))
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for k, window_start, data in future.result():
+                    if k not in buffers:
+                        buffers[k] = np.zeros((n_union, len(channel_numbers)), dtype=dtype)
+                    buffers[k][window_start:window_start + data.shape[0]] = data
+                    n_pieces[k] -= 1
+                    if n_pieces[k] == 0:
+                        union = buffers.pop(k)
+                        windows[k] = union[rows[:, None] + shifts[k][None, :], columns[None, :]]
+                done_files += 1
+            logging.info(f"Read {done_files}/{len(reads)} files")
+
+    handle.close()
+    logging.info(f"Finished extracting windows into {output} ({int(events['complete'].sum())}/{len(events)} complete)")
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the P/S travel-time table of the catalog events and extract aligned windows.")
+    parser.add_argument('--table', type=str, required=True, help='Path of the travel-time table (.h5)')
+    parser.add_argument('--csv_dirs', type=str, nargs='+', default=list(CATALOG_DIRS),
+                        help='Directories containing FORGE*.csv catalog files')
+    parser.add_argument('--positions', type=str, default=CHANNEL_POSITIONS, help='Channel positions CSV file')
+    parser.add_argument('--vp', type=float, default=VP, help='P-wave velocity in m/s')
+    parser.add_argument('--vs', type=float, default=VS, help='S-wave velocity in m/s')
+    parser.add_argument('--chunk_size', type=int, default=256, help='Number of events per computation chunk')
+    parser.add_argument('--refresh', action='store_true', help='Recompute the table even if it is up to date')
+    parser.add_argument('--source_dir', type=str, default=None, help='Directory containing the DAS HDF5 files')
+    parser.add_argument('--output', type=str, default=None, help='Output file (.h5) of the aligned windows')
+    parser.add_argument('--phase', type=str, default='P', choices=['P', 'S'], help='Phase to align the windows on')
+    parser.add_argument('--before', type=float, default=0.05, help='Window length before the arrival in seconds')
+    parser.add_argument('--after', type=float, default=0.25, help='Window length after the arrival in seconds')
+    parser.add_argument('--channels', type=str, default=None, help="Channel range and stride, e.g. '0:1496:2'")
+    parser.add_argument('--workers', type=int, default=1, help='Number of reader processes')
+    parser.add_argument('--index', type=str, default=None, help='Path of the archive index of source_dir')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    updated = build_travel_time_table(args.table, args.csv_dirs, args.positions, args.vp, args.vs,
+                                      chunk_size=args.chunk_size, refresh=args.refresh)
+    logging.info(f"{'Written' if updated else 'Up to date'}: {args.table}")
+
+    if args.output:
+        if args.source_dir is None:
+            parser.error("--output requires --source_dir")
+        channels = parse_channels(args.channels) if args.channels else None
+        extract_aligned_windows(args.table, args.source_dir, args.output, args.phase, args.before, args.after,
+                                channels, args.workers, args.index)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,11 @@ and efficient binary search operations on time-sorted datasets.
 Key Functionality:
     - Timestamp parsing and filename manipulation for FORGE DAS files
     - Binary search algorithms with custom key functions for sorted arrays
+    - Time lookups through the persistent archive index (archive_index.py)
     - DAS data segment extraction across multiple HDF5 files
+    - Fast hyperslab reads of only the requested time/channel window (zero-copy memmap views
+      for contiguous, uncompressed files, see das_io.open_acoustic)
+    - Optional LRU caching of decoded blocks across calls (block_cache.py)
     - Temporal concatenation and slicing of DAS recordings
 
 File Naming Convention:
@@ -30,14 +34,26 @@ Usage Example:
         source_dir="/path/to/das/files"
     )
 
+    # Read only a 2-second window of every 4th channel
+    segment = slice_das_segment(
+        start_time="20240408T154305.5",
+        end_time="20240408T154307.5",
+        source_dir="/path/to/das/files",
+        channels=slice(0, None, 4),
+        fast=True
+    )
+
 Author: Danilo Dordevic
 Last Updated: August 2025
 """
 
 import os
+import numpy as np
 import dascore as dc
 from datetime import datetime
 from typing import List
+from archive_index import ArchiveIndex, to_epoch_ns
+from das_io import open_acoustic
 
 def timestamp2datetime(timestamp):
     return datetime.strptime(timestamp, "%Y%m%dT%H%M%S")
@@ -112,41 +128,92 @@ def binary_search_first_extreme(a: List[str], x: datetime, key=lambda v: v, mode
     return result
 
 
-def slice_das_segment(start_time, end_time, source_dir):
+def read_das_segment(start_time, end_time, source_dir, channels=None, index_path=None, cache=None):
+    """
+    Reads the DAS recordings within [start_time, end_time] directly from the 'Acoustic' datasets.
+
+    The row offsets inside each file are computed from the file start times and sampling intervals
+    of the archive index, so only the requested rows (and channels) are read from disk.
+    start_time/end_time can be datetimes, ISO strings or "YYYYMMDDTHHMMSS[.ffffff]" strings.
+    channels: optional slice of channels, e.g. slice(100, 600) or slice(0, None, 4).
+    cache: optional BlockCache (see block_cache.py) shared across calls, serving repeated reads from memory.
+
+    Returns (data [time, channel], times as datetime64[ns], channel numbers).
+    """
+    index = ArchiveIndex.open(source_dir, index_path)
+    start_ns, end_ns = int(to_epoch_ns(start_time)), int(to_epoch_ns(end_time))
+    first, last = index.files_between(start_ns, end_ns)
+    if last < first:
+        raise ValueError(f"No DAS files in {source_dir} cover {start_time} - {end_time}")
+
+    channels = channels if channels is not None else slice(None)
+    channel_numbers = np.arange(int(index.n_channels[first]))[channels]
+
+    # Rows of every file within the time range (the end time is inclusive, as in Patch.select)
+    row_ranges = []
+    for i in range(first, last + 1):
+        dt_ns = index.dt[i] * 1e9
+        row_start = max(0, int(np.ceil((start_ns - index.start_ns[i]) / dt_ns - 1e-6)))
+        row_end = min(int(index.n_samples[i]), int(np.floor((end_ns - index.start_ns[i]) / dt_ns + 1e-6)) + 1)
+        if row_end > row_start:
+            row_ranges.append((i, row_start, row_end))
+
+    n_rows = sum(row_end - row_start for _, row_start, row_end in row_ranges)
+    data = None
+    times = np.empty(n_rows, dtype='datetime64[ns]')
+    position = 0
+    for i, row_start, row_end in row_ranges:
+        file_path = os.path.join(source_dir, index.filenames[i])
+        if cache is not None:
+            block = cache.read(file_path, row_start, row_end, channels,
+                               shape=(int(index.n_samples[i]), int(index.n_channels[i])))
+            if data is None:
+                data = np.empty((n_rows, len(channel_numbers)), dtype=block.dtype)
+            data[position:position + row_end - row_start] = block
+        else:
+            with open_acoustic(file_path) as dataset:
+                if data is None:
+                    data = np.empty((n_rows, len(channel_numbers)), dtype=dataset.dtype)
+                data[position:position + row_end - row_start] = dataset[row_start:row_end, channels]
+
+        rows = np.arange(row_start, row_end)
+        times[position:position + len(rows)] = (index.start_ns[i] + np.round(rows * index.dt[i] * 1e9).astype(np.int64)).astype('datetime64[ns]')
+        position += len(rows)
+
+    if data is None:
+        data = np.empty((0, len(channel_numbers)))
+    return data, times, channel_numbers
+
+
+def slice_das_segment(start_time, end_time, source_dir, index_path=None, channels=None, fast=False, cache=None):
     """
     Returns a DAS segment containing the recordings within the specified time range.
     It may cut and/or concatenate multiple patches, based on the time range.
+
+    The files covering the time range are found with the persistent archive index of source_dir
+    (see archive_index.py), instead of listing and parsing the whole directory.
+
+    With fast=True, only the requested rows (and optionally a slice of channels) are read with
+    read_das_segment, instead of loading every overlapping file in full. The returned patch then
+    has dims ('time', 'distance'), with the channel numbers as distance coordinate, and
+    start_time/end_time may have sub-second precision. Passing a BlockCache as cache (fast=True only)
+    serves repeated reads of the same files from memory.
     """
-    # Get the list of files in the source directory
-    files = [
-        f for f in os.listdir(source_dir)
-        if f.endswith('.h5') and f.startswith('16B')
-    ]
-    files = sorted(
-        files, key=lambda f: timestamp2datetime(timestampFromFilename(f))
-    )  # sorted(files, key=lambda f: int(f.split('_')[-1].split('.')[0]))
+    if fast:
+        data, times, channel_numbers = read_das_segment(start_time, end_time, source_dir, channels, index_path, cache)
+        return dc.Patch(data=data, coords={'time': times, 'distance': channel_numbers}, dims=('time', 'distance'))
+
+    index = ArchiveIndex.open(source_dir, index_path)
 
     # Convert start_time and end_time to datetime objects
     start_time = timestamp2datetime(start_time)
     end_time = timestamp2datetime(end_time)
 
-    # Find the index of the first file that is greater than or equal to start_time and less than or equal to end_time
-    start_idx = binary_search_first_extreme(
-        files,
-        start_time,
-        key=lambda f: timestamp2datetime(timestampFromFilename(f)),
-        mode='smaller')
-
-    end_idx = binary_search_first_extreme(
-        files,
-        end_time,
-        key=lambda f: timestamp2datetime(timestampFromFilename(f)),
-        mode='larger')
+    # Find the files that overlap the time range [start_time, end_time]
+    start_idx, end_idx = index.files_between(start_time, end_time)
 
     # Create a list of file paths for the files that fall within the specified time range
-    file_paths = [
-        os.path.join(source_dir, f) for f in files[start_idx:end_idx + 1]
-    ]
+    file_paths = index.paths(slice(start_idx, end_idx + 1))
 
     # Create a DAS segment from the file paths
     patches = [dc.spool(file_path)[0] for file_path in file_paths]
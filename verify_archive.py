@@ -0,0 +1,372 @@
+"""
+Chunk-Hash Verification of FORGE DAS Archives
+
+This script verifies archives of DAS files (e.g. the downsampled v2.0.0 files) and catalog CSVs against a
+reference run or a re-run, without re-reading both archives in full for every check. Every file is
+summarized once in a manifest with per-block content hashes; two manifests are then compared in
+seconds, and only the blocks whose hashes differ are read again for a numeric comparison.
+
+Manifest (JSONL, one record per file):
+    - First line: a header with the source directory, catalog directories, block sizes and hash function
+    - HDF5 files: 'file', 'kind' ('h5'), 'size', 'mtime_ns', 'shape', 'dtype', 'attrs' (attributes of the
+      'Acoustic' dataset, e.g. 'TimeSamplingInterval(seconds)' and 'InterrogationRate(Hz)'), 'block_rows' and
+      'blocks', the BLAKE2b hashes of consecutive blocks of `block_rows` rows of 'Acoustic' (all channels)
+    - Catalog CSVs: 'file' ('<catalog directory>/<name>.csv'), 'kind' ('csv'), 'size', 'mtime_ns', 'columns',
+      'rows', 'block_rows' and the hashes of consecutive blocks of `block_rows` lines
+
+    The files are hashed in a process pool, streaming `block_rows` rows at a time. Re-running on the same
+    manifest only hashes files that are new or whose size or modification time changed.
+
+Compare Mode:
+    1. Files missing from either manifest are reported
+    2. Files with different shapes, dtypes, attributes or columns are reported as metadata differences
+    3. For files with mismatching block hashes, only those blocks are read from both archives and compared
+       numerically (np.allclose with --rtol/--atol for the 'Acoustic' data and the numeric CSV columns,
+       exact equality for the other columns); differences within the tolerance are reported as such
+    The report lists one row per differing file, and the exit code is 1 if any difference exceeds the
+    tolerance.
+
+Command Line Usage:
+    python verify_archive.py --source_dir /path/to/v2.0.0 --csv_dirs /path/to/16BStimulationCatalogues \
+                             --manifest v2_manifest.jsonl --workers 16
+
+    python verify_archive.py --compare reference_manifest.jsonl v2_manifest.jsonl --rtol 1e-5 --report diffs.csv
+
+Author: Danilo Dordevic
+Last Updated: August 2025
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import h5py
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from das_io import open_acoustic, read_block
+
+HASH = 'blake2b-128'
+BLOCK_ROWS = 4800      # rows of 'Acoustic' per block (e.g. 1.2 s at 4 kHz)
+CSV_BLOCK_ROWS = 1000  # lines of a catalog CSV per block
+
+
+def block_hash(data):
+    """
+    Returns the hex BLAKE2b-128 hash of the bytes of an array or a bytes object.
+    """
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return value.decode(errors='replace')
+    if isinstance(value, np.ndarray):
+        return [_json_value(v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def h5_entry(path, block_rows=BLOCK_ROWS):
+    """
+    Returns the manifest record of an HDF5 file, reading 'Acoustic' block_rows rows at a time.
+    """
+    with h5py.File(path, 'r') as f:
+        dataset = f['Acoustic']
+        attrs = {key: _json_value(value) for key, value in dataset.attrs.items()}
+    with open_acoustic(path) as dataset:
+        shape, dtype = dataset.shape, dataset.dtype
+        blocks = [block_hash(read_block(dataset, slice(row, row + block_rows)))
+                  for row in range(0, shape[0], block_rows)]
+    return {'kind': 'h5', 'shape': list(shape), 'dtype': dtype.str, 'attrs': attrs, 'block_rows': block_rows,
+            'blocks': blocks}
+
+
+def csv_lines(path):
+    """
+    Returns the header and the data lines of a CSV file (as bytes, without line endings).
+    """
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    return (lines[0] if lines else b''), lines[1:]
+
+
+def csv_entry(path, block_rows=CSV_BLOCK_ROWS):
+    """
+    Returns the manifest record of a catalog CSV, hashing block_rows lines at a time.
+    """
+    header, lines = csv_lines(path)
+    blocks = [block_hash(b'\n'.join(lines[row:row + block_rows])) for row in range(0, len(lines), block_rows)]
+    columns = [c.strip() for c in header.decode(errors='replace').split(',')]
+    return {'kind': 'csv', 'columns': columns, 'rows': len(lines), 'block_rows': block_rows, 'blocks': blocks}
+
+
+def file_entry(item, block_rows=BLOCK_ROWS, csv_block_rows=CSV_BLOCK_ROWS):
+    """
+    Returns the manifest record of item = (key, path).
+    """
+    key, path = item
+    stat = os.stat(path)
+    if path.endswith('.csv'):
+        entry = csv_entry(path, csv_block_rows)
+    else:
+        entry = h5_entry(path, block_rows)
+    return {'file': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, **entry}
+
+
+def manifest_files(source_dir=None, csv_dirs=()):
+    """
+    Returns {key: path} of the DAS files of source_dir and the FORGE catalog CSVs of csv_dirs.
+    """
+    files = {}
+    if source_dir is not None:
+        for f in sorted(os.listdir(source_dir)):
+            if f.endswith('.h5') and not f.startswith('.'):
+                files[f] = os.path.join(source_dir, f)
+    for csv_dir in csv_dirs:
+        name = os.path.basename(os.path.normpath(csv_dir))
+        for f in sorted(os.listdir(csv_dir)):
+            if f.endswith('.csv') and f.startswith('FORGE'):
+                files[f"{name}/{f}"] = os.path.join(csv_dir, f)
+    return files
+
+
+def load_manifest(manifest_path):
+    """
+    Returns (header, {file: record}) of a manifest.
+    """
+    with open(manifest_path) as f:
+        header = json.loads(f.readline())
+        records = {record['file']: record for record in map(json.loads, f)}
+    return header, records
+
+
+def build_manifest(manifest_path, source_dir=None, csv_dirs=(), block_rows=BLOCK_ROWS, csv_block_rows=CSV_BLOCK_ROWS,
+                   workers=1, refresh=False):
+    """
+    Hashes the files of source_dir and csv_dirs in a process pool and writes the manifest (atomically).
+    The records of an existing manifest are reused for files with unchanged size and modification time,
+    unless refresh is True. Returns the records.
+    """
+    start = time.time()
+    files = manifest_files(source_dir, csv_dirs)
+
+    previous = {}
+    if os.path.exists(manifest_path) and not refresh:
+        _, previous = load_manifest(manifest_path)
+
+    records, todo = {}, []
+    for key, path in files.items():
+        stat = os.stat(path)
+        record = previous.get(key)
+        expected_rows = csv_block_rows if path.endswith('.csv') else block_rows
+        if (record is not None and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns
+                and record['block_rows'] == expected_rows):
+            records[key] = record
+        else:
+            todo.append((key, path))
+
+    logging.info(f"Hashing {len(todo)} of {len(files)} files with {workers} workers...")
+    entry = partial(file_entry, block_rows=block_rows, csv_block_rows=csv_block_rows)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for n, record in enumerate(executor.map(entry, todo, chunksize=max(1, min(64, len(todo) // (4 * workers)))), 1):
+            records[record['file']] = record
+            if n % 1000 == 0:
+                logging.info(f"Hashed {n}/{len(todo)} files | {time.time() - start:.1f} s")
+
+    header = {'manifest': 1, 'created': datetime.now().isoformat(timespec='seconds'), 'hash': HASH,
+              'source_dir': os.path.abspath(source_dir) if source_dir is not None else None,
+              'csv_dirs': {os.path.basename(os.path.normpath(d)): os.path.abspath(d) for d in csv_dirs},
+              'block_rows': block_rows, 'csv_block_rows': csv_block_rows}
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(header) + '\n')
+        for key in sorted(records):
+            f.write(json.dumps(records[key]) + '\n')
+    os.replace(tmp_path, manifest_path)
+
+    logging.info(f"Wrote the manifest of {len(records)} files to {manifest_path} in {time.time() - start:.2f} s")
+    return records
+
+
+def file_path(header, key, root=None):
+    """
+    Returns the path of the manifest file `key`, in root if given, else in the directories of the header.
+    """
+    if '/' in key:  # catalog CSV
+        name, filename = key.split('/', 1)
+        return os.path.join(root or header['csv_dirs'][name], filename)
+    return os.path.join(root or header['source_dir'], key)
+
+
+def compare_h5_blocks(path_a, path_b, blocks, block_rows, rtol, atol):
+    """
+    Returns (max absolute difference, whether all blocks are within the tolerance) of the given blocks.
+    """
+    max_diff, close = 0.0, True
+    with open_acoustic(path_a) as a, open_acoustic(path_b) as b:
+        for k in blocks:
+            rows = slice(k * block_rows, (k + 1) * block_rows)
+            block_a, block_b = read_block(a, rows), read_block(b, rows)
+            diff = np.abs(block_a.astype(np.float64) - block_b.astype(np.float64))
+            max_diff = max(max_diff, float(np.nanmax(diff)) if diff.size else 0.0)
+            close &= bool(np.allclose(block_a, block_b, rtol=rtol, atol=atol, equal_nan=True))
+    return max_diff, close
+
+
+def csv_block_frame(header, lines):
+    """
+    Parses lines of a CSV with its header, one row per line (blank lines included). Returns None if they do
+    not parse on their own, e.g. a quoted multi-line field cut at the edge of the block.
+    """
+    try:
+        return pd.read_csv(io.BytesIO(b'\n'.join([header] + lines)), skip_blank_lines=False)
+    except (pd.errors.ParserError, ValueError):
+        return None
+
+
+def compare_csv_blocks(path_a, path_b, blocks, block_rows, rtol, atol):
+    """
+    Returns (max absolute difference of the numeric columns, whether all blocks match) of the given blocks.
+    The blocks are the same lines as those hashed (see csv_entry). Numeric columns are compared with the
+    tolerance, the other columns after stripping whitespace; blocks that do not parse must match exactly.
+    """
+    (header_a, lines_a), (header_b, lines_b) = csv_lines(path_a), csv_lines(path_b)
+    max_diff, close = 0.0, True
+    for k in blocks:
+        block_a, block_b = lines_a[k * block_rows:(k + 1) * block_rows], lines_b[k * block_rows:(k + 1) * block_rows]
+        if block_a == block_b:
+            continue
+        df_a, df_b = csv_block_frame(header_a, block_a), csv_block_frame(header_b, block_b)
+        if df_a is None or df_b is None or df_a.shape != df_b.shape:
+            close = False
+            continue
+        for column_a, column_b in zip(df_a.columns, df_b.columns):
+            a, b = df_a[column_a], df_b[column_b]
+            if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+                a, b = a.to_numpy(dtype=np.float64), b.to_numpy(dtype=np.float64)
+                if len(a):
+                    max_diff = max(max_diff, float(np.nanmax(np.abs(a - b), initial=0.0)))
+                close &= bool(np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True))
+            else:
+                close &= bool((a.astype(str).str.strip().to_numpy() == b.astype(str).str.strip().to_numpy()).all())
+    return max_diff, close
+
+
+def compare_record(item, rtol=1e-6, atol=0.0):
+    """
+    Compares the mismatching blocks of item = (key, record_a, record_b, path_a, path_b).
+    Returns a difference row (dict), or None if the files are identical.
+    """
+    key, a, b, path_a, path_b = item
+    row = {'file': key, 'kind': a['kind'], 'status': None, 'details': '', 'blocks': 0, 'max_abs_diff': np.nan}
+
+    metadata = ('shape', 'dtype', 'attrs') if a['kind'] == 'h5' else ('columns', 'rows')
+    different = [field for field in metadata if a.get(field) != b.get(field)]
+    if a['block_rows'] != b['block_rows']:
+        different.append('block_rows')
+    if different:
+        row['status'] = 'metadata'
+        row['details'] = '; '.join(f"{field}: {a.get(field)} != {b.get(field)}" for field in different)
+        return row
+
+    blocks = [k for k, (hash_a, hash_b) in enumerate(zip(a['blocks'], b['blocks'])) if hash_a != hash_b]
+    if not blocks:
+        return None
+    row['blocks'] = len(blocks)
+    row['details'] = f"{len(blocks)}/{len(a['blocks'])} blocks differ, first at row {blocks[0] * a['block_rows']}"
+
+    if path_a is None or path_b is None:
+        row['status'] = 'blocks_different'
+        return row
+    if not (os.path.exists(path_a) and os.path.exists(path_b)):
+        row['status'] = 'blocks_different'
+        row['details'] += " (files not available for a numeric comparison)"
+        return row
+
+    compare_blocks = compare_csv_blocks if a['kind'] == 'csv' else compare_h5_blocks
+    row['max_abs_diff'], close = compare_blocks(path_a, path_b, blocks, a['block_rows'], rtol, atol)
+    row['status'] = 'within_tolerance' if close else 'blocks_different'
+    return row
+
+
+def compare_manifests(manifest_a, manifest_b, dirs=(None, None), rtol=1e-6, atol=0.0, workers=1, numeric=True):
+    """
+    Compares two manifests and returns a DataFrame with one row per differing file
+    (status 'missing_in_a', 'missing_in_b', 'metadata', 'within_tolerance' or 'blocks_different').
+
+    The mismatching blocks are compared numerically (in a process pool) with the files of the directories
+    in the manifest headers, or of dirs = (root of A, root of B) if given. numeric=False only compares hashes.
+    """
+    header_a, records_a = load_manifest(manifest_a)
+    header_b, records_b = load_manifest(manifest_b)
+
+    rows = [{'file': key, 'kind': records_b[key]['kind'], 'status': 'missing_in_a'} for key in records_b if key not in records_a]
+    rows += [{'file': key, 'kind': records_a[key]['kind'], 'status': 'missing_in_b'} for key in records_a if key not in records_b]
+
+    items = []
+    for key in sorted(set(records_a) & set(records_b)):
+        a, b = records_a[key], records_b[key]
+        if a['blocks'] == b['blocks'] and all(a.get(f) == b.get(f) for f in ('shape', 'dtype', 'attrs', 'columns')):
+            continue
+        paths = (file_path(header_a, key, dirs[0]), file_path(header_b, key, dirs[1])) if numeric else (None, None)
+        items.append((key, a, b) + paths)
+
+    logging.info(f"{len(records_a)} and {len(records_b)} files, {len(rows)} missing, {len(items)} with differences")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows += [row for row in executor.map(partial(compare_record, rtol=rtol, atol=atol), items) if row is not None]
+
+    return pd.DataFrame(rows, columns=['file', 'kind', 'status', 'details', 'blocks', 'max_abs_diff'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash DAS files and catalogs into a manifest, or compare two manifests.")
+    parser.add_argument('--source_dir', type=str, default=None, help='Directory containing the DAS HDF5 files')
+    parser.add_argument('--csv_dirs', type=str, nargs='*', default=[], help='Directories containing FORGE*.csv catalog files')
+    parser.add_argument('--manifest', type=str, default=None, help='Manifest file to write or update (JSONL)')
+    parser.add_argument('--block_rows', type=int, default=BLOCK_ROWS, help="Rows of 'Acoustic' per hashed block")
+    parser.add_argument('--csv_block_rows', type=int, default=CSV_BLOCK_ROWS, help='Lines of a CSV per hashed block')
+    parser.add_argument('--refresh', action='store_true', help='Re-hash all files instead of reusing unchanged records')
+    parser.add_argument('--compare', type=str, nargs=2, default=None, metavar=('MANIFEST_A', 'MANIFEST_B'),
+                        help='Compare two manifests instead of writing one')
+    parser.add_argument('--dirs', type=str, nargs=2, default=(None, None), metavar=('DIR_A', 'DIR_B'),
+                        help='Directories of the files of the two manifests (default: those stored in the manifests)')
+    parser.add_argument('--rtol', type=float, default=1e-6, help='Relative tolerance of the numeric comparison')
+    parser.add_argument('--atol', type=float, default=0.0, help='Absolute tolerance of the numeric comparison')
+    parser.add_argument('--hash_only', action='store_true', help='Only compare the hashes, without reading mismatching blocks')
+    parser.add_argument('--report', type=str, default=None, help='CSV file of the differences')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.compare is None:
+        if args.manifest is None or (args.source_dir is None and not args.csv_dirs):
+            parser.error("--manifest and --source_dir or --csv_dirs are required to write a manifest")
+        build_manifest(args.manifest, args.source_dir, args.csv_dirs, args.block_rows, args.csv_block_rows,
+                       args.workers, args.refresh)
+        return
+
+    differences = compare_manifests(args.compare[0], args.compare[1], args.dirs, args.rtol, args.atol, args.workers,
+                                    not args.hash_only)
+    if args.report:
+        differences.to_csv(args.report, index=False)
+    counts = differences['status'].value_counts().to_dict()
+    print(f"{len(differences)} differing files: {counts}" if len(differences) else "The manifests match.")
+    for row in differences.head(20).itertuples():
+        print(f"  {row.status:17s} {row.file} {row.details if isinstance(row.details, str) else ''}")
+    if len(differences) and not (differences['status'] == 'within_tolerance').all():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()